@@ -0,0 +1,65 @@
+"""
+Benchmark serializing a bulk pricing response as the default Pydantic model
+against the columnar format.
+
+Usage (from api-backend/):
+    uv run python benchmarks/bulk_response_format.py [rows]
+
+Only serialization is timed; the pricing results are built once up front.
+"""
+import json
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing main creates BigQuery and Cloud Logging clients, which need credentials
+with patch('google.cloud.bigquery.Client', return_value=MagicMock()), \
+     patch('google.auth.default', return_value=(MagicMock(), 'benchmark')), \
+     patch('google.cloud.logging.Client'):
+    import main
+
+from pricing_kernel import sample_pricing_data
+
+def sample_response(rows: int) -> main.BulkPricingResponse:
+    """A bulk response for rows instances with every scenario populated"""
+    pricing_data = [sample_pricing_data(index) for index in range(rows)]
+    qty = [1 + index % 8 for index in range(rows)]
+    results = main.price_pricing_data(pricing_data, qty)
+    instances = [
+        main.InstancePricingResponse(
+            input_data=main.EC2Instance(
+                region_code='us-east-1',
+                instance_type=f'm5.{index % 500}xlarge',
+                operation='RunInstances',
+                operating_system='Linux',
+                product_tenancy='Shared',
+                qty=amount,
+            ),
+            pricing_results=result,
+        )
+        for index, (amount, result) in enumerate(zip(qty, results))
+    ]
+    return main.BulkPricingResponse(instances=instances, unique_instances=rows, dedup_ratio=1.0)
+
+def report(label: str, seconds: float, size: int, rows: int) -> None:
+    print(f"{label:<12} {seconds * 1000:9.1f} ms  {seconds / rows * 1e6:7.2f} us/instance  {size / 1e6:8.2f} MB")
+
+def run(rows: int) -> None:
+    response = sample_response(rows)
+    print(f"Serializing {rows} priced instances")
+
+    # What FastAPI does with response_model: validate, dump to JSON-compatible
+    # Python objects, then encode with the standard library
+    started = time.perf_counter()
+    body = json.dumps(main.BulkPricingResponse.model_validate(response).model_dump(mode="json")).encode()
+    report("default", time.perf_counter() - started, len(body), rows)
+
+    started = time.perf_counter()
+    body = main.columnar_pricing_response(response).body
+    report("columnar", time.perf_counter() - started, len(body), rows)
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,72 @@
+"""
+Benchmark the vectorized pricing kernel against pricing one instance at a time.
+
+Usage (from api-backend/):
+    uv run python benchmarks/pricing_kernel.py [rows]
+
+Only the pricing math is timed; BigQuery is never called.
+"""
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing main creates BigQuery and Cloud Logging clients, which need credentials
+with patch('google.cloud.bigquery.Client', return_value=MagicMock()), \
+     patch('google.auth.default', return_value=(MagicMock(), 'benchmark')), \
+     patch('google.cloud.logging.Client'):
+    import main
+
+def sample_pricing_data(index: int):
+    """Pricing rows for one instance with every RI and Savings Plan option populated"""
+    rate = 0.01 + (index % 500) * 0.001
+    reserved = []
+    for term in ('1yr', '3yr'):
+        reserved += [
+            {'leasecontractlength': term, 'purchaseoption': 'No Upfront', 'pricedescription': 'per Hour', 'priceperunit': str(rate * 0.7)},
+            {'leasecontractlength': term, 'purchaseoption': 'Partial Upfront', 'pricedescription': 'Upfront Fee', 'priceperunit': str(rate * 3000)},
+            {'leasecontractlength': term, 'purchaseoption': 'Partial Upfront', 'pricedescription': 'per Hour', 'priceperunit': str(rate * 0.3)},
+            {'leasecontractlength': term, 'purchaseoption': 'All Upfront', 'pricedescription': 'Upfront Fee', 'priceperunit': str(rate * 5500)},
+            {'leasecontractlength': term, 'purchaseoption': 'All Upfront', 'pricedescription': 'per Hour', 'priceperunit': '0'},
+        ]
+    savings_plans = [
+        {'leasecontractlength': term, 'purchaseoption': option, 'discountedrate': str(rate * 0.6)}
+        for term in ('1', '3')
+        for option in main.PURCHASE_OPTIONS
+    ]
+    return {
+        'on_demand': {'priceperunit': str(rate), 'operating_system': 'Linux'},
+        'reserved': reserved,
+        'compute_savings_plan': savings_plans,
+        'ec2_savings_plan': savings_plans,
+    }
+
+def report(label: str, seconds: float, rows: int) -> None:
+    print(f"{label:<32} {seconds * 1000:9.1f} ms  {seconds / rows * 1e6:7.2f} us/instance")
+
+def run(rows: int) -> None:
+    pricing_data = [sample_pricing_data(index) for index in range(rows)]
+    qty = [1 + index % 8 for index in range(rows)]
+    print(f"Pricing {rows} instances")
+
+    started = time.perf_counter()
+    for data, amount in zip(pricing_data, qty):
+        main.price_pricing_data([data], [amount])
+    report("one instance per kernel call", time.perf_counter() - started, rows)
+
+    started = time.perf_counter()
+    rates = main.extract_pricing_rates(pricing_data)
+    extracted = time.perf_counter()
+    columns = main.compute_pricing_columns(rates, main.np.asarray(qty, dtype=float))
+    computed = time.perf_counter()
+    main.pricing_results_from_columns(columns)
+    finished = time.perf_counter()
+    report("vectorized: extract rates", extracted - started, rows)
+    report("vectorized: kernel", computed - extracted, rows)
+    report("vectorized: build results", finished - computed, rows)
+    report("vectorized: total", finished - started, rows)
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,10 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, BinaryIO, Callable, Iterable, Iterator, List, Optional, Dict, Any, Tuple, get_origin
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import json
 import os
+import secrets
+import sqlite3
+import sys
+import uuid
 import logging
+import threading
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import numpy as np
+import orjson
+from openpyxl import load_workbook
 from dotenv import load_dotenv
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery, logging as cloud_logging
 from google.auth import default
 from google.auth.exceptions import DefaultCredentialsError
@@ -23,11 +48,76 @@ logger = logging.getLogger(__name__)
 BQ_DATASET = os.environ.get("BIGQUERY_DATASET", "ec2_pricing_files")
 BQ_TABLE_EC2_GLOBAL = os.environ.get("BIGQUERY_TABLE_EC2_GLOBAL", "ec2_global_pricing_latest")
 BQ_TABLE_SAVINGS_PLAN_PREFIX = os.environ.get("BIGQUERY_TABLE_SAVINGS_PLAN_PREFIX", "savings_plan_")
+BQ_TABLE_PRICING_MATRIX = os.environ.get("BIGQUERY_TABLE_PRICING_MATRIX", "ec2_pricing_matrix_latest")
+# Serve batched lookups from the pricing matrix built by the pricing update job
+PRICING_MATRIX_ENABLED = os.environ.get("PRICING_MATRIX_ENABLED", "false").lower() == "true"
+BQ_TABLE_SAVINGS_PLAN_ALL_REGIONS = os.environ.get(
+    "BIGQUERY_TABLE_SAVINGS_PLAN_ALL_REGIONS", "ec2_savings_plan_pricing_latest"
+)
+# Serve savings plan lookups from the all-region table built by the pricing update job
+SAVINGS_PLAN_ALL_REGIONS_ENABLED = os.environ.get("SAVINGS_PLAN_ALL_REGIONS_ENABLED", "false").lower() == "true"
 PROJECT_ID = (
     os.environ.get("GCP_PROJECT")
     or os.environ.get("GOOGLE_CLOUD_PROJECT")
 )
 
+# Concurrency and timeouts for BigQuery pricing lookups
+BIGQUERY_QUERY_CONCURRENCY = int(os.environ.get("BIGQUERY_QUERY_CONCURRENCY", "16"))
+BIGQUERY_QUERY_TIMEOUT_SECONDS = float(os.environ.get("BIGQUERY_QUERY_TIMEOUT_SECONDS", "30"))
+
+# Admission control for BigQuery jobs started by API requests
+BIGQUERY_MAX_INFLIGHT_JOBS = int(os.environ.get("BIGQUERY_MAX_INFLIGHT_JOBS", "32"))
+BIGQUERY_MAX_QUEUED_JOBS = int(os.environ.get("BIGQUERY_MAX_QUEUED_JOBS", "256"))
+BIGQUERY_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("BIGQUERY_QUEUE_TIMEOUT_SECONDS", "10"))
+BIGQUERY_RETRY_AFTER_SECONDS = int(os.environ.get("BIGQUERY_RETRY_AFTER_SECONDS", "5"))
+
+# Pricing result cache configuration (PRICING_CACHE_SIZE=0 disables the cache)
+PRICING_CACHE_SIZE = int(os.environ.get("PRICING_CACHE_SIZE", "10000"))
+PRICING_CACHE_TTL_SECONDS = float(os.environ.get("PRICING_CACHE_TTL_SECONDS", "3600"))
+PRICING_CACHE_VERSION_CHECK_SECONDS = float(os.environ.get("PRICING_CACHE_VERSION_CHECK_SECONDS", "60"))
+
+# In-memory pricing snapshot configuration
+PRICING_SNAPSHOT_ENABLED = os.environ.get("PRICING_SNAPSHOT_ENABLED", "false").lower() == "true"
+PRICING_SNAPSHOT_REFRESH_SECONDS = int(os.environ.get("PRICING_SNAPSHOT_REFRESH_SECONDS", "300"))
+PRICING_SNAPSHOT_QUERY_TIMEOUT_SECONDS = float(os.environ.get("PRICING_SNAPSHOT_QUERY_TIMEOUT_SECONDS", "120"))
+# Rows held per process; a build that would exceed it is abandoned
+PRICING_SNAPSHOT_MAX_ROWS = int(os.environ.get("PRICING_SNAPSHOT_MAX_ROWS", "1000000"))
+PRICING_SNAPSHOT_REGIONS = [
+    region.strip() for region in os.environ.get("PRICING_SNAPSHOT_REGIONS", "").split(",") if region.strip()
+]
+
+# Page sizes for /query-pricing-data
+QUERY_PRICING_DEFAULT_PAGE_SIZE = int(os.environ.get("QUERY_PRICING_DEFAULT_PAGE_SIZE", "500"))
+QUERY_PRICING_MAX_PAGE_SIZE = int(os.environ.get("QUERY_PRICING_MAX_PAGE_SIZE", "1000"))
+# Key for signing /query-pricing-data cursors. Without it a random key is used,
+# so cursors only work on the instance that issued them.
+QUERY_CURSOR_SECRET = (os.environ.get("QUERY_CURSOR_SECRET") or secrets.token_hex(32)).encode()
+
+# Pricing data query cache configuration (QUERY_CACHE_SIZE=0 disables the cache)
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1000"))
+QUERY_CACHE_TTL_SECONDS = float(os.environ.get("QUERY_CACHE_TTL_SECONDS", "900"))
+QUERY_CACHE_STALE_SECONDS = float(os.environ.get("QUERY_CACHE_STALE_SECONDS", "3600"))
+QUERY_CACHE_PAGES = os.environ.get("QUERY_CACHE_PAGES", "true").lower() == "true"
+# Background refreshes of stale pages run on their own small pool so they never
+# take a slot from request queries; a refresh is skipped when every worker is busy
+QUERY_CACHE_REFRESH_WORKERS = max(1, int(os.environ.get("QUERY_CACHE_REFRESH_WORKERS", "2")))
+
+# Number of instances priced per step of a streamed bulk pricing response
+PRICING_STREAM_CHUNK_SIZE = int(os.environ.get("PRICING_STREAM_CHUNK_SIZE", "500"))
+
+# Largest fleet file accepted by /price-instances/upload
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_MIB", "100")) * 1024 * 1024
+
+# Largest cost curve returned by /savings-plans/optimize
+SAVINGS_PLAN_MAX_CURVE_POINTS = int(os.environ.get("SAVINGS_PLAN_MAX_CURVE_POINTS", "1000"))
+
+# Asynchronous bulk pricing jobs
+PRICING_JOB_STORE_PATH = os.environ.get("PRICING_JOB_STORE_PATH", "/tmp/pricing_jobs.sqlite3")
+PRICING_JOB_WORKERS = int(os.environ.get("PRICING_JOB_WORKERS", "2"))
+PRICING_JOB_CHUNK_SIZE = int(os.environ.get("PRICING_JOB_CHUNK_SIZE", "500"))
+PRICING_JOB_MAX_ATTEMPTS = int(os.environ.get("PRICING_JOB_MAX_ATTEMPTS", "3"))
+PRICING_JOB_MAX_PAGE_SIZE = int(os.environ.get("PRICING_JOB_MAX_PAGE_SIZE", "1000"))
+
 # CORS configuration
 CORS_ALLOWED_ORIGINS = os.environ.get("CORS_ALLOWED_ORIGINS")
 if CORS_ALLOWED_ORIGINS:
@@ -41,8 +131,22 @@ else:
         "https://*.googleusercontent.com",  # GCP domains
     ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services with the application"""
+    if PRICING_SNAPSHOT_ENABLED:
+        logger.info("Starting in-memory pricing snapshot")
+        pricing_snapshot.start(PRICING_SNAPSHOT_REFRESH_SECONDS)
+    try:
+        pricing_jobs.resume()
+    except Exception as e:
+        logger.error(f"Failed to resume pricing jobs: {str(e)}")
+    yield
+    pricing_snapshot.stop()
+    pricing_jobs.stop()
+
 # Initialize FastAPI app
-app = FastAPI(title="AWS EC2 Pricing API Backend", version="0.1.0")
+app = FastAPI(title="AWS EC2 Pricing API Backend", version="0.1.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -78,6 +182,9 @@ def initialize_bigquery_client():
 
 bigquery_client = initialize_bigquery_client()
 
+# Shared pool for running pricing queries concurrently
+query_executor = ThreadPoolExecutor(max_workers=BIGQUERY_QUERY_CONCURRENCY, thread_name_prefix="bigquery-query")
+
 # Setup Google Cloud Logging
 def setup_cloud_logging():
     """Setup Google Cloud Logging for structured logging"""
@@ -208,6 +315,87 @@ class InstancePricingResponse(BaseModel):
 class BulkPricingResponse(BaseModel):
     """Response for bulk instance pricing"""
     instances: List[InstancePricingResponse]
+    unique_instances: int = 0  # distinct (region, type, operation, tenancy) shapes priced
+    dedup_ratio: float = 1.0  # input rows per unique shape
+
+class BulkPricingSummary(BaseModel):
+    """Final line of a streamed bulk pricing response"""
+    count: int
+    unique_instances: int
+    dedup_ratio: float
+    instances_with_errors: int
+    error: Optional[str] = None  # set when the stream stopped before every instance was priced
+
+class PricingJobStatus(BaseModel):
+    """Status and progress of an asynchronous bulk pricing job"""
+    job_id: str
+    status: str  # queued, running, completed or failed
+    total: int
+    completed: int
+    progress: float
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+class PricingJobResultsPage(BaseModel):
+    """One page of a completed pricing job's results"""
+    job_id: str
+    offset: int
+    limit: int
+    total: int
+    next_offset: Optional[int] = None
+    instances: List[InstancePricingResponse]
+
+class FleetPricingGroup(BaseModel):
+    """Summed total costs for a group of instances"""
+    count: int  # input rows
+    quantity: int  # sum of qty
+    totals: Dict[str, float]  # scenario -> total cost
+
+class FleetPricingAggregate(BaseModel):
+    """Fleet-level totals per scenario, overall and per requested grouping"""
+    count: int
+    unique_instances: int
+    instances_with_errors: int
+    total: FleetPricingGroup
+    groups: Dict[str, Dict[str, FleetPricingGroup]]  # grouping -> group value -> totals
+
+class RegionPricingRequest(BaseModel):
+    """One instance shape to price in several regions"""
+    instance_type: str
+    operation: str
+    operating_system: str
+    product_tenancy: str = "Shared"
+    qty: int = 1
+    regions: Optional[List[str]] = None  # omit to price every ingested region
+
+class RegionPricingComparison(BaseModel):
+    """Pricing for one instance shape in each requested region"""
+    regions: List[InstancePricingResponse]  # in request order
+    cheapest_region: Optional[str] = None  # lowest On-Demand rate among regions with a price
+
+class SavingsPlanCommitment(BaseModel):
+    """Cost-minimizing hourly commitment for one Savings Plan type, term and purchase option"""
+    plan: str  # compute_savings_plan or ec2_savings_plan
+    term: int  # years
+    purchase_option: str
+    hourly_commitment: float
+    hourly_cost: float  # commitment plus expected usage it leaves at On-Demand
+    savings_percent: float  # against running the whole fleet On-Demand
+    coverage: float  # share of On-Demand spend covered by the plan
+    term_total_cost: float
+    curve_commitments: List[float]  # evenly spaced candidate commitments
+    curve_hourly_costs: List[float]
+    group_commitments: Optional[Dict[str, float]] = None  # ec2_savings_plan only, per region/instance family
+
+class SavingsPlanOptimization(BaseModel):
+    """Optimal Savings Plan commitments for a fleet"""
+    count: int
+    unique_instances: int
+    instances_with_errors: int
+    on_demand_hourly_cost: float  # expected over the usage profile
+    plans: List[SavingsPlanCommitment]
+    best: Optional[SavingsPlanCommitment] = None  # lowest hourly cost across plans
 
 class PricingQueryFilters(BaseModel):
     """Filters for pricing data queries"""
@@ -232,13 +420,167 @@ class TelemetryEvent(BaseModel):
     user_id: Optional[str] = None
     session_id: Optional[str] = None
 
+# BigQuery admission control
+
+class AdmissionRejected(Exception):
+    """Raised when a BigQuery job cannot be admitted; surfaced to clients as 429"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class BigQueryAdmissionControl:
+    """
+    Caps the number of BigQuery jobs in flight across all requests. Jobs over
+    the cap wait in a bounded queue; when the queue is full or the wait exceeds
+    the queue timeout the job is rejected with AdmissionRejected.
+    """
+
+    def __init__(self, max_inflight_jobs: int, max_queued_jobs: int, queue_timeout_seconds: float, retry_after_seconds: int):
+        self.max_inflight_jobs = max_inflight_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._slots = threading.BoundedSemaphore(max_inflight_jobs)
+        self._lock = threading.Lock()
+
+    def _reject(self, message: str) -> AdmissionRejected:
+        with self._lock:
+            self.rejected += 1
+        logger.warning(f"BigQuery admission rejected: {message}")
+        return AdmissionRejected(message, self.retry_after_seconds)
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight BigQuery job slot for the duration of the block"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                queue_full = self.queued >= self.max_queued_jobs
+                if not queue_full:
+                    self.queued += 1
+            if queue_full:
+                raise self._reject("Too many BigQuery jobs queued")
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout_seconds)
+            finally:
+                with self._lock:
+                    self.queued -= 1
+            if not acquired:
+                raise self._reject(f"Timed out after {self.queue_timeout_seconds:g}s waiting for a BigQuery job slot")
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_inflight_jobs": self.max_inflight_jobs,
+            "max_queued_jobs": self.max_queued_jobs,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+bigquery_admission = BigQueryAdmissionControl(
+    BIGQUERY_MAX_INFLIGHT_JOBS,
+    BIGQUERY_MAX_QUEUED_JOBS,
+    BIGQUERY_QUEUE_TIMEOUT_SECONDS,
+    BIGQUERY_RETRY_AFTER_SECONDS,
+)
+
+class BigQueryUsage:
+    """
+    Running totals of bytes processed and billed by the API's BigQuery jobs,
+    broken down by the tables each job read. The versioned tables behind the
+    _latest views show up separately, so scan sizes can be compared across
+    pricing loads and table layouts.
+    """
+
+    def __init__(self):
+        self.jobs = 0
+        self.cache_hits = 0
+        self.bytes_processed = 0
+        self.bytes_billed = 0
+        self._by_tables: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, query_job: Any) -> None:
+        processed = query_job.total_bytes_processed
+        billed = query_job.total_bytes_billed
+        processed = processed if isinstance(processed, int) else 0
+        billed = billed if isinstance(billed, int) else 0
+        cache_hit = query_job.cache_hit is True
+        tables = ",".join(sorted(f"{table.dataset_id}.{table.table_id}" for table in query_job.referenced_tables or []))
+
+        logger.info(f"BigQuery job {query_job.job_id} processed {processed} bytes, billed {billed} bytes, cache hit {cache_hit}, tables [{tables}]")
+        with self._lock:
+            self.jobs += 1
+            self.cache_hits += cache_hit
+            self.bytes_processed += processed
+            self.bytes_billed += billed
+            usage = self._by_tables.setdefault(tables, {"jobs": 0, "bytes_processed": 0, "bytes_billed": 0})
+            usage["jobs"] += 1
+            usage["bytes_processed"] += processed
+            usage["bytes_billed"] += billed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "jobs": self.jobs,
+                "cache_hits": self.cache_hits,
+                "bytes_processed": self.bytes_processed,
+                "bytes_billed": self.bytes_billed,
+                "by_tables": {tables: dict(usage) for tables, usage in self._by_tables.items()},
+            }
+
+bigquery_usage = BigQueryUsage()
+
+def run_query(
+    query: str,
+    job_config: Optional[bigquery.QueryJobConfig] = None,
+    timeout: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run a BigQuery query inside an admission slot and return its rows. The job
+    is given timeout seconds (default BIGQUERY_QUERY_TIMEOUT_SECONDS) both
+    server side and while waiting for its result, and is cancelled if the wait
+    times out, so an abandoned query does not keep running or hold a pool
+    thread.
+    """
+    timeout = BIGQUERY_QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+    job_config = job_config or bigquery.QueryJobConfig()
+    job_config.job_timeout_ms = int(timeout * 1000)
+    with bigquery_admission.slot():
+        query_job = bigquery_client.query(query, job_config=job_config)
+        try:
+            rows = [dict(row) for row in query_job.result(timeout=timeout)]
+        except FuturesTimeoutError:
+            try:
+                query_job.cancel()
+            except Exception as e:
+                logger.warning(f"Failed to cancel timed out BigQuery job {query_job.job_id}: {str(e)}")
+            raise
+    bigquery_usage.record(query_job)
+    return rows
+
 # Utility functions
 
 def sanitize_input(instance: Dict[str, Any]) -> EC2Instance:
     """Sanitize and map input instance data to internal model"""
-    # The input already uses the correct field names from plan.md
-    # Just validate and convert to internal EC2Instance model
-    return EC2Instance(**instance)
+    # The input already uses the correct field names from plan.md.
+    # Strip whitespace once here so lookups and cache keys agree.
+    return EC2Instance(**{
+        name: value.strip() if isinstance(value, str) else value
+        for name, value in instance.items()
+    })
 
 def get_table_name(scenario: str, region: str) -> str:
     """Get BigQuery table name for pricing scenario"""
@@ -250,7 +592,7 @@ def get_table_name(scenario: str, region: str) -> str:
     else:
         raise ValueError(f"Unknown pricing scenario: {scenario}")
 
-def query_on_demand_pricing(instance: EC2Instance) -> Dict[str, Any]:
+def query_on_demand_pricing(instance: EC2Instance, raise_errors: bool = False) -> Dict[str, Any]:
     """Query BigQuery for On-Demand pricing data"""
     table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_EC2_GLOBAL}"
 
@@ -266,6 +608,7 @@ def query_on_demand_pricing(instance: EC2Instance) -> Dict[str, Any]:
     AND tenancy = @tenancy
     AND termtype = "OnDemand"
     AND usagetype LIKE "%BoxUsage%"
+    ORDER BY sku
     LIMIT 1
     """
 
@@ -279,15 +622,16 @@ def query_on_demand_pricing(instance: EC2Instance) -> Dict[str, Any]:
     )
 
     try:
-        query_job = bigquery_client.query(query, job_config=job_config)
-        results = [dict(row) for row in query_job]
+        results = run_query(query, job_config)
         logger.info(f"On-demand query results: {results}")
         return results[0] if results else {}
     except Exception as e:
         logger.error(f"BigQuery On-Demand query failed: {str(e)}")
+        if raise_errors:
+            raise
         return {}
 
-def query_reserved_instance_pricing(instance: EC2Instance) -> List[Dict[str, Any]]:
+def query_reserved_instance_pricing(instance: EC2Instance, raise_errors: bool = False) -> List[Dict[str, Any]]:
     """Query BigQuery for Reserved Instance pricing data"""
     table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_EC2_GLOBAL}"
 
@@ -318,15 +662,16 @@ def query_reserved_instance_pricing(instance: EC2Instance) -> List[Dict[str, Any
     )
 
     try:
-        query_job = bigquery_client.query(query, job_config=job_config)
-        results = [dict(row) for row in query_job]
+        results = run_query(query, job_config)
         logger.info(f"RI query results count: {len(results)}")
         return results
     except Exception as e:
         logger.error(f"BigQuery Reserved Instance query failed: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-def query_compute_savings_plan_pricing(instance: EC2Instance) -> List[Dict[str, Any]]:
+def query_compute_savings_plan_pricing(instance: EC2Instance, raise_errors: bool = False) -> List[Dict[str, Any]]:
     """Query BigQuery for Compute Savings Plan pricing data"""
     region_code = instance.region_code.replace('-', '_')
     table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_PREFIX}{region_code}_latest"
@@ -355,15 +700,16 @@ def query_compute_savings_plan_pricing(instance: EC2Instance) -> List[Dict[str,
     )
 
     try:
-        query_job = bigquery_client.query(query, job_config=job_config)
-        results = [dict(row) for row in query_job]
+        results = run_query(query, job_config)
         logger.info(f"Compute SP query results count: {len(results)}")
         return results
     except Exception as e:
         logger.error(f"BigQuery Compute Savings Plan query failed: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-def query_ec2_savings_plan_pricing(instance: EC2Instance) -> List[Dict[str, Any]]:
+def query_ec2_savings_plan_pricing(instance: EC2Instance, raise_errors: bool = False) -> List[Dict[str, Any]]:
     """Query BigQuery for EC2 Savings Plan pricing data"""
     region_code = instance.region_code.replace('-', '_')
     table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_PREFIX}{region_code}_latest"
@@ -392,246 +738,1120 @@ def query_ec2_savings_plan_pricing(instance: EC2Instance) -> List[Dict[str, Any]
     )
 
     try:
-        query_job = bigquery_client.query(query, job_config=job_config)
-        results = [dict(row) for row in query_job]
+        results = run_query(query, job_config)
         logger.info(f"EC2 SP query results count: {len(results)}")
         return results
     except Exception as e:
         logger.error(f"BigQuery EC2 Savings Plan query failed: {str(e)}")
+        if raise_errors:
+            raise
         return []
 
-def calculate_pricing(instance: EC2Instance) -> PricingResults:
-    """Calculate all pricing scenarios for an instance"""
+def pricing_key(instance: EC2Instance) -> Tuple[str, str, str, str]:
+    """Lookup key identifying the pricing rows that apply to an instance"""
+    return (instance.region_code, instance.instance_type, instance.operation, instance.product_tenancy)
+
+def is_preferred_on_demand_row(row: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """
+    Whether row should replace current as a shape's On-Demand row. Several
+    OnDemand BoxUsage rows can match one shape; every lookup, and the pricing
+    matrix built by the update job, uses the one with the lowest sku.
+    """
+    return not current or (row.get('sku') or '') < (current.get('sku') or '')
+
+def empty_pricing_data() -> Dict[str, Any]:
+    """Pricing data container matching the shape returned by the per-instance queries"""
+    return {
+        'on_demand': {},
+        'reserved': [],
+        'compute_savings_plan': [],
+        'ec2_savings_plan': [],
+    }
+
+def query_batch_global_pricing(keys: List[Tuple[str, str, str, str]]) -> Dict[Tuple[str, str, str, str], Dict[str, Any]]:
+    """Query On-Demand and Reserved Instance rows for a batch of instance keys in one BigQuery job"""
+    table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_EC2_GLOBAL}"
+
+    logger.info(f"Querying batched On-Demand/RI pricing for {len(keys)} unique instances")
+
+    # Same predicates as query_on_demand_pricing and query_reserved_instance_pricing,
+    # joined against the batch passed as an array of structs
+    query = f"""
+    SELECT p.sku, p.region_code, p.termtype, p.instance_type, p.usagetype, p.operating_system,
+           p.pricedescription, p.priceperunit, p.unit, p.currency, p.leasecontractlength,
+           p.purchaseoption, p.offeringclass, p.operation, p.tenancy
+    FROM `{table_id}` AS p
+    JOIN UNNEST(@instances) AS i
+    ON p.region_code = i.region_code
+    AND p.instance_type = i.instance_type
+    AND p.operation = i.operation
+    AND p.tenancy = i.tenancy
+    WHERE p.usagetype LIKE "%BoxUsage%"
+    AND (p.termtype = "OnDemand" OR (p.termtype LIKE "Reserved" AND p.offeringclass = "standard"))
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter(
+                "instances",
+                "STRUCT",
+                [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("region_code", "STRING", region_code),
+                        bigquery.ScalarQueryParameter("instance_type", "STRING", instance_type),
+                        bigquery.ScalarQueryParameter("operation", "STRING", operation),
+                        bigquery.ScalarQueryParameter("tenancy", "STRING", tenancy),
+                    )
+                    for region_code, instance_type, operation, tenancy in keys
+                ],
+            )
+        ]
+    )
+
+    rows = run_query(query, job_config)
+
+    results = {key: {'on_demand': {}, 'reserved': []} for key in keys}
+    for row in rows:
+        key = (row.get('region_code'), row.get('instance_type'), row.get('operation'), row.get('tenancy'))
+        if key not in results:
+            continue
+        if row.get('termtype') == 'OnDemand':
+            if is_preferred_on_demand_row(row, results[key]['on_demand']):
+                results[key]['on_demand'] = row
+        else:
+            results[key]['reserved'].append(row)
+
+    logger.info(f"Batched On-Demand/RI query results count: {len(rows)}")
+    return results
+
+def query_batch_savings_plan_pricing(region: str, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, List[Dict[str, Any]]]]:
+    """Query Compute and EC2 Savings Plan rows for a batch of (instance_type, operation) keys in one region"""
+    region_code = region.replace('-', '_')
+    table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_PREFIX}{region_code}_latest"
+
+    logger.info(f"Querying batched SP pricing for {len(keys)} unique instances, table: {table_id}")
+
+    # Same predicates as the per-instance savings plan queries, both plan families in one scan
+    query = f"""
+    SELECT s.sku, s.discountedregioncode, s.discountedinstancetype, s.product_family, s.usagetype,
+           s.discountedusagetype, s.discountedoperation, s.purchaseoption, s.leasecontractlength,
+           s.leasecontractlengthunit, s.discountedrate, s.currency, s.unit
+    FROM `{table_id}` AS s
+    JOIN UNNEST(@instances) AS i
+    ON s.discountedinstancetype = i.instance_type
+    AND s.discountedoperation = i.operation
+    WHERE s.discountedregioncode = @region_code
+    AND s.discountedusagetype LIKE "%-BoxUsage%"
+    AND s.product_family IN ("ComputeSavingsPlans", "EC2InstanceSavingsPlans")
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("region_code", "STRING", region),
+            bigquery.ArrayQueryParameter(
+                "instances",
+                "STRUCT",
+                [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("instance_type", "STRING", instance_type),
+                        bigquery.ScalarQueryParameter("operation", "STRING", operation),
+                    )
+                    for instance_type, operation in keys
+                ],
+            ),
+        ]
+    )
+
+    rows = run_query(query, job_config)
+
+    results = {key: {'compute_savings_plan': [], 'ec2_savings_plan': []} for key in keys}
+    for row in rows:
+        key = (row.get('discountedinstancetype'), row.get('discountedoperation'))
+        if key not in results:
+            continue
+        if row.get('product_family') == 'ComputeSavingsPlans':
+            results[key]['compute_savings_plan'].append(row)
+        elif row.get('product_family') == 'EC2InstanceSavingsPlans':
+            results[key]['ec2_savings_plan'].append(row)
+
+    logger.info(f"Batched SP query results count for {region}: {len(rows)}")
+    return results
+
+def query_batch_all_regions_savings_plan_pricing(
+    keys_by_region: Dict[str, List[Tuple[str, str]]],
+) -> Dict[str, Dict[Tuple[str, str], Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Query Compute and EC2 Savings Plan rows for (instance_type, operation)
+    keys in several regions with one scan of the all-region table
+    """
+    table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_ALL_REGIONS}"
+    key_count = sum(len(keys) for keys in keys_by_region.values())
+
+    logger.info(f"Querying batched SP pricing for {key_count} unique instances in {len(keys_by_region)} regions, table: {table_id}")
+
+    query = f"""
+    SELECT s.sku, s.discountedregioncode, s.discountedinstancetype, s.product_family, s.usagetype,
+           s.discountedusagetype, s.discountedoperation, s.purchaseoption, s.leasecontractlength,
+           s.leasecontractlengthunit, s.discountedrate, s.currency, s.unit
+    FROM `{table_id}` AS s
+    JOIN UNNEST(@instances) AS i
+    ON s.discountedregioncode = i.region_code
+    AND s.discountedinstancetype = i.instance_type
+    AND s.discountedoperation = i.operation
+    WHERE s.discountedregioncode IN UNNEST(@regions)
+    AND s.discountedusagetype LIKE "%-BoxUsage%"
+    AND s.product_family IN ("ComputeSavingsPlans", "EC2InstanceSavingsPlans")
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            # The IN UNNEST filter on the clustering column lets BigQuery prune blocks
+            bigquery.ArrayQueryParameter("regions", "STRING", sorted(keys_by_region)),
+            bigquery.ArrayQueryParameter(
+                "instances",
+                "STRUCT",
+                [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("region_code", "STRING", region_code),
+                        bigquery.ScalarQueryParameter("instance_type", "STRING", instance_type),
+                        bigquery.ScalarQueryParameter("operation", "STRING", operation),
+                    )
+                    for region_code, keys in keys_by_region.items()
+                    for instance_type, operation in keys
+                ],
+            ),
+        ]
+    )
+
+    rows = run_query(query, job_config)
+
+    results = {
+        region_code: {key: {'compute_savings_plan': [], 'ec2_savings_plan': []} for key in keys}
+        for region_code, keys in keys_by_region.items()
+    }
+    for row in rows:
+        region_results = results.get(row.get('discountedregioncode'), {})
+        key = (row.get('discountedinstancetype'), row.get('discountedoperation'))
+        if key not in region_results:
+            continue
+        if row.get('product_family') == 'ComputeSavingsPlans':
+            region_results[key]['compute_savings_plan'].append(row)
+        elif row.get('product_family') == 'EC2InstanceSavingsPlans':
+            region_results[key]['ec2_savings_plan'].append(row)
+
+    logger.info(f"Batched all-region SP query results count: {len(rows)}")
+    return results
+
+def pricing_data_from_matrix_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the pricing rows the kernel reads from one pricing matrix row"""
+    data = empty_pricing_data()
+    operating_system = row.get('operating_system')
+    if row.get('on_demand_rate') is not None:
+        data['on_demand'] = {'termtype': 'OnDemand', 'operating_system': operating_system, 'priceperunit': row['on_demand_rate']}
+
+    for term in PRICING_TERMS:
+        reserved_rows = [
+            ('No Upfront', 'Hourly rate', row.get(f'ri_{term}yr_no_upfront_rate')),
+            ('Partial Upfront', 'Hourly rate', row.get(f'ri_{term}yr_partial_upfront_rate')),
+            ('Partial Upfront', 'Upfront Fee', row.get(f'ri_{term}yr_partial_upfront_fee')),
+            ('All Upfront', 'Upfront Fee', row.get(f'ri_{term}yr_all_upfront_fee')),
+        ]
+        for purchase_option, price_description, price in reserved_rows:
+            if price is not None:
+                data['reserved'].append({
+                    'termtype': 'Reserved',
+                    'operating_system': operating_system,
+                    'purchaseoption': purchase_option,
+                    'leasecontractlength': term,
+                    'pricedescription': price_description,
+                    'priceperunit': price,
+                })
+
+        for plan in SAVINGS_PLAN_TYPES:
+            for purchase_option, option in PURCHASE_OPTIONS.items():
+                rate = row.get(f'{plan}_{term}yr_{option}_rate')
+                if rate is not None:
+                    data[plan].append({'purchaseoption': purchase_option, 'leasecontractlength': term, 'discountedrate': rate})
+    return data
+
+def query_batch_pricing_matrix(keys: List[Tuple[str, str, str, str]]) -> Dict[Tuple[str, str, str, str], Dict[str, Any]]:
+    """Look up a batch of instance keys in the pricing matrix with one BigQuery job"""
+    table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_PRICING_MATRIX}"
+
+    logger.info(f"Querying pricing matrix for {len(keys)} unique instances")
+
+    query = f"""
+    SELECT m.*
+    FROM `{table_id}` AS m
+    JOIN UNNEST(@instances) AS i
+    ON m.region_code = i.region_code
+    AND m.instance_type = i.instance_type
+    AND m.operation = i.operation
+    AND m.tenancy = i.tenancy
+    """
+
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ArrayQueryParameter(
+                "instances",
+                "STRUCT",
+                [
+                    bigquery.StructQueryParameter(
+                        None,
+                        bigquery.ScalarQueryParameter("region_code", "STRING", region_code),
+                        bigquery.ScalarQueryParameter("instance_type", "STRING", instance_type),
+                        bigquery.ScalarQueryParameter("operation", "STRING", operation),
+                        bigquery.ScalarQueryParameter("tenancy", "STRING", tenancy),
+                    )
+                    for region_code, instance_type, operation, tenancy in keys
+                ],
+            )
+        ]
+    )
+
+    rows = run_query(query, job_config)
+
+    logger.info(f"Pricing matrix query results count: {len(rows)}")
+    return {
+        (row.get('region_code'), row.get('instance_type'), row.get('operation'), row.get('tenancy')): pricing_data_from_matrix_row(row)
+        for row in rows
+    }
+
+def fetch_batch_pricing_data(instances: List[EC2Instance]) -> Optional[Dict[Tuple[str, str, str, str], Dict[str, Any]]]:
+    """
+    Fetch pricing data for a batch of instances with one global query plus one
+    savings plan query per region. Returns None if the batched lookup fails so
+    callers can fall back to the per-instance queries.
+    """
+    keys = list(dict.fromkeys(pricing_key(instance) for instance in instances))
+    if not keys:
+        return {}
+
+    # Serve from the in-memory snapshot when it can answer every key
+    if pricing_snapshot.ready:
+        snapshot_data = {key: pricing_snapshot.lookup(key) for key in keys}
+        if all(data is not None for data in snapshot_data.values()):
+            return snapshot_data
+
+    # The pricing matrix answers each key with a single row; keys it does not
+    # hold are looked up in the pricing tables below
+    matrix_data: Dict[Tuple[str, str, str, str], Dict[str, Any]] = {}
+    if PRICING_MATRIX_ENABLED:
+        matrix_future = query_executor.submit(query_batch_pricing_matrix, keys)
+        try:
+            matrix_data = matrix_future.result(timeout=BIGQUERY_QUERY_TIMEOUT_SECONDS)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            matrix_future.cancel()
+            logger.error(f"Pricing matrix lookup failed, falling back to pricing tables: {str(e)}")
+        keys = [key for key in keys if key not in matrix_data]
+        if not keys:
+            return matrix_data
+
+    sp_keys_by_region: Dict[str, List[Tuple[str, str]]] = {}
+    for region_code, instance_type, operation, _ in keys:
+        region_keys = sp_keys_by_region.setdefault(region_code, [])
+        if (instance_type, operation) not in region_keys:
+            region_keys.append((instance_type, operation))
+
+    # The global query and the savings plan queries run concurrently. The
+    # all-region table answers every region in one query; otherwise each
+    # region's table is queried separately.
+    global_future = query_executor.submit(query_batch_global_pricing, keys)
+    if SAVINGS_PLAN_ALL_REGIONS_ENABLED:
+        sp_futures = {None: query_executor.submit(query_batch_all_regions_savings_plan_pricing, sp_keys_by_region)}
+    else:
+        sp_futures = {
+            region_code: query_executor.submit(query_batch_savings_plan_pricing, region_code, region_keys)
+            for region_code, region_keys in sp_keys_by_region.items()
+        }
+
     try:
-        # Query pricing data from BigQuery
-        on_demand_data = query_on_demand_pricing(instance)
-        ri_data = query_reserved_instance_pricing(instance)
-        compute_sp_data = query_compute_savings_plan_pricing(instance)
-        ec2_sp_data = query_ec2_savings_plan_pricing(instance)
-
-        # Update operating_system from database if available
-        if on_demand_data and 'operating_system' in on_demand_data:
-            instance.operating_system = on_demand_data['operating_system']
-        elif ri_data and len(ri_data) > 0 and 'operating_system' in ri_data[0]:
-            instance.operating_system = ri_data[0]['operating_system']
-
-        # Extract hourly rates
-        on_demand_hourly_rate = float(on_demand_data.get('priceperunit', 0.0)) if on_demand_data else 0.0
-
-        # Calculate On-Demand costs
-        hours_1_year = 8760  # 365 * 24
-        hours_3_year = 26280  # 3 * 365 * 24
-
-        on_demand_1_year_total_cost = on_demand_hourly_rate * hours_1_year * instance.qty
-        on_demand_3_year_total_cost = on_demand_hourly_rate * hours_3_year * instance.qty
-
-        # Helper functions for RI and SP calculations
-        def calculate_ri_costs(term_years: int) -> Dict[str, Any]:
-            """Calculate RI costs for a given term"""
-            term_str = f"{term_years}yr"
-            hours = hours_1_year * term_years
-
-            # Filter RI data for this term
-            term_ri_data = [row for row in ri_data if row.get('leasecontractlength') == term_str]
-
-            costs = {
-                'no_upfront': 0.0,
-                'no_upfront_hourly_rate': 0.0,
-                'partial_upfront': {'total_cost': 0.0, 'upfront_fee': 0.0, 'plan_cost': 0.0},
-                'partial_upfront_hourly_rate': 0.0,
-                'all_upfront': 0.0,
-                'all_upfront_hourly_rate': 0.0
-            }
+        deadline = time.monotonic() + BIGQUERY_QUERY_TIMEOUT_SECONDS
+        global_data = global_future.result(timeout=max(0.0, deadline - time.monotonic()))
+        sp_data = {}
+        for region_code, future in sp_futures.items():
+            region_data = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            if region_code is None:
+                sp_data.update(region_data)
+            else:
+                sp_data[region_code] = region_data
+    except Exception as e:
+        for future in [global_future, *sp_futures.values()]:
+            future.cancel()
+        if isinstance(e, AdmissionRejected):
+            raise
+        logger.error(f"Batched BigQuery pricing lookup failed, falling back to per-instance queries: {str(e)}")
+        return None
+
+    results = dict(matrix_data)
+    for key in keys:
+        region_code, instance_type, operation, _ = key
+        data = empty_pricing_data()
+        data.update(global_data.get(key, {}))
+        data.update(sp_data.get(region_code, {}).get((instance_type, operation), {}))
+        results[key] = data
+    return results
+
+# Pricing view versions
+
+def get_view_source_table(view_name: str) -> Optional[str]:
+    """
+    Return the physical table a _latest view currently selects from, or None
+    if the view does not exist. Other lookup failures are raised, so a
+    transient error is not mistaken for a new pricing version.
+    """
+    view_id = f"{PROJECT_ID}.{BQ_DATASET}.{view_name}"
+    try:
+        view = bigquery_client.get_table(view_id)
+    except NotFound:
+        return None
+    except Exception as e:
+        logger.error(f"Failed to resolve source table for view {view_id}: {str(e)}")
+        raise
+    # view_query = "SELECT * FROM `project.dataset.table`"
+    parts = (view.view_query or "").split('.')
+    if len(parts) >= 3:
+        return parts[-1].strip().strip('`')
+    return None
+
+def list_savings_plan_views() -> List[str]:
+    """List the per-region savings plan _latest views in the dataset"""
+    views = []
+    for table in bigquery_client.list_tables(f"{PROJECT_ID}.{BQ_DATASET}"):
+        if table.table_id.startswith(BQ_TABLE_SAVINGS_PLAN_PREFIX) and table.table_id.endswith("_latest"):
+            views.append(table.table_id)
+    return sorted(views)
+
+def savings_plan_view_region(view_name: str) -> str:
+    """Region code of a savings plan _latest view, e.g. savings_plan_us_east_1_latest -> us-east-1"""
+    return view_name[len(BQ_TABLE_SAVINGS_PLAN_PREFIX):-len("_latest")].replace('_', '-')
+
+def list_ingested_regions() -> List[str]:
+    """Regions the pricing job has loaded savings plan tables for"""
+    return [savings_plan_view_region(view_name) for view_name in list_savings_plan_views()]
+
+def get_latest_view_versions() -> Dict[str, Optional[str]]:
+    """Map each _latest pricing view to the versioned table it points at"""
+    view_names = [BQ_TABLE_EC2_GLOBAL] + list_savings_plan_views()
+    return {view_name: get_view_source_table(view_name) for view_name in view_names}
+
+# In-memory pricing snapshot
+
+class PricingSnapshotTooLarge(RuntimeError):
+    """Raised when a snapshot build would hold more than max_rows rows"""
+
+def estimate_row_bytes(rows: List[Dict[str, Any]], sample_size: int = 100) -> int:
+    """Approximate in-memory size of one row dict, from a sample of rows"""
+    sample = rows[:sample_size]
+    if not sample:
+        return 0
+    total = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values()) for row in sample)
+    return total // len(sample)
+
+class PricingSnapshot:
+    """
+    In-memory hash indexes over the BoxUsage On-Demand, Reserved Instance and
+    Savings Plan rows behind the _latest views. Lookups return the same data
+    shape as the per-instance BigQuery queries so calculate_pricing can use
+    either source. The snapshot is rebuilt in the background whenever one of
+    the views is repointed at a new table. A build that fails or would exceed
+    max_rows keeps the current snapshot.
+    """
 
-            for row in term_ri_data:
-                purchase_option = row.get('purchaseoption', '')
-                price = float(row.get('priceperunit', 0.0))
-
-                if purchase_option == 'No Upfront':
-                    # Hourly rate * hours
-                    costs['no_upfront'] = price * hours * instance.qty
-                    costs['no_upfront_hourly_rate'] = price
-                elif purchase_option == 'Partial Upfront':
-                    if 'Upfront Fee' in row.get('pricedescription', ''):
-                        # This is the upfront fee
-                        costs['partial_upfront']['upfront_fee'] = price * instance.qty
-                    else:
-                        # This is the hourly rate
-                        plan_cost = price * hours * instance.qty
-                        costs['partial_upfront']['plan_cost'] = plan_cost
-                        costs['partial_upfront']['total_cost'] = costs['partial_upfront']['upfront_fee'] + plan_cost
-                        costs['partial_upfront_hourly_rate'] = price
-                elif purchase_option == 'All Upfront':
-                    if 'Upfront Fee' in row.get('pricedescription', ''):
-                        # All upfront fee
-                        costs['all_upfront'] = price * instance.qty
-                        # For all upfront, the effective hourly rate is the total cost / hours
-                        costs['all_upfront_hourly_rate'] = (price * instance.qty) / hours if hours > 0 else 0.0
-            return costs
-
-        def calculate_sp_costs(plan_type: str, term_years: int) -> Dict[str, Any]:
-            """Calculate Savings Plan costs for a given plan type and term"""
-            hours = hours_1_year * term_years
-
-            # Filter SP data
-            if plan_type == 'compute':
-                sp_data = compute_sp_data
-            else:  # ec2
-                sp_data = ec2_sp_data
-
-            term_sp_data = [row for row in sp_data if str(row.get('leasecontractlength', '')) == str(term_years)]
-
-            costs = {
-                'no_upfront': 0.0,
-                'no_upfront_hourly_rate': 0.0,
-                'partial_upfront': {'total_cost': 0.0, 'upfront_fee': 0.0, 'plan_cost': 0.0},
-                'partial_upfront_hourly_rate': 0.0,
-                'all_upfront': 0.0,
-                'all_upfront_hourly_rate': 0.0
+    def __init__(
+        self,
+        regions: Optional[List[str]] = None,
+        max_rows: int = PRICING_SNAPSHOT_MAX_ROWS,
+        query_timeout_seconds: float = PRICING_SNAPSHOT_QUERY_TIMEOUT_SECONDS,
+    ):
+        self.regions = set(regions) if regions else None
+        self.max_rows = max_rows
+        self.query_timeout_seconds = query_timeout_seconds
+        self.versions: Dict[str, Optional[str]] = {}
+        self.loaded_at: Optional[float] = None
+        self.row_count = 0
+        self.estimated_bytes = 0
+        self._indexes: Optional[Dict[str, Any]] = None
+        self._build_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._indexes is not None
+
+    def lookup(self, key: Tuple[str, str, str, str]) -> Optional[Dict[str, Any]]:
+        """Return pricing data for a key, or None if the snapshot cannot answer it"""
+        indexes = self._indexes
+        if indexes is None:
+            return None
+
+        region_code, instance_type, operation, _ = key
+        if self.regions is not None and region_code not in self.regions:
+            return None
+
+        sp_key = (region_code, instance_type, operation)
+        return {
+            'on_demand': indexes['on_demand'].get(key, {}),
+            'reserved': indexes['reserved'].get(key, []),
+            'compute_savings_plan': indexes['compute_savings_plan'].get(sp_key, []),
+            'ec2_savings_plan': indexes['ec2_savings_plan'].get(sp_key, []),
+        }
+
+    def _region_filter(self, column: str) -> Tuple[str, List[Any]]:
+        if self.regions is None:
+            return "", []
+        return (
+            f" AND {column} IN UNNEST(@regions)",
+            [bigquery.ArrayQueryParameter("regions", "STRING", sorted(self.regions))],
+        )
+
+    def _run_limited(self, query: str, job_config: Optional[bigquery.QueryJobConfig], remaining_rows: int) -> List[Dict[str, Any]]:
+        """Run a snapshot query, fetching at most one row past the remaining budget"""
+        rows = run_query(f"{query}\n        LIMIT {remaining_rows + 1}", job_config, timeout=self.query_timeout_seconds)
+        if len(rows) > remaining_rows:
+            raise PricingSnapshotTooLarge(
+                f"Pricing snapshot would exceed {self.max_rows} rows; "
+                "set PRICING_SNAPSHOT_REGIONS or raise PRICING_SNAPSHOT_MAX_ROWS"
+            )
+        return rows
+
+    def _load_global(self, indexes: Dict[str, Any], remaining_rows: int) -> Tuple[int, int]:
+        table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_EC2_GLOBAL}"
+        region_clause, params = self._region_filter("region_code")
+        # Same predicates as the per-instance On-Demand and Reserved Instance queries
+        query = f"""
+        SELECT sku, region_code, instance_type, operation, tenancy, termtype, operating_system,
+               pricedescription, priceperunit, leasecontractlength, purchaseoption
+        FROM `{table_id}`
+        WHERE usagetype LIKE "%BoxUsage%"
+        AND (termtype = "OnDemand" OR (termtype LIKE "Reserved" AND offeringclass = "standard"))
+        {region_clause}
+        """
+        rows = self._run_limited(query, bigquery.QueryJobConfig(query_parameters=params), remaining_rows)
+
+        for row in rows:
+            key = (row['region_code'], row['instance_type'], row['operation'], row['tenancy'])
+            if row['termtype'] == 'OnDemand':
+                if is_preferred_on_demand_row(row, indexes['on_demand'].get(key, {})):
+                    indexes['on_demand'][key] = row
+            else:
+                indexes['reserved'].setdefault(key, []).append(row)
+        return len(rows), len(rows) * estimate_row_bytes(rows)
+
+    def _load_savings_plans(self, view_name: str, indexes: Dict[str, Any], remaining_rows: int) -> Tuple[int, int]:
+        table_id = f"{PROJECT_ID}.{BQ_DATASET}.{view_name}"
+        query = f"""
+        SELECT discountedregioncode, discountedinstancetype, discountedoperation, product_family,
+               purchaseoption, leasecontractlength, discountedrate
+        FROM `{table_id}`
+        WHERE discountedusagetype LIKE "%-BoxUsage%"
+        AND product_family IN ("ComputeSavingsPlans", "EC2InstanceSavingsPlans")
+        """
+        rows = self._run_limited(query, None, remaining_rows)
+
+        for row in rows:
+            key = (row['discountedregioncode'], row['discountedinstancetype'], row['discountedoperation'])
+            index = 'compute_savings_plan' if row['product_family'] == 'ComputeSavingsPlans' else 'ec2_savings_plan'
+            indexes[index].setdefault(key, []).append(row)
+        return len(rows), len(rows) * estimate_row_bytes(rows)
+
+    def build(self, versions: Optional[Dict[str, Optional[str]]] = None) -> None:
+        """Load all rows from BigQuery into fresh indexes and swap them in"""
+        with self._build_lock:
+            started = time.monotonic()
+            if versions is None:
+                versions = get_latest_view_versions()
+
+            indexes: Dict[str, Any] = {
+                'on_demand': {},
+                'reserved': {},
+                'compute_savings_plan': {},
+                'ec2_savings_plan': {},
             }
+            row_count, estimated_bytes = self._load_global(indexes, self.max_rows)
+            for view_name in versions:
+                if view_name == BQ_TABLE_EC2_GLOBAL:
+                    continue
+                if self.regions is not None and savings_plan_view_region(view_name) not in self.regions:
+                    continue
+                view_rows, view_bytes = self._load_savings_plans(view_name, indexes, self.max_rows - row_count)
+                row_count += view_rows
+                estimated_bytes += view_bytes
+
+            self._indexes = indexes
+            self.versions = versions
+            self.row_count = row_count
+            self.estimated_bytes = estimated_bytes
+            self.loaded_at = time.time()
+            logger.info(
+                f"Pricing snapshot loaded {row_count} rows (about {estimated_bytes / (1024 * 1024):.0f} MiB) "
+                f"in {time.monotonic() - started:.1f}s: {versions}"
+            )
+
+    def refresh_if_stale(self) -> bool:
+        """
+        Rebuild the snapshot if any _latest view points at a different table.
+        If the views cannot be read, the error is raised and the current
+        snapshot is kept.
+        """
+        versions = get_latest_view_versions()
+        if self.ready and versions == self.versions:
+            return False
+        logger.info(f"Pricing versions changed from {self.versions} to {versions}; rebuilding snapshot")
+        self.build(versions)
+        return True
+
+    def _run(self, interval_seconds: float) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh_if_stale()
+            except Exception as e:
+                logger.error(f"Pricing snapshot refresh failed: {str(e)}")
+            self._stop_event.wait(interval_seconds)
+
+    def start(self, interval_seconds: float) -> None:
+        """Build the snapshot and keep it current from a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval_seconds,), name="pricing-snapshot", daemon=True)
+        self._thread.start()
 
-            for row in term_sp_data:
-                purchase_option = row.get('purchaseoption', '')
-                discounted_rate = float(row.get('discountedrate', 0.0))
-                tco = discounted_rate * hours * instance.qty
+    def stop(self) -> None:
+        self._stop_event.set()
 
-                if purchase_option == 'No Upfront':
-                    costs['no_upfront'] = tco
-                    costs['no_upfront_hourly_rate'] = discounted_rate
-                elif purchase_option == 'Partial Upfront':
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": PRICING_SNAPSHOT_ENABLED,
+            "ready": self.ready,
+            "row_count": self.row_count,
+            "max_rows": self.max_rows,
+            "estimated_bytes": self.estimated_bytes,
+            "loaded_at": self.loaded_at,
+            "versions": self.versions,
+        }
+
+pricing_snapshot = PricingSnapshot(PRICING_SNAPSHOT_REGIONS)
+
+# Pricing result cache
+
+# Cost fields that are proportional to qty. The all upfront RI hourly rate is
+# derived from the qty-scaled upfront fee, so it scales as well.
+QTY_SCALED_FIELDS = [
+    name for name in PricingResults.model_fields
+    if name.endswith('_total_cost') or (name.startswith('standard_reserved_instance_') and name.endswith('_all_upfront_hourly_rate'))
+]
+
+def scale_pricing_results(results: PricingResults, qty: int) -> PricingResults:
+    """Scale single-unit pricing results to the requested quantity"""
+    scaled = {}
+    for name in QTY_SCALED_FIELDS:
+        value = getattr(results, name)
+        if isinstance(value, dict):
+            scaled[name] = {key: amount * qty for key, amount in value.items()}
+        else:
+            scaled[name] = value * qty
+    return results.model_copy(update=scaled)
+
+class PricingVersionCheck:
+    """
+    Tracks the pricing version behind the _latest views. The views are only
+    queried once every check_seconds; the snapshot's versions are used while
+    it is loaded.
+    """
+
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._version: Optional[Tuple] = None
+        self._checked_at = 0.0
+        self._checking = threading.Lock()
+
+    def current(self) -> Optional[Tuple]:
+        """
+        Call without holding a cache lock: a due check queries BigQuery. While
+        one thread checks, others get the last known version.
+        """
+        if pricing_snapshot.ready:
+            return tuple(sorted(pricing_snapshot.versions.items()))
+
+        if self._checked_at and time.monotonic() - self._checked_at < self.check_seconds:
+            return self._version
+        if not self._checking.acquire(blocking=not self._checked_at):
+            return self._version
+        try:
+            if self._checked_at and time.monotonic() - self._checked_at < self.check_seconds:
+                return self._version
+            try:
+                self._version = tuple(sorted(get_latest_view_versions().items()))
+            except Exception as e:
+                logger.error(f"Failed to check pricing version: {str(e)}")
+            self._checked_at = time.monotonic()
+            return self._version
+        finally:
+            self._checking.release()
+
+    def reset(self) -> None:
+        self._version = None
+        self._checked_at = 0.0
+
+class PricingResultCache:
+    """
+    Bounded LRU cache of single-unit PricingResults. Entries expire after a TTL
+    and the whole cache is invalidated when the pricing version behind the
+    _latest views changes.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, version_check_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple] = None
+        self._version_check = PricingVersionCheck(version_check_seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _current_version(self) -> Optional[Tuple]:
+        return self._version_check.current()
+
+    def _check_version(self, version: Optional[Tuple]) -> None:
+        """Drop every entry if version differs; call with the lock held"""
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Pricing version changed; invalidating {len(self._entries)} cached results")
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            self._version = version
+
+    def _live_entry(self, key: Tuple) -> Optional[Tuple[float, str, PricingResults]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        return entry
+
+    def get(self, key: Tuple) -> Optional[Tuple[str, PricingResults]]:
+        """Return (operating_system, unit results) for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def contains(self, key: Tuple) -> bool:
+        """Check for a live entry without touching counters or LRU order"""
+        if not self.enabled:
+            return False
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            return self._live_entry(key) is not None
+
+    def put(self, key: Tuple, operating_system: str, results: PricingResults) -> None:
+        if not self.enabled:
+            return
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, operating_system, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+            self._version = None
+            self._version_check.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "version": dict(self._version) if self._version else None,
+        }
+
+pricing_cache = PricingResultCache(PRICING_CACHE_SIZE, PRICING_CACHE_TTL_SECONDS, PRICING_CACHE_VERSION_CHECK_SECONDS)
+
+# Vectorized pricing kernel
+
+HOURS_PER_YEAR = 8760  # 365 * 24
+PRICING_TERMS = (1, 3)
+PURCHASE_OPTIONS = {
+    'No Upfront': 'no_upfront',
+    'Partial Upfront': 'partial_upfront',
+    'All Upfront': 'all_upfront',
+}
+SAVINGS_PLAN_TYPES = ('compute_savings_plan', 'ec2_savings_plan')
+
+# Kernel input: one row per instance holding every hourly rate and upfront fee
+# found in its pricing rows. Missing rows leave their column at zero.
+RATE_COLUMNS = ['on_demand_rate']
+for _term in PRICING_TERMS:
+    RATE_COLUMNS += [
+        f'ri_{_term}yr_no_upfront_rate',
+        f'ri_{_term}yr_partial_upfront_rate',
+        f'ri_{_term}yr_partial_upfront_fee',
+        f'ri_{_term}yr_all_upfront_fee',
+    ]
+    RATE_COLUMNS += [
+        f'{_plan}_{_term}yr_{_option}_rate'
+        for _plan in SAVINGS_PLAN_TYPES
+        for _option in PURCHASE_OPTIONS.values()
+    ]
+RATE_COLUMN_INDEX = {name: index for index, name in enumerate(RATE_COLUMNS)}
+
+# Lease lengths are INT64 years in typed pricing tables, and "1yr"/"3yr" (RI) or
+# "1"/"3" (Savings Plans) in tables loaded as STRING
+LEASE_TERMS = {term: term for term in PRICING_TERMS}
+LEASE_TERMS.update({f'{term}yr': term for term in PRICING_TERMS})
+LEASE_TERMS.update({str(term): term for term in PRICING_TERMS})
+
+def fill_pricing_rates(rates: np.ndarray, pricing_data: Dict[str, Any]) -> None:
+    """Copy the rates and fees from one instance's pricing rows into its kernel input row"""
+    on_demand_data = pricing_data['on_demand']
+    if on_demand_data:
+        rates[0] = float(on_demand_data.get('priceperunit', 0.0))
+
+    for row in pricing_data['reserved']:
+        option = PURCHASE_OPTIONS.get(row.get('purchaseoption', ''))
+        term = LEASE_TERMS.get(row.get('leasecontractlength'))
+        if option is None or term is None:
+            continue
+        is_upfront_fee = 'Upfront Fee' in row.get('pricedescription', '')
+        if option == 'no_upfront':
+            column = f'ri_{term}yr_no_upfront_rate'
+        elif option == 'partial_upfront':
+            column = f'ri_{term}yr_partial_upfront_fee' if is_upfront_fee else f'ri_{term}yr_partial_upfront_rate'
+        elif is_upfront_fee:
+            column = f'ri_{term}yr_all_upfront_fee'
+        else:
+            # All upfront RIs also list a zero hourly rate, which is not needed
+            continue
+        rates[RATE_COLUMN_INDEX[column]] = float(row.get('priceperunit', 0.0))
+
+    for plan in SAVINGS_PLAN_TYPES:
+        for row in pricing_data[plan]:
+            option = PURCHASE_OPTIONS.get(row.get('purchaseoption', ''))
+            term = LEASE_TERMS.get(row.get('leasecontractlength'))
+            if option is None or term is None:
+                continue
+            rates[RATE_COLUMN_INDEX[f'{plan}_{term}yr_{option}_rate']] = float(row.get('discountedrate', 0.0))
+
+def extract_pricing_rates(pricing_data: List[Dict[str, Any]]) -> np.ndarray:
+    """Build the N x len(RATE_COLUMNS) kernel input for a list of pricing_data entries"""
+    rates = np.zeros((len(pricing_data), len(RATE_COLUMNS)))
+    for row, data in zip(rates, pricing_data):
+        fill_pricing_rates(row, data)
+    return rates
+
+def compute_pricing_columns(rates: np.ndarray, qty: np.ndarray) -> Dict[str, Any]:
+    """
+    Price every On-Demand, Reserved Instance and Savings Plan scenario for N
+    instances at once. Returns one array per PricingResults field; partial
+    upfront fields are dicts of total_cost, upfront_fee and plan_cost arrays.
+    """
+    def rate(name: str) -> np.ndarray:
+        return rates[:, RATE_COLUMN_INDEX[name]]
+
+    on_demand_rate = rate('on_demand_rate')
+    columns: Dict[str, Any] = {'on_demand_hourly_rate': on_demand_rate}
+
+    for term in PRICING_TERMS:
+        hours = HOURS_PER_YEAR * term
+        unit_hours = qty * hours
+        columns[f'on_demand_{term}_year_total_cost'] = on_demand_rate * unit_hours
+
+        # Standard Reserved Instances
+        prefix = f'standard_reserved_instance_{term}_year'
+        no_upfront_rate = rate(f'ri_{term}yr_no_upfront_rate')
+        columns[f'{prefix}_no_upfront_total_cost'] = no_upfront_rate * unit_hours
+        columns[f'{prefix}_no_upfront_hourly_rate'] = no_upfront_rate
+
+        partial_upfront_rate = rate(f'ri_{term}yr_partial_upfront_rate')
+        upfront_fee = rate(f'ri_{term}yr_partial_upfront_fee') * qty
+        plan_cost = partial_upfront_rate * unit_hours
+        columns[f'{prefix}_partial_upfront_total_cost'] = {
+            'total_cost': upfront_fee + plan_cost,
+            'upfront_fee': upfront_fee,
+            'plan_cost': plan_cost,
+        }
+        columns[f'{prefix}_partial_upfront_hourly_rate'] = partial_upfront_rate
+
+        # For all upfront, the effective hourly rate is the total cost / hours
+        all_upfront_fee = rate(f'ri_{term}yr_all_upfront_fee') * qty
+        columns[f'{prefix}_all_upfront_total_cost'] = all_upfront_fee
+        columns[f'{prefix}_all_upfront_hourly_rate'] = all_upfront_fee / hours
+
+        # Compute and EC2 Savings Plans
+        for plan in SAVINGS_PLAN_TYPES:
+            prefix = f'{plan}_{term}_year'
+            for option in PURCHASE_OPTIONS.values():
+                discounted_rate = rate(f'{plan}_{term}yr_{option}_rate')
+                total_cost = discounted_rate * unit_hours
+                if option == 'partial_upfront':
                     # 50% upfront, 50% plan cost
-                    upfront_fee = tco * 0.5
-                    plan_cost = tco * 0.5
-                    costs['partial_upfront'] = {
-                        'total_cost': tco,
-                        'upfront_fee': upfront_fee,
-                        'plan_cost': plan_cost
+                    columns[f'{prefix}_{option}_total_cost'] = {
+                        'total_cost': total_cost,
+                        'upfront_fee': total_cost * 0.5,
+                        'plan_cost': total_cost * 0.5,
                     }
-                    costs['partial_upfront_hourly_rate'] = discounted_rate
-                elif purchase_option == 'All Upfront':
-                    costs['all_upfront'] = tco
-                    costs['all_upfront_hourly_rate'] = discounted_rate
-
-            return costs
-
-        # Calculate all pricing scenarios
-        ri_1_year = calculate_ri_costs(1)
-        ri_3_year = calculate_ri_costs(3)
-        compute_sp_1_year = calculate_sp_costs('compute', 1)
-        compute_sp_3_year = calculate_sp_costs('compute', 3)
-        ec2_sp_1_year = calculate_sp_costs('ec2', 1)
-        ec2_sp_3_year = calculate_sp_costs('ec2', 3)
-
-        return PricingResults(
-            on_demand_hourly_rate=on_demand_hourly_rate,
-            on_demand_1_year_total_cost=on_demand_1_year_total_cost,
-            on_demand_3_year_total_cost=on_demand_3_year_total_cost,
-            
-            # Compute Savings Plan 1 Year
-            compute_savings_plan_1_year_no_upfront_total_cost=compute_sp_1_year['no_upfront'],
-            compute_savings_plan_1_year_no_upfront_hourly_rate=compute_sp_1_year['no_upfront_hourly_rate'],
-            compute_savings_plan_1_year_partial_upfront_total_cost=compute_sp_1_year['partial_upfront'],
-            compute_savings_plan_1_year_partial_upfront_hourly_rate=compute_sp_1_year['partial_upfront_hourly_rate'],
-            compute_savings_plan_1_year_all_upfront_total_cost=compute_sp_1_year['all_upfront'],
-            compute_savings_plan_1_year_all_upfront_hourly_rate=compute_sp_1_year['all_upfront_hourly_rate'],
-            
-            # Compute Savings Plan 3 Year
-            compute_savings_plan_3_year_no_upfront_total_cost=compute_sp_3_year['no_upfront'],
-            compute_savings_plan_3_year_no_upfront_hourly_rate=compute_sp_3_year['no_upfront_hourly_rate'],
-            compute_savings_plan_3_year_partial_upfront_total_cost=compute_sp_3_year['partial_upfront'],
-            compute_savings_plan_3_year_partial_upfront_hourly_rate=compute_sp_3_year['partial_upfront_hourly_rate'],
-            compute_savings_plan_3_year_all_upfront_total_cost=compute_sp_3_year['all_upfront'],
-            compute_savings_plan_3_year_all_upfront_hourly_rate=compute_sp_3_year['all_upfront_hourly_rate'],
-            
-            # EC2 Savings Plan 1 Year
-            ec2_savings_plan_1_year_no_upfront_total_cost=ec2_sp_1_year['no_upfront'],
-            ec2_savings_plan_1_year_no_upfront_hourly_rate=ec2_sp_1_year['no_upfront_hourly_rate'],
-            ec2_savings_plan_1_year_partial_upfront_total_cost=ec2_sp_1_year['partial_upfront'],
-            ec2_savings_plan_1_year_partial_upfront_hourly_rate=ec2_sp_1_year['partial_upfront_hourly_rate'],
-            ec2_savings_plan_1_year_all_upfront_total_cost=ec2_sp_1_year['all_upfront'],
-            ec2_savings_plan_1_year_all_upfront_hourly_rate=ec2_sp_1_year['all_upfront_hourly_rate'],
-            
-            # EC2 Savings Plan 3 Year
-            ec2_savings_plan_3_year_no_upfront_total_cost=ec2_sp_3_year['no_upfront'],
-            ec2_savings_plan_3_year_no_upfront_hourly_rate=ec2_sp_3_year['no_upfront_hourly_rate'],
-            ec2_savings_plan_3_year_partial_upfront_total_cost=ec2_sp_3_year['partial_upfront'],
-            ec2_savings_plan_3_year_partial_upfront_hourly_rate=ec2_sp_3_year['partial_upfront_hourly_rate'],
-            ec2_savings_plan_3_year_all_upfront_total_cost=ec2_sp_3_year['all_upfront'],
-            ec2_savings_plan_3_year_all_upfront_hourly_rate=ec2_sp_3_year['all_upfront_hourly_rate'],
-            
-            # Standard Reserved Instance 1 Year
-            standard_reserved_instance_1_year_no_upfront_total_cost=ri_1_year['no_upfront'],
-            standard_reserved_instance_1_year_no_upfront_hourly_rate=ri_1_year['no_upfront_hourly_rate'],
-            standard_reserved_instance_1_year_partial_upfront_total_cost=ri_1_year['partial_upfront'],
-            standard_reserved_instance_1_year_partial_upfront_hourly_rate=ri_1_year['partial_upfront_hourly_rate'],
-            standard_reserved_instance_1_year_all_upfront_total_cost=ri_1_year['all_upfront'],
-            standard_reserved_instance_1_year_all_upfront_hourly_rate=ri_1_year['all_upfront_hourly_rate'],
-            
-            # Standard Reserved Instance 3 Year
-            standard_reserved_instance_3_year_no_upfront_total_cost=ri_3_year['no_upfront'],
-            standard_reserved_instance_3_year_no_upfront_hourly_rate=ri_3_year['no_upfront_hourly_rate'],
-            standard_reserved_instance_3_year_partial_upfront_total_cost=ri_3_year['partial_upfront'],
-            standard_reserved_instance_3_year_partial_upfront_hourly_rate=ri_3_year['partial_upfront_hourly_rate'],
-            standard_reserved_instance_3_year_all_upfront_total_cost=ri_3_year['all_upfront'],
-            standard_reserved_instance_3_year_all_upfront_hourly_rate=ri_3_year['all_upfront_hourly_rate'],
-        )
+                else:
+                    columns[f'{prefix}_{option}_total_cost'] = total_cost
+                columns[f'{prefix}_{option}_hourly_rate'] = discounted_rate
+
+    return columns
+
+def pricing_results_from_columns(columns: Dict[str, Any]) -> List[PricingResults]:
+    """Turn the kernel's column arrays back into one PricingResults per instance"""
+    values: Dict[str, List[Any]] = {}
+    for name, column in columns.items():
+        if isinstance(column, dict):
+            parts = {part: array.tolist() for part, array in column.items()}
+            values[name] = [dict(zip(parts, amounts)) for amounts in zip(*parts.values())]
+        else:
+            values[name] = column.tolist()
+
+    # The kernel only produces floats, so validation can be skipped
+    names = list(values)
+    return [PricingResults.model_construct(**dict(zip(names, row))) for row in zip(*values.values())]
+
+def price_pricing_data(pricing_data: List[Dict[str, Any]], qty: List[int]) -> List[PricingResults]:
+    """Price a list of pricing_data entries at the given quantities in one kernel pass"""
+    rates = extract_pricing_rates(pricing_data)
+    return pricing_results_from_columns(compute_pricing_columns(rates, np.asarray(qty, dtype=float)))
+
+def pricing_data_operating_system(pricing_data: Dict[str, Any]) -> Optional[str]:
+    """Operating system name reported by the pricing rows, if any"""
+    on_demand_data = pricing_data['on_demand']
+    ri_data = pricing_data['reserved']
+    if on_demand_data and 'operating_system' in on_demand_data:
+        return on_demand_data['operating_system']
+    if ri_data and 'operating_system' in ri_data[0]:
+        return ri_data[0]['operating_system']
+    return None
+
+def empty_pricing_results() -> PricingResults:
+    """Zero costs for every scenario, returned when an instance cannot be priced"""
+    return price_pricing_data([empty_pricing_data()], [1])[0]
+
+def build_pricing_results(
+    instance: EC2Instance,
+    on_demand_data: Dict[str, Any],
+    ri_data: List[Dict[str, Any]],
+    compute_sp_data: List[Dict[str, Any]],
+    ec2_sp_data: List[Dict[str, Any]],
+) -> PricingResults:
+    """Calculate all pricing scenarios for an instance from its pricing rows"""
+    pricing_data = {
+        'on_demand': on_demand_data,
+        'reserved': ri_data,
+        'compute_savings_plan': compute_sp_data,
+        'ec2_savings_plan': ec2_sp_data,
+    }
+
+    # Update operating_system from database if available
+    operating_system = pricing_data_operating_system(pricing_data)
+    if operating_system is not None:
+        instance.operating_system = operating_system
+
+    return price_pricing_data([pricing_data], [instance.qty])[0]
+
+def fetch_instance_pricing_data(instance: EC2Instance, errors: List[str]) -> Dict[str, Any]:
+    """
+    Run the four per-instance pricing queries concurrently on the shared query
+    pool. A query that fails or exceeds BIGQUERY_QUERY_TIMEOUT_SECONDS leaves
+    its slot empty and adds a message to errors.
+    """
+    queries = [
+        ('on_demand', 'On-Demand', query_on_demand_pricing),
+        ('reserved', 'Reserved Instance', query_reserved_instance_pricing),
+        ('compute_savings_plan', 'Compute Savings Plan', query_compute_savings_plan_pricing),
+        ('ec2_savings_plan', 'EC2 Savings Plan', query_ec2_savings_plan_pricing),
+    ]
+    futures = [
+        (name, label, query_executor.submit(query, instance, raise_errors=True))
+        for name, label, query in queries
+    ]
 
+    data = empty_pricing_data()
+    deadline = time.monotonic() + BIGQUERY_QUERY_TIMEOUT_SECONDS
+    for name, label, future in futures:
+        try:
+            data[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except AdmissionRejected:
+            raise
+        except FuturesTimeoutError:
+            # Only drops a query still waiting for a pool thread; one already
+            # running is cancelled by run_query when its own timeout expires
+            future.cancel()
+            errors.append(f"{label} pricing query timed out after {BIGQUERY_QUERY_TIMEOUT_SECONDS:g}s")
+        except Exception as e:
+            errors.append(f"{label} pricing query failed: {str(e)}")
+    return data
+
+def calculate_pricing(
+    instance: EC2Instance,
+    pricing_data: Optional[Dict[str, Any]] = None,
+    errors: Optional[List[str]] = None,
+) -> PricingResults:
+    """
+    Calculate all pricing scenarios for an instance. Results are served from
+    the result cache when possible. If pricing_data from fetch_batch_pricing_data
+    is given, it is used instead of querying BigQuery. Query failures are
+    appended to errors when a list is passed.
+    """
+    if errors is None:
+        errors = []
+
+    # Pricing rows depend only on pricing_key; the operating system is
+    # resolved from them, so the key is taken before it is overwritten.
+    cache_key = pricing_key(instance)
+    cached = pricing_cache.get(cache_key)
+    if cached is not None:
+        operating_system, unit_results = cached
+        instance.operating_system = operating_system
+        return scale_pricing_results(unit_results, instance.qty)
+
+    try:
+        if pricing_data is None:
+            pricing_data = pricing_snapshot.lookup(pricing_key(instance))
+
+        query_errors: List[str] = []
+        if pricing_data is None:
+            # Query pricing data from BigQuery
+            pricing_data = fetch_instance_pricing_data(instance, query_errors)
+            errors.extend(query_errors)
+
+        on_demand_data = pricing_data['on_demand']
+        ri_data = pricing_data['reserved']
+        compute_sp_data = pricing_data['compute_savings_plan']
+        ec2_sp_data = pricing_data['ec2_savings_plan']
+
+        # Price a single unit so the result can be cached independently of qty
+        unit_instance = instance.model_copy(update={'qty': 1})
+        unit_results = build_pricing_results(unit_instance, on_demand_data, ri_data, compute_sp_data, ec2_sp_data)
+        instance.operating_system = unit_instance.operating_system
+
+        # Partial results from failed queries must not be cached
+        if not query_errors:
+            pricing_cache.put(cache_key, instance.operating_system, unit_results)
+
+        return scale_pricing_results(unit_results, instance.qty)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Error calculating pricing for instance {instance.instance_type}: {str(e)}")
+        errors.append(f"Pricing calculation failed: {str(e)}")
         # Return zero costs on error
-        return PricingResults(
-            on_demand_hourly_rate=0.0,
-            on_demand_1_year_total_cost=0.0,
-            on_demand_3_year_total_cost=0.0,
-
-            # Compute Savings Plan 1 Year
-            compute_savings_plan_1_year_no_upfront_total_cost=0.0,
-            compute_savings_plan_1_year_no_upfront_hourly_rate=0.0,
-            compute_savings_plan_1_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-            compute_savings_plan_1_year_partial_upfront_hourly_rate=0.0,
-            compute_savings_plan_1_year_all_upfront_total_cost=0.0,
-            compute_savings_plan_1_year_all_upfront_hourly_rate=0.0,
-
-            # Compute Savings Plan 3 Year
-            compute_savings_plan_3_year_no_upfront_total_cost=0.0,
-            compute_savings_plan_3_year_no_upfront_hourly_rate=0.0,
-            compute_savings_plan_3_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-            compute_savings_plan_3_year_partial_upfront_hourly_rate=0.0,
-            compute_savings_plan_3_year_all_upfront_total_cost=0.0,
-            compute_savings_plan_3_year_all_upfront_hourly_rate=0.0,
-
-            # EC2 Savings Plan 1 Year
-            ec2_savings_plan_1_year_no_upfront_total_cost=0.0,
-            ec2_savings_plan_1_year_no_upfront_hourly_rate=0.0,
-            ec2_savings_plan_1_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-            ec2_savings_plan_1_year_partial_upfront_hourly_rate=0.0,
-            ec2_savings_plan_1_year_all_upfront_total_cost=0.0,
-            ec2_savings_plan_1_year_all_upfront_hourly_rate=0.0,
-
-            # EC2 Savings Plan 3 Year
-            ec2_savings_plan_3_year_no_upfront_total_cost=0.0,
-            ec2_savings_plan_3_year_no_upfront_hourly_rate=0.0,
-            ec2_savings_plan_3_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-            ec2_savings_plan_3_year_partial_upfront_hourly_rate=0.0,
-            ec2_savings_plan_3_year_all_upfront_total_cost=0.0,
-            ec2_savings_plan_3_year_all_upfront_hourly_rate=0.0,
-
-            # Standard Reserved Instance 1 Year
-            standard_reserved_instance_1_year_no_upfront_total_cost=0.0,
-            standard_reserved_instance_1_year_no_upfront_hourly_rate=0.0,
-            standard_reserved_instance_1_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-            standard_reserved_instance_1_year_partial_upfront_hourly_rate=0.0,
-            standard_reserved_instance_1_year_all_upfront_total_cost=0.0,
-            standard_reserved_instance_1_year_all_upfront_hourly_rate=0.0,
-
-            # Standard Reserved Instance 3 Year
-            standard_reserved_instance_3_year_no_upfront_total_cost=0.0,
-            standard_reserved_instance_3_year_no_upfront_hourly_rate=0.0,
-            standard_reserved_instance_3_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-            standard_reserved_instance_3_year_partial_upfront_hourly_rate=0.0,
-            standard_reserved_instance_3_year_all_upfront_total_cost=0.0,
-            standard_reserved_instance_3_year_all_upfront_hourly_rate=0.0,
-        )
+        return empty_pricing_results()
+
+def calculate_pricing_batch(
+    instances: List[EC2Instance],
+    batch_data: Optional[Dict[Tuple[str, str, str, str], Dict[str, Any]]] = None,
+) -> List[Tuple[PricingResults, List[str]]]:
+    """
+    Calculate pricing for many instances, returning (results, errors) for each.
+    Rows sharing a pricing_key are priced once and scaled by their own qty.
+    Cached shapes are served from the result cache and the rest are priced
+    together in one pass of the vectorized kernel. Shapes missing from
+    batch_data are looked up in the snapshot or queried individually.
+    """
+    shapes: Dict[Tuple[str, str, str, str], List[int]] = {}
+    for index, instance in enumerate(instances):
+        shapes.setdefault(pricing_key(instance), []).append(index)
+
+    priced: List[Optional[Tuple[PricingResults, List[str]]]] = [None] * len(instances)
+    pending: List[Tuple[List[int], Dict[str, Any], List[str]]] = []
+
+    for key, indexes in shapes.items():
+        instance = instances[indexes[0]]
+        cached = pricing_cache.get(key)
+        if cached is not None:
+            operating_system, unit_results = cached
+            for index in indexes:
+                instances[index].operating_system = operating_system
+                priced[index] = (scale_pricing_results(unit_results, instances[index].qty), [])
+            continue
+
+        pricing_data = batch_data.get(key) if batch_data is not None else None
+        if pricing_data is None:
+            pricing_data = pricing_snapshot.lookup(key)
+        errors: List[str] = []
+        if pricing_data is None:
+            pricing_data = fetch_instance_pricing_data(instance, errors)
+        pending.append((indexes, pricing_data, errors))
+
+    if not pending:
+        return priced
+
+    rates = np.zeros((len(pending), len(RATE_COLUMNS)))
+    for row, (indexes, pricing_data, errors) in zip(rates, pending):
+        try:
+            fill_pricing_rates(row, pricing_data)
+        except Exception as e:
+            logger.error(f"Error calculating pricing for instance {instances[indexes[0]].instance_type}: {str(e)}")
+            row[:] = 0.0
+            errors.append(f"Pricing calculation failed: {str(e)}")
+
+    # Fan each shape's rates back out to its rows and price them at their own qty
+    row_indexes = [index for indexes, _, _ in pending for index in indexes]
+    row_shapes = np.repeat(np.arange(len(pending)), [len(indexes) for indexes, _, _ in pending])
+    qty = np.array([instances[index].qty for index in row_indexes], dtype=float)
+    results = pricing_results_from_columns(compute_pricing_columns(rates[row_shapes], qty))
+    for index, shape, result in zip(row_indexes, row_shapes.tolist(), results):
+        priced[index] = (result, list(pending[shape][2]))
+
+    # Price a single unit of each shape as well so it can be cached independently of qty
+    if pricing_cache.enabled:
+        unit_results = pricing_results_from_columns(compute_pricing_columns(rates, np.ones(len(pending))))
+    else:
+        unit_results = [None] * len(pending)
+
+    for (indexes, pricing_data, errors), unit_result in zip(pending, unit_results):
+        # Key the cache before the operating system is replaced below
+        cache_key = pricing_key(instances[indexes[0]])
+        operating_system = pricing_data_operating_system(pricing_data)
+        if operating_system is not None:
+            for index in indexes:
+                instances[index].operating_system = operating_system
+        # Partial results from failed queries must not be cached
+        if unit_result is not None and not errors:
+            pricing_cache.put(cache_key, instances[indexes[0]].operating_system, unit_result)
+
+    return priced
+
 
 def export_to_google_sheets(pricing_results: List[InstancePricingResponse], access_token: str, spreadsheet_title: str) -> Dict[str, Any]:
     """Export pricing results to Google Sheets"""
@@ -760,103 +1980,1271 @@ def export_to_google_sheets(pricing_results: List[InstancePricingResponse], acce
         logger.error(f"Error exporting to Google Sheets: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to export to Google Sheets: {str(e)}")
 
+# Columnar bulk pricing responses
+
+PARTIAL_UPFRONT_PARTS = ('total_cost', 'upfront_fee', 'plan_cost')
+# (field, part) for every numeric value in PricingResults; part is set for the
+# partial upfront fields, which hold a dict of PARTIAL_UPFRONT_PARTS
+COLUMNAR_SCENARIOS = [
+    (name, part)
+    for name, field in PricingResults.model_fields.items()
+    for part in (PARTIAL_UPFRONT_PARTS if get_origin(field.annotation) is dict else (None,))
+]
+COLUMNAR_INPUT_FIELDS = ['region_code', 'instance_type', 'operation', 'operating_system', 'product_tenancy', 'qty']
+
+def columnar_pricing_response(response: BulkPricingResponse) -> Response:
+    """
+    Serialize a bulk pricing response as one header of scenario names and one
+    dense array per scenario, skipping Pydantic serialization entirely
+    """
+    # Field values are read straight from each model's __dict__, which is much
+    # cheaper than attribute access on Pydantic models
+    inputs = [vars(instance.input_data) for instance in response.instances]
+    results = [vars(instance.pricing_results) for instance in response.instances]
+    values = [
+        [result[name] for result in results] if part is None else [result[name][part] for result in results]
+        for name, part in COLUMNAR_SCENARIOS
+    ]
+
+    payload = {
+        'count': len(results),
+        'unique_instances': response.unique_instances,
+        'dedup_ratio': response.dedup_ratio,
+        'inputs': {field: [instance[field] for instance in inputs] for field in COLUMNAR_INPUT_FIELDS},
+        'scenarios': [name if part is None else f'{name}.{part}' for name, part in COLUMNAR_SCENARIOS],
+        'values': values,
+        # Sparse: only instances with errors, keyed by their index
+        'errors': {str(index): instance.errors for index, instance in enumerate(response.instances) if instance.errors},
+    }
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+# Fleet aggregation
+
+# Every qty-scaled cost in PricingResults; hourly rates do not sum across instances
+AGGREGATE_SCENARIOS = [(name, part) for name, part in COLUMNAR_SCENARIOS if name.endswith('_total_cost')]
+AGGREGATE_GROUPINGS: Dict[str, Callable[[EC2InstanceInput], str]] = {
+    'region': lambda instance: instance.region_code,
+    'instance_family': lambda instance: instance.instance_type.split('.')[0],
+    'operating_system': lambda instance: instance.operating_system,
+    'product_tenancy': lambda instance: instance.product_tenancy,
+}
+
+def price_fleet_shapes(
+    instances: List[EC2InstanceInput],
+) -> Tuple[List[InstancePricingResponse], np.ndarray, np.ndarray]:
+    """
+    Price each unique shape in a fleet once at qty 1. Returns the priced
+    shapes, the shape index of every input row and every row's qty.
+    """
+    shape_indexes: Dict[Tuple[str, str, str, str], int] = {}
+    unit_inputs: List[EC2InstanceInput] = []
+    row_shapes = np.empty(len(instances), dtype=np.intp)
+    for row, instance in enumerate(instances):
+        key = pricing_key(instance)
+        if key not in shape_indexes:
+            shape_indexes[key] = len(unit_inputs)
+            unit_inputs.append(instance.model_copy(update={'qty': 1}))
+        row_shapes[row] = shape_indexes[key]
+    qty = np.array([instance.qty for instance in instances], dtype=float)
+    return price_instance_batch(unit_inputs).instances, row_shapes, qty
+
+def aggregate_fleet_pricing(instances: List[EC2InstanceInput], group_by: List[str]) -> FleetPricingAggregate:
+    """
+    Price each unique shape once at qty 1, then sum costs per group as a
+    matrix product of per-group quantities and per-shape unit costs
+    """
+    priced, row_shapes, qty = price_fleet_shapes(instances)
+    unit_results = [vars(shape.pricing_results) for shape in priced]
+    unit_costs = np.array(
+        [[result[name] if part is None else result[name][part] for name, part in AGGREGATE_SCENARIOS] for result in unit_results]
+    ).reshape(len(priced), len(AGGREGATE_SCENARIOS))
+    shape_has_errors = np.array([bool(shape.errors) for shape in priced], dtype=bool)
+    scenarios = [name if part is None else f'{name}.{part}' for name, part in AGGREGATE_SCENARIOS]
+
+    def reduce(codes: np.ndarray, group_count: int) -> List[FleetPricingGroup]:
+        # weights[g, s] is the total qty of shape s in group g
+        weights = np.zeros((group_count, len(priced)))
+        np.add.at(weights, (codes, row_shapes), qty)
+        totals = weights @ unit_costs
+        counts = np.bincount(codes, minlength=group_count)
+        quantities = np.bincount(codes, weights=qty, minlength=group_count)
+        return [
+            FleetPricingGroup(count=int(count), quantity=int(quantity), totals=dict(zip(scenarios, group_totals.tolist())))
+            for count, quantity, group_totals in zip(counts, quantities, totals)
+        ]
+
+    groups = {}
+    for grouping in group_by:
+        labels = [AGGREGATE_GROUPINGS[grouping](instance) for instance in instances]
+        values, codes = np.unique(np.array(labels, dtype=object), return_inverse=True)
+        groups[grouping] = dict(zip(values.tolist(), reduce(codes.reshape(-1), len(values))))
+
+    return FleetPricingAggregate(
+        count=len(instances),
+        unique_instances=len(priced),
+        instances_with_errors=int(shape_has_errors[row_shapes].sum()) if len(instances) else 0,
+        total=reduce(np.zeros(len(instances), dtype=np.intp), 1)[0],
+        groups=groups,
+    )
+
+# Cross-region comparison
+
+def compare_region_pricing(request: RegionPricingRequest) -> RegionPricingComparison:
+    """
+    Price one instance shape in every requested region as a single batch, so
+    the lookup is one batched query (or in-memory snapshot hit) rather than
+    four queries per region
+    """
+    regions = list(dict.fromkeys(request.regions or list_ingested_regions()))
+    shape = request.model_dump(exclude={'regions'})
+    response = price_instance_batch([EC2InstanceInput(region_code=region, **shape) for region in regions])
+
+    priced = [
+        (instance.pricing_results.on_demand_hourly_rate, instance.input_data.region_code)
+        for instance in response.instances
+        if instance.pricing_results.on_demand_hourly_rate > 0
+    ]
+    return RegionPricingComparison(
+        regions=response.instances,
+        cheapest_region=min(priced)[1] if priced else None,
+    )
+
+# Savings Plan commitment optimizer
+
+def savings_plan_breakpoints(
+    on_demand: np.ndarray, discounted: np.ndarray, quantity: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Cumulative commitment and covered On-Demand cost as a plan absorbs each
+    shape's usage, largest discount first (the order AWS applies Savings
+    Plans in). Shapes without a discount are never covered.
+    """
+    eligible = (discounted > 0) & (discounted < on_demand)
+    order = np.argsort(discounted[eligible] / on_demand[eligible], kind='stable')
+    committed = np.concatenate(([0.0], np.cumsum((discounted * quantity)[eligible][order])))
+    covered = np.concatenate(([0.0], np.cumsum((on_demand * quantity)[eligible][order])))
+    return committed, covered
+
+def savings_plan_hourly_costs(
+    commitments: np.ndarray,
+    on_demand_cost: float,
+    committed: np.ndarray,
+    covered: np.ndarray,
+    usage: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Expected hourly fleet cost at each commitment: the commitment plus the
+    On-Demand cost it leaves uncovered, averaged over the hours of a usage
+    profile (share of the fleet running in each hour; always on by default)
+    """
+    if usage is None:
+        usage = np.ones(1)
+    # An hour with a share p of the fleet running scales the breakpoints by p.
+    # Past the last breakpoint the extra commitment is unused, so covered cost stays flat.
+    covered_cost = sum(p * np.interp(commitments / p, committed, covered) for p in usage if p > 0)
+    return commitments + on_demand_cost * float(usage.mean()) - covered_cost / len(usage)
+
+def optimal_savings_plan_commitment(
+    committed: np.ndarray, covered: np.ndarray, usage: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Cost-minimizing commitment and the expected On-Demand cost it covers.
+    Expected cost is piecewise linear in the commitment with a breakpoint
+    wherever some hour's usage becomes fully covered, so the minimum is at one
+    of them. This is the break-even check: committing to usage whose
+    discounted rate is a share r of On-Demand only pays off if that usage runs
+    in more than r of the hours, so a fleet that idles part of the time is
+    best left partly On-Demand.
+    """
+    candidates = np.unique(np.outer(usage, committed))
+    costs = savings_plan_hourly_costs(candidates, 0.0, committed, covered, usage)
+    # Candidates are sorted, so ties resolve to the smaller commitment
+    best = int(np.argmin(costs))
+    return float(candidates[best]), float(candidates[best] - costs[best])
+
+def parse_usage_profile(value: Optional[str]) -> np.ndarray:
+    """Parse a comma-separated usage profile of fractions between 0 and 1"""
+    if value is None or not value.strip():
+        return np.ones(1)
+    try:
+        usage = np.array([float(part) for part in value.split(',')], dtype=float)
+    except ValueError:
+        raise ValueError("usage must be a comma-separated list of numbers")
+    if not np.all((usage >= 0) & (usage <= 1)):
+        raise ValueError("usage values must be between 0 and 1")
+    return usage
+
+def optimize_savings_plans(
+    instances: List[EC2InstanceInput], points: int, usage: Optional[np.ndarray] = None
+) -> SavingsPlanOptimization:
+    """
+    Find the hourly commitment that minimizes expected fleet cost for every
+    Savings Plan type, term and purchase option. A Compute Savings Plan is one
+    commitment across the fleet. An EC2 Instance Savings Plan only covers one
+    instance family in one region, so each region/family group gets its own
+    commitment and the plan's commitment is their sum.
+
+    usage is the share of the fleet running in each hour of a representative
+    period. A fleet that always runs (the default) is best fully covered; one
+    that idles part of the time may be best covered only partly, since the
+    commitment is paid for every hour.
+    """
+    if usage is None:
+        usage = np.ones(1)
+    priced, row_shapes, qty = price_fleet_shapes(instances)
+    quantity = np.bincount(row_shapes, weights=qty, minlength=len(priced))
+    unit_results = [vars(shape.pricing_results) for shape in priced]
+
+    def rates(field: str) -> np.ndarray:
+        return np.array([result[field] for result in unit_results], dtype=float)
+
+    on_demand = rates('on_demand_hourly_rate')
+    full_on_demand_cost = float(on_demand @ quantity)
+    on_demand_cost = full_on_demand_cost * float(usage.mean())
+    family_labels, family_codes = np.unique(
+        np.array([
+            f"{shape.input_data.region_code}/{shape.input_data.instance_type.split('.')[0]}"
+            for shape in priced
+        ], dtype=object),
+        return_inverse=True,
+    )
+
+    plans = []
+    for plan in SAVINGS_PLAN_TYPES:
+        per_family = plan == 'ec2_savings_plan'
+        for term in PRICING_TERMS:
+            for option_name, option in PURCHASE_OPTIONS.items():
+                discounted = rates(f'{plan}_{term}_year_{option}_hourly_rate')
+                # Optimal allocation of a total commitment across groups takes
+                # segments in discount order, so the fleet-wide curve holds
+                # for per-family plans too
+                committed, covered = savings_plan_breakpoints(on_demand, discounted, quantity)
+                curve = np.linspace(0.0, committed[-1], points)
+                curve_costs = savings_plan_hourly_costs(curve, full_on_demand_cost, committed, covered, usage)
+
+                groups = (
+                    [(label, family_codes.reshape(-1) == code) for code, label in enumerate(family_labels.tolist())]
+                    if per_family else [(None, np.ones(len(priced), dtype=bool))]
+                )
+                hourly_commitment = covered_cost = 0.0
+                group_commitments = {}
+                for label, shapes in groups:
+                    group_committed, group_covered = savings_plan_breakpoints(
+                        on_demand[shapes], discounted[shapes], quantity[shapes]
+                    )
+                    commitment, group_covered_cost = optimal_savings_plan_commitment(
+                        group_committed, group_covered, usage
+                    )
+                    hourly_commitment += commitment
+                    covered_cost += group_covered_cost
+                    if label is not None and commitment > 0:
+                        group_commitments[label] = commitment
+
+                hourly_cost = hourly_commitment + on_demand_cost - covered_cost
+                plans.append(SavingsPlanCommitment(
+                    plan=plan,
+                    term=term,
+                    purchase_option=option_name,
+                    hourly_commitment=hourly_commitment,
+                    hourly_cost=hourly_cost,
+                    savings_percent=(1 - hourly_cost / on_demand_cost) * 100 if on_demand_cost else 0.0,
+                    coverage=covered_cost / on_demand_cost if on_demand_cost else 0.0,
+                    term_total_cost=hourly_cost * HOURS_PER_YEAR * term,
+                    curve_commitments=curve.tolist(),
+                    curve_hourly_costs=curve_costs.tolist(),
+                    group_commitments=group_commitments if per_family else None,
+                ))
+
+    shape_has_errors = np.array([bool(shape.errors) for shape in priced], dtype=bool)
+    return SavingsPlanOptimization(
+        count=len(instances),
+        unique_instances=len(priced),
+        instances_with_errors=int(shape_has_errors[row_shapes].sum()) if len(instances) else 0,
+        on_demand_hourly_cost=on_demand_cost,
+        plans=plans,
+        best=min(plans, key=lambda commitment: commitment.hourly_cost) if on_demand_cost else None,
+    )
+
+def price_instance_batch(instances: List[EC2InstanceInput]) -> BulkPricingResponse:
+    """Price a list of EC2 instances, capturing per-instance errors in each response"""
+    sanitized_instances = [sanitize_input(instance.model_dump()) for instance in instances]
+
+    # Rows that differ only in qty share one pricing lookup
+    shapes: Dict[Tuple[str, str, str, str], EC2Instance] = {}
+    for instance in sanitized_instances:
+        shapes.setdefault(pricing_key(instance), instance)
+    unique_instances = list(shapes.values())
+    dedup_ratio = len(sanitized_instances) / len(unique_instances) if unique_instances else 1.0
+    logger.info(
+        f"Pricing {len(sanitized_instances)} instances as {len(unique_instances)} unique shapes "
+        f"(dedup ratio {dedup_ratio:.1f}:1)"
+    )
+
+    # Look up pricing rows for the whole batch up front: one global query
+    # plus one savings plan query per region instead of four per instance.
+    # Shapes already in the result cache don't need pricing rows.
+    uncached = [
+        instance for instance in unique_instances
+        if not pricing_cache.contains(pricing_key(instance))
+    ]
+    batch_data = fetch_batch_pricing_data(uncached)
+
+    try:
+        priced = calculate_pricing_batch(sanitized_instances, batch_data)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        # Report the failure against every instance instead of failing the request
+        logger.error(f"Error pricing {len(sanitized_instances)} instances: {str(e)}")
+        priced = [(empty_pricing_results(), [str(e)]) for _ in sanitized_instances]
+
+    return BulkPricingResponse(
+        instances=[
+            InstancePricingResponse(
+                input_data=sanitized_instance,
+                pricing_results=pricing_results,
+                errors=errors
+            )
+            for sanitized_instance, (pricing_results, errors) in zip(sanitized_instances, priced)
+        ],
+        unique_instances=len(unique_instances),
+        dedup_ratio=dedup_ratio,
+    )
+
+def price_in_chunks(instances: Iterator[EC2InstanceInput]) -> Iterator[BulkPricingResponse]:
+    """Price instances PRICING_STREAM_CHUNK_SIZE at a time as they are pulled from the iterator"""
+    while True:
+        chunk = list(islice(instances, PRICING_STREAM_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield price_instance_batch(chunk)
+
+async def stream_instance_pricing(
+    first_chunk: Optional[BulkPricingResponse],
+    chunks: Iterator[BulkPricingResponse],
+) -> AsyncIterator[str]:
+    """
+    Yield one NDJSON line per priced instance, in input order, followed by a
+    {"summary": ...} line. The remaining chunks are priced one at a time as
+    the response is written, so only one chunk of results is held in memory.
+    """
+    count = 0
+    instances_with_errors = 0
+    shapes = set()
+    error = None
+
+    chunk = first_chunk
+    while chunk is not None:
+        for priced in chunk.instances:
+            count += 1
+            instances_with_errors += 1 if priced.errors else 0
+            shapes.add(pricing_key(priced.input_data))
+            yield priced.model_dump_json() + "\n"
+
+        try:
+            chunk = await run_in_threadpool(next, chunks, None)
+        except Exception as e:
+            # The status code has already been sent, so report the failure in the summary
+            logger.error(f"Error in streamed bulk pricing after {count} instances: {str(e)}")
+            error = str(e)
+            break
+
+    summary = BulkPricingSummary(
+        count=count,
+        unique_instances=len(shapes),
+        dedup_ratio=count / len(shapes) if shapes else 1.0,
+        instances_with_errors=instances_with_errors,
+        error=error,
+    )
+    yield json.dumps({"summary": summary.model_dump()}) + "\n"
+
+# Fleet file uploads
+
+UPLOAD_SPOOL_MAX_BYTES = 1024 * 1024  # uploads larger than this are spooled to disk
+XLSX_SIGNATURE = b"PK\x03\x04"  # XLSX files are zip archives
+UPLOAD_REQUIRED_FIELDS = ('region_code', 'instance_type', 'operation', 'operating_system')
+
+def instance_from_upload_row(header: List[str], values: Iterable[Any]) -> Optional[EC2InstanceInput]:
+    """
+    Map one row of an uploaded fleet file to an instance. Accepts the cost
+    export layout from examples/cost-input.csv, where the last column holds
+    the quantity, and the bulk upload template layout. Returns None for rows
+    missing a required field.
+    """
+    row = {name: '' if value is None else str(value).strip() for name, value in zip(header, values)}
+
+    if 'aws/region_code' in header:
+        fields = {
+            'region_code': row.get('aws/region_code', ''),
+            'instance_type': row.get('aws/instance_type', ''),
+            'operation': row.get('Operation', ''),
+            'operating_system': row.get('aws/operating_system', ''),
+            'product_tenancy': row.get('aws/product_tenancy') or 'Shared',
+        }
+        qty = row.get(header[-1], '')
+    else:
+        fields = {
+            'region_code': row.get('region_code', ''),
+            'instance_type': row.get('instance_type', ''),
+            'operation': row.get('operation', ''),
+            'operating_system': row.get('operating_system', ''),
+            'product_tenancy': row.get('product_tenancy') or 'Shared',
+        }
+        qty = row.get('qty', '')
+
+    if not all(fields[name] for name in UPLOAD_REQUIRED_FIELDS):
+        return None
+    try:
+        fields['qty'] = int(float(qty)) or 1
+    except (ValueError, OverflowError):
+        fields['qty'] = 1
+    return EC2InstanceInput(**fields)
+
+def iter_csv_instances(upload: BinaryIO) -> Iterator[EC2InstanceInput]:
+    """Read instances from a CSV file one row at a time"""
+    reader = csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig', newline=''))
+    header = [name.strip() for name in next(reader, [])]
+    for values in reader:
+        instance = instance_from_upload_row(header, values)
+        if instance is not None:
+            yield instance
+
+def iter_xlsx_instances(upload: BinaryIO) -> Iterator[EC2InstanceInput]:
+    """Read instances from the first worksheet of an XLSX file one row at a time"""
+    workbook = load_workbook(upload, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = ['' if name is None else str(name).strip() for name in next(rows, ())]
+        for values in rows:
+            instance = instance_from_upload_row(header, values)
+            if instance is not None:
+                yield instance
+    finally:
+        workbook.close()
+
+# Bulk pricing jobs
+
+class PricingJobStore(ABC):
+    """
+    Persistence for bulk pricing jobs: the submitted instances split into
+    chunks, which chunks are done, and the priced results. Implementations
+    must be safe to call from several worker threads.
+    """
+
+    @abstractmethod
+    def create_job(self, instances: List[EC2InstanceInput], chunk_size: int) -> PricingJobStatus:
+        ...
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[PricingJobStatus]:
+        ...
+
+    @abstractmethod
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        ...
+
+    @abstractmethod
+    def pending_chunks(self, job_id: str) -> List[int]:
+        """Indexes of the chunks that have not been priced yet"""
+
+    @abstractmethod
+    def load_chunk(self, job_id: str, chunk_index: int) -> List[EC2InstanceInput]:
+        ...
+
+    @abstractmethod
+    def save_chunk_results(self, job_id: str, chunk_index: int, results: List[InstancePricingResponse]) -> None:
+        """Store a chunk's results and mark it done in one step"""
+
+    @abstractmethod
+    def get_results(self, job_id: str, offset: int, limit: int) -> List[InstancePricingResponse]:
+        ...
+
+    @abstractmethod
+    def unfinished_jobs(self) -> List[str]:
+        """Jobs that were queued or running when the process last stopped"""
+
+class SQLitePricingJobStore(PricingJobStore):
+    """Pricing job store backed by a local SQLite database file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so importing the app doesn't touch the filesystem
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS pricing_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    completed INTEGER NOT NULL DEFAULT 0,
+                    chunk_size INTEGER NOT NULL,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS pricing_job_chunks (
+                    job_id TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    instances TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (job_id, chunk_index)
+                );
+                CREATE TABLE IF NOT EXISTS pricing_job_results (
+                    job_id TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    PRIMARY KEY (job_id, row_index)
+                );
+            """)
+            self._connection = connection
+        return self._connection
+
+    def create_job(self, instances: List[EC2InstanceInput], chunk_size: int) -> PricingJobStatus:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT INTO pricing_jobs (job_id, status, total, chunk_size, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, "queued", len(instances), chunk_size, now, now),
+                )
+                connection.executemany(
+                    "INSERT INTO pricing_job_chunks (job_id, chunk_index, instances) VALUES (?, ?, ?)",
+                    [
+                        (job_id, chunk_index, json.dumps([instance.model_dump() for instance in instances[start:start + chunk_size]]))
+                        for chunk_index, start in enumerate(range(0, len(instances), chunk_size))
+                    ],
+                )
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[PricingJobStatus]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT job_id, status, total, completed, error, created_at, updated_at FROM pricing_jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, total, completed, error, created_at, updated_at = row
+        return PricingJobStatus(
+            job_id=job_id,
+            status=status,
+            total=total,
+            completed=completed,
+            progress=completed / total if total else 1.0,
+            error=error,
+            created_at=created_at,
+            updated_at=updated_at,
+        )
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE pricing_jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                    (status, error, time.time(), job_id),
+                )
+
+    def pending_chunks(self, job_id: str) -> List[int]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT chunk_index FROM pricing_job_chunks WHERE job_id = ? AND done = 0 ORDER BY chunk_index",
+                (job_id,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_chunk(self, job_id: str, chunk_index: int) -> List[EC2InstanceInput]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT instances FROM pricing_job_chunks WHERE job_id = ? AND chunk_index = ?",
+                (job_id, chunk_index),
+            ).fetchone()
+        return [EC2InstanceInput(**instance) for instance in json.loads(row[0])]
+
+    def save_chunk_results(self, job_id: str, chunk_index: int, results: List[InstancePricingResponse]) -> None:
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                (chunk_size,) = connection.execute(
+                    "SELECT chunk_size FROM pricing_jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                start = chunk_index * chunk_size
+                connection.executemany(
+                    "INSERT OR REPLACE INTO pricing_job_results (job_id, row_index, result) VALUES (?, ?, ?)",
+                    [(job_id, start + offset, result.model_dump_json()) for offset, result in enumerate(results)],
+                )
+                updated = connection.execute(
+                    "UPDATE pricing_job_chunks SET done = 1 WHERE job_id = ? AND chunk_index = ? AND done = 0",
+                    (job_id, chunk_index),
+                ).rowcount
+                if updated:
+                    connection.execute(
+                        "UPDATE pricing_jobs SET completed = completed + ?, updated_at = ? WHERE job_id = ?",
+                        (len(results), time.time(), job_id),
+                    )
+
+    def get_results(self, job_id: str, offset: int, limit: int) -> List[InstancePricingResponse]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT result FROM pricing_job_results WHERE job_id = ? AND row_index >= ? ORDER BY row_index LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [InstancePricingResponse.model_validate_json(row[0]) for row in rows]
+
+    def unfinished_jobs(self) -> List[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT job_id FROM pricing_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+class PricingJobRunner:
+    """
+    Prices submitted jobs chunk by chunk on a background worker pool. Each
+    chunk's results are persisted as soon as it is priced, so a resumed or
+    retried job only prices the chunks that are still pending.
+    """
+
+    def __init__(self, store: PricingJobStore, workers: int, chunk_size: int, max_attempts: int):
+        self.store = store
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_attempts = max(1, max_attempts)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pricing-job")
+            return self._executor
+
+    def create(self, instances: List[EC2InstanceInput]) -> PricingJobStatus:
+        """Persist a new job and queue it for pricing"""
+        job = self.store.create_job(instances, self.chunk_size)
+        logger.info(f"Queued pricing job {job.job_id} for {job.total} instances")
+        self._pool().submit(self._run, job.job_id)
+        return job
+
+    def retry(self, job_id: str) -> PricingJobStatus:
+        """Queue a failed job again; chunks that were already priced are kept"""
+        self.store.set_status(job_id, "queued")
+        self._pool().submit(self._run, job_id)
+        return self.store.get_job(job_id)
+
+    def resume(self) -> None:
+        """Queue every job left unfinished by a previous process"""
+        for job_id in self.store.unfinished_jobs():
+            logger.info(f"Resuming pricing job {job_id}")
+            self._pool().submit(self._run, job_id)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _price_chunk(self, instances: List[EC2InstanceInput]) -> List[InstancePricingResponse]:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return price_instance_batch(instances).instances
+            except AdmissionRejected as e:
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning(f"Pricing job chunk rejected by admission control, retrying in {e.retry_after}s")
+                time.sleep(e.retry_after)
+
+    def _run(self, job_id: str) -> None:
+        try:
+            self.store.set_status(job_id, "running")
+            for chunk_index in self.store.pending_chunks(job_id):
+                results = self._price_chunk(self.store.load_chunk(job_id, chunk_index))
+                self.store.save_chunk_results(job_id, chunk_index, results)
+            self.store.set_status(job_id, "completed")
+            logger.info(f"Pricing job {job_id} completed")
+        except Exception as e:
+            logger.error(f"Pricing job {job_id} failed: {str(e)}")
+            self.store.set_status(job_id, "failed", str(e))
+
+pricing_jobs = PricingJobRunner(
+    SQLitePricingJobStore(PRICING_JOB_STORE_PATH),
+    PRICING_JOB_WORKERS,
+    PRICING_JOB_CHUNK_SIZE,
+    PRICING_JOB_MAX_ATTEMPTS,
+)
+
+# Pricing data queries
+
+# Output column -> source column for the /query-pricing-data tables, in default order
+# Typed tables store leasecontractlength as INT64 and older tables as strings
+# such as '1yr' or '1'. Both are returned in the string format the endpoint has
+# always used.
+LEASE_YEARS_STRING = "REGEXP_EXTRACT(CAST(leasecontractlength AS STRING), r'^\\s*(\\d+)')"
+
+GLOBAL_PRICING_QUERY_FIELDS = {
+    'region_code': 'region_code',
+    'instance_type': 'instance_type',
+    'operation': 'operation',
+    'operating_system': 'operating_system',
+    'tenancy': 'tenancy',
+    'term_type': 'termtype',
+    'purchase_option': 'purchaseoption',
+    'term_length': f"CONCAT({LEASE_YEARS_STRING}, 'yr')",
+    'offering_class': 'offeringclass',
+    'price_per_unit': 'priceperunit',
+    'unit': 'unit',
+    'currency': 'currency',
+}
+SAVINGS_PLAN_QUERY_FIELDS = {
+    'region_code': 'discountedregioncode',
+    'instance_type': 'discountedinstancetype',
+    'operation': 'discountedoperation',
+    'product_family': 'product_family',
+    'purchase_option': 'purchaseoption',
+    'term_years': LEASE_YEARS_STRING,
+    'hourly_rate': 'discountedrate',
+    'currency': 'currency',
+    'unit': 'unit',
+}
+
+def is_savings_plan_query(savings_type: Optional[str]) -> bool:
+    return bool(savings_type) and savings_type.lower() in ['compute savings plan', 'ec2 savings plan']
+
+def select_pricing_fields(available: Dict[str, str], fields: Optional[str]) -> str:
+    """SELECT list for a comma-separated fields= projection, or every field when none is given"""
+    names = [name.strip() for name in fields.split(',') if name.strip()] if fields else list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(available)}",
+        )
+    return ",\n                ".join(
+        name if available[name] == name else f"{available[name]} as {name}"
+        for name in dict.fromkeys(names)
+    )
+
+def sign_query_cursor(payload: bytes) -> str:
+    return base64.urlsafe_b64encode(hmac.new(QUERY_CURSOR_SECRET, payload, hashlib.sha256).digest()).decode()
+
+def is_query_results_table(table: Any) -> bool:
+    """Whether a table is a query job's anonymous destination table"""
+    return table.project == PROJECT_ID and table.dataset_id.startswith("_") and table.table_id.startswith("anon")
+
+def encode_query_cursor(table: Any, page_token: Optional[str]) -> Optional[str]:
+    """
+    Opaque cursor pointing at the next page of a query's results table,
+    signed with QUERY_CURSOR_SECRET so clients cannot point it at another table
+    """
+    if not page_token or table is None:
+        return None
+    payload = json.dumps({
+        "table": f"{table.project}.{table.dataset_id}.{table.table_id}",
+        "page_token": page_token,
+    }).encode()
+    return f"{base64.urlsafe_b64encode(payload).decode()}.{sign_query_cursor(payload)}"
+
+def decode_query_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        encoded, signature = cursor.split(".")
+        payload = base64.urlsafe_b64decode(encoded.encode())
+        if not hmac.compare_digest(signature, sign_query_cursor(payload)):
+            raise ValueError("bad signature")
+        fields = json.loads(payload)
+        table, page_token = fields["table"], fields["page_token"]
+        if not is_query_results_table(bigquery.TableReference.from_string(table)):
+            raise ValueError("not a query results table")
+        return table, page_token
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def first_page(row_iterator: Any) -> List[Dict[str, Any]]:
+    return [dict(row) for row in next(iter(row_iterator.pages), [])]
+
+def run_query_page(query: str, job_config: bigquery.QueryJobConfig, page_size: int) -> Dict[str, Any]:
+    """
+    Run a query and read only its first page. BigQuery keeps the full result
+    in the job's destination table, which later pages are read from.
+    """
+    with bigquery_admission.slot():
+        query_job = bigquery_client.query(query, job_config=job_config)
+        row_iterator = query_job.result(page_size=page_size)
+        rows = first_page(row_iterator)
+    bigquery_usage.record(query_job)
+    return {
+        "results": rows,
+        "count": len(rows),
+        "total_rows": row_iterator.total_rows,
+        "next_cursor": encode_query_cursor(query_job.destination, row_iterator.next_page_token),
+    }
+
+def read_cursor_page(cursor: str, page_size: int) -> Dict[str, Any]:
+    """Read the page a cursor from run_query_page or an earlier read_cursor_page points at"""
+    table, page_token = decode_query_cursor(cursor)
+    with bigquery_admission.slot():
+        row_iterator = bigquery_client.list_rows(table, page_token=page_token, page_size=page_size)
+        rows = first_page(row_iterator)
+        return {
+            "results": rows,
+            "count": len(rows),
+            "total_rows": row_iterator.total_rows,
+            "next_cursor": encode_query_cursor(bigquery.TableReference.from_string(table), row_iterator.next_page_token),
+        }
+
+class PricingQueryCache:
+    """
+    Bounded LRU cache of /query-pricing-data pages, keyed on the built query
+    and the pricing version behind the _latest views. Entries are fresh for
+    ttl_seconds, then served stale for up to stale_seconds while a background
+    refresh re-runs the query. At most refresh_workers refreshes run at once;
+    stale hits beyond that are served without starting another.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, stale_seconds: float, version_check_seconds: float, cache_pages: bool,
+                 refresh_workers: int = QUERY_CACHE_REFRESH_WORKERS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.cache_pages = cache_pages
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.refresh_failures = 0
+        self.refresh_skips = 0
+        self.refresh_workers = refresh_workers
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="query-cache-refresh")
+        self._entries: OrderedDict = OrderedDict()
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._version: Optional[Tuple] = None
+        self._version_check = PricingVersionCheck(version_check_seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _current_version(self) -> Optional[Tuple]:
+        return self._version_check.current()
+
+    def _check_version(self, version: Optional[Tuple]) -> None:
+        """Drop every entry if version differs; call with the lock held"""
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Pricing version changed; invalidating {len(self._entries)} cached query pages")
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            self._version = version
+
+    def _store(self, key: Tuple, page: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, now + self.ttl_seconds + self.stale_seconds, page)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _refresh(self, key: Tuple, loader: Callable[[], Dict[str, Any]]) -> None:
+        try:
+            self._store(key, loader())
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.error(f"Query cache refresh failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_load(self, key: Tuple, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached page for a key, calling loader on a miss"""
+        if not self.enabled:
+            return loader()
+
+        version = self._current_version()
+        with self._lock:
+            self._check_version(version)
+            key = (version, key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                fresh_until, stale_until, page = entry
+                now = time.monotonic()
+                if now < fresh_until:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return page
+                if now < stale_until:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key in self._refreshing:
+                        pass
+                    elif len(self._refreshing) >= self.refresh_workers:
+                        self.refresh_skips += 1
+                    else:
+                        self._refreshing.add(key)
+                        self._refresh_executor.submit(self._refresh, key, loader)
+                    return page
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+
+        # The version is part of the key, so a load that races a version change
+        # is stored under the old version and never served afterwards
+        page = loader()
+        self._store(key, page)
+        return page
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.stale_hits = self.misses = self.evictions = self.invalidations = self.refresh_failures = self.refresh_skips = 0
+            self._version = None
+            self._version_check.reset()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "cache_pages": self.cache_pages,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "refresh_failures": self.refresh_failures,
+            "refresh_skips": self.refresh_skips,
+            "refresh_workers": self.refresh_workers,
+            "refreshing": len(self._refreshing),
+            "version": dict(self._version) if self._version else None,
+        }
+
+query_cache = PricingQueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_STALE_SECONDS, PRICING_CACHE_VERSION_CHECK_SECONDS, QUERY_CACHE_PAGES)
+
+def normalize_query_filter(value: Optional[str]) -> Optional[str]:
+    """Strip a query filter, treating blank values as unset"""
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+def build_pricing_data_query(
+    select_list: str,
+    region: Optional[str],
+    operating_system: Optional[str],
+    instance_type: Optional[str],
+    instance_family: Optional[str],
+    term: Optional[str],
+    savings_type: Optional[str],
+) -> Tuple[str, Dict[str, str]]:
+    """Build the /query-pricing-data SQL and its parameters for a set of filters"""
+    # Determine which table to query based on savings_type
+    if is_savings_plan_query(savings_type):
+        params = {}
+        if SAVINGS_PLAN_ALL_REGIONS_ENABLED:
+            # The all-region table serves one region, or every region when none is given
+            table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_ALL_REGIONS}"
+        else:
+            # Query regional savings plan tables
+            if not region:
+                raise HTTPException(status_code=400, detail="Region is required for savings plan queries")
+
+            region_code = region.replace('-', '_')
+            table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_PREFIX}{region_code}_latest"
+
+        query = f"""
+        SELECT
+            {select_list}
+        FROM `{table_id}`
+        WHERE 1=1
+        """
+
+        if SAVINGS_PLAN_ALL_REGIONS_ENABLED and region:
+            query += " AND discountedregioncode = @region_code"
+            params["region_code"] = region
+        if savings_type.lower() == 'compute savings plan':
+            query += " AND product_family = 'ComputeSavingsPlans'"
+        elif savings_type.lower() == 'ec2 savings plan':
+            query += " AND product_family = 'EC2InstanceSavingsPlans'"
+
+        if instance_type:
+            query += " AND discountedinstancetype = @instance_type"
+            params["instance_type"] = instance_type
+
+        if operating_system:
+            query += " AND discountedoperation LIKE @operation"
+            params["operation"] = f"%{operating_system}%"
+
+        if term:
+            if 'year' in term.lower():
+                term_years = term.lower().split('year')[0].strip()
+                query += " AND CAST(leasecontractlength AS STRING) = @term_years"
+                params["term_years"] = term_years
+
+    else:
+        # Query global pricing table for On-Demand and Reserved Instances
+        table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_EC2_GLOBAL}"
+
+        query = f"""
+        SELECT
+            {select_list}
+        FROM `{table_id}`
+        WHERE 1=1
+        """
+
+        params = {}
+
+        if region:
+            query += " AND region_code = @region_code"
+            params["region_code"] = region
+
+        if instance_type:
+            query += " AND instance_type = @instance_type"
+            params["instance_type"] = instance_type
+
+        if operating_system:
+            query += " AND operating_system = @operating_system"
+            params["operating_system"] = operating_system
+
+        if term:
+            if 'reserved' in term.lower():
+                query += " AND termtype LIKE 'Reserved'"
+            elif 'on-demand' in term.lower() or 'ondemand' in term.lower():
+                query += " AND termtype = 'OnDemand'"
+
+        if savings_type and 'reserved' in savings_type.lower():
+            query += " AND termtype LIKE 'Reserved' AND offeringclass = 'standard'"
+
+    # Add instance family filter if provided
+    if instance_family:
+        query += " AND instance_type LIKE @instance_family_pattern"
+        params["instance_family_pattern"] = f"{instance_family}%"
+
+    return query, params
+
 # API Endpoints
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Tell clients to back off when BigQuery capacity is exhausted"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 @app.post("/price-instance", response_model=InstancePricingResponse)
 async def price_instance(instance: EC2InstanceInput):
     """Price a single EC2 instance"""
     try:
         sanitized_instance = sanitize_input(instance.model_dump())
-        pricing_results = calculate_pricing(sanitized_instance)
+        errors: List[str] = []
+        pricing_results = await run_in_threadpool(calculate_pricing, sanitized_instance, errors=errors)
         return InstancePricingResponse(
             input_data=sanitized_instance,
             pricing_results=pricing_results,
-            errors=[]
+            errors=errors
         )
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Error pricing instance: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
 
+@app.post("/price-instance/regions", response_model=RegionPricingComparison)
+async def price_instance_regions(request: RegionPricingRequest):
+    """Price one instance shape in each listed region, or every ingested region if none are given"""
+    if request.regions is not None and not request.regions:
+        raise HTTPException(status_code=400, detail="regions must not be empty; omit it to price every ingested region")
+    try:
+        return await run_in_threadpool(compare_region_pricing, request)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error comparing regions: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+
 @app.post("/price-instances", response_model=BulkPricingResponse)
-async def price_instances(instances: List[EC2InstanceInput]):
-    """Price multiple EC2 instances"""
+async def price_instances(instances: List[EC2InstanceInput], format: str = "json"):
+    """Price multiple EC2 instances. format=columnar returns one array per pricing scenario."""
+    if format not in ("json", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'columnar'")
     try:
-        priced_instances = []
-        for instance_input in instances:
-            try:
-                sanitized_instance = sanitize_input(instance_input.model_dump())
-                pricing_results = calculate_pricing(sanitized_instance)
-                priced_instances.append(InstancePricingResponse(
-                    input_data=sanitized_instance,
-                    pricing_results=pricing_results,
-                    errors=[]
-                ))
-            except Exception as e:
-                # For individual instance errors, include them in the response
-                logger.error(f"Error pricing instance {instance_input.instance_type}: {str(e)}")
-                sanitized_instance = sanitize_input(instance_input.model_dump())
-                priced_instances.append(InstancePricingResponse(
-                    input_data=sanitized_instance,
-                    pricing_results=PricingResults(
-                        on_demand_hourly_rate=0.0,
-                        on_demand_1_year_total_cost=0.0,
-                        on_demand_3_year_total_cost=0.0,
-
-                        # Compute Savings Plan 1 Year
-                        compute_savings_plan_1_year_no_upfront_total_cost=0.0,
-                        compute_savings_plan_1_year_no_upfront_hourly_rate=0.0,
-                        compute_savings_plan_1_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-                        compute_savings_plan_1_year_partial_upfront_hourly_rate=0.0,
-                        compute_savings_plan_1_year_all_upfront_total_cost=0.0,
-                        compute_savings_plan_1_year_all_upfront_hourly_rate=0.0,
-
-                        # Compute Savings Plan 3 Year
-                        compute_savings_plan_3_year_no_upfront_total_cost=0.0,
-                        compute_savings_plan_3_year_no_upfront_hourly_rate=0.0,
-                        compute_savings_plan_3_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-                        compute_savings_plan_3_year_partial_upfront_hourly_rate=0.0,
-                        compute_savings_plan_3_year_all_upfront_total_cost=0.0,
-                        compute_savings_plan_3_year_all_upfront_hourly_rate=0.0,
-
-                        # EC2 Savings Plan 1 Year
-                        ec2_savings_plan_1_year_no_upfront_total_cost=0.0,
-                        ec2_savings_plan_1_year_no_upfront_hourly_rate=0.0,
-                        ec2_savings_plan_1_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-                        ec2_savings_plan_1_year_partial_upfront_hourly_rate=0.0,
-                        ec2_savings_plan_1_year_all_upfront_total_cost=0.0,
-                        ec2_savings_plan_1_year_all_upfront_hourly_rate=0.0,
-
-                        # EC2 Savings Plan 3 Year
-                        ec2_savings_plan_3_year_no_upfront_total_cost=0.0,
-                        ec2_savings_plan_3_year_no_upfront_hourly_rate=0.0,
-                        ec2_savings_plan_3_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-                        ec2_savings_plan_3_year_partial_upfront_hourly_rate=0.0,
-                        ec2_savings_plan_3_year_all_upfront_total_cost=0.0,
-                        ec2_savings_plan_3_year_all_upfront_hourly_rate=0.0,
-
-                        # Standard Reserved Instance 1 Year
-                        standard_reserved_instance_1_year_no_upfront_total_cost=0.0,
-                        standard_reserved_instance_1_year_no_upfront_hourly_rate=0.0,
-                        standard_reserved_instance_1_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-                        standard_reserved_instance_1_year_partial_upfront_hourly_rate=0.0,
-                        standard_reserved_instance_1_year_all_upfront_total_cost=0.0,
-                        standard_reserved_instance_1_year_all_upfront_hourly_rate=0.0,
-
-                        # Standard Reserved Instance 3 Year
-                        standard_reserved_instance_3_year_no_upfront_total_cost=0.0,
-                        standard_reserved_instance_3_year_no_upfront_hourly_rate=0.0,
-                        standard_reserved_instance_3_year_partial_upfront_total_cost={"total_cost": 0.0, "upfront_fee": 0.0, "plan_cost": 0.0},
-                        standard_reserved_instance_3_year_partial_upfront_hourly_rate=0.0,
-                        standard_reserved_instance_3_year_all_upfront_total_cost=0.0,
-                        standard_reserved_instance_3_year_all_upfront_hourly_rate=0.0,
-                    ),
-                    errors=[str(e)]
-                ))
-        return BulkPricingResponse(instances=priced_instances)
+        response = await run_in_threadpool(price_instance_batch, instances)
+        if format == "columnar":
+            return await run_in_threadpool(columnar_pricing_response, response)
+        return response
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Error in bulk pricing: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
 
+@app.post("/price-instances/aggregate", response_model=FleetPricingAggregate)
+async def price_instances_aggregate(instances: List[EC2InstanceInput], group_by: str = "region,instance_family"):
+    """
+    Price a fleet and return total costs per scenario, overall and per group.
+    group_by is a comma-separated list of region, instance_family,
+    operating_system and product_tenancy.
+    """
+    groupings = [name.strip() for name in group_by.split(',') if name.strip()]
+    unknown = [name for name in groupings if name not in AGGREGATE_GROUPINGS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by: {', '.join(unknown)}. Available: {', '.join(AGGREGATE_GROUPINGS)}",
+        )
+    try:
+        return await run_in_threadpool(aggregate_fleet_pricing, instances, list(dict.fromkeys(groupings)))
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error in fleet aggregation: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+
+@app.post("/savings-plans/optimize", response_model=SavingsPlanOptimization)
+async def optimize_savings_plan_commitment(
+    instances: List[EC2InstanceInput], points: int = 101, usage: Optional[str] = None
+):
+    """
+    Price a fleet and return the cost-minimizing hourly commitment for each
+    Savings Plan type, term and purchase option, with a cost curve sampled
+    at `points` evenly spaced commitments. `usage` is a comma-separated
+    profile of the share of the fleet running in each hour (default always on).
+    """
+    if points < 2:
+        raise HTTPException(status_code=400, detail="points must be >= 2")
+    points = min(points, SAVINGS_PLAN_MAX_CURVE_POINTS)
+    try:
+        usage_profile = parse_usage_profile(usage)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await run_in_threadpool(optimize_savings_plans, instances, points, usage_profile)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error optimizing savings plans: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+
+@app.post("/price-instances/stream")
+async def price_instances_stream(instances: List[EC2InstanceInput]):
+    """Price multiple EC2 instances, streaming results as NDJSON as they are priced"""
+    chunks = price_in_chunks(iter(instances))
+    try:
+        # Price the first chunk before responding so admission and input errors
+        # still get a proper status code
+        first_chunk = await run_in_threadpool(next, chunks, None)
+    except AdmissionRejected:
+        raise
+    except Exception as e:
+        logger.error(f"Error in streamed bulk pricing: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid input: {str(e)}")
+
+    return StreamingResponse(stream_instance_pricing(first_chunk, chunks), media_type="application/x-ndjson")
+
+@app.post("/price-instances/upload")
+async def price_instances_upload(request: Request):
+    """Price a fleet CSV or XLSX file sent as the request body, streaming results as NDJSON"""
+    too_large = HTTPException(status_code=413, detail=f"Upload exceeds {UPLOAD_MAX_BYTES // (1024 * 1024)} MiB")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES:
+        raise too_large
+
+    upload = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES)
+    try:
+        # Writes can spill to disk, so they run off the event loop
+        received = 0
+        async for data in request.stream():
+            received += len(data)
+            if received > UPLOAD_MAX_BYTES:
+                raise too_large
+            await run_in_threadpool(upload.write, data)
+        await run_in_threadpool(upload.seek, 0)
+        is_xlsx = await run_in_threadpool(upload.read, len(XLSX_SIGNATURE)) == XLSX_SIGNATURE
+        await run_in_threadpool(upload.seek, 0)
+
+        instances = iter_xlsx_instances(upload) if is_xlsx else iter_csv_instances(upload)
+        chunks = price_in_chunks(instances)
+        try:
+            first_chunk = await run_in_threadpool(next, chunks, None)
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading uploaded fleet file: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Invalid upload: {str(e)}")
+        if first_chunk is None:
+            raise HTTPException(
+                status_code=400,
+                detail="No valid rows found. The file needs region_code, instance_type, operation and "
+                       "operating_system columns, or the aws/region_code cost export layout.",
+            )
+    except BaseException:
+        upload.close()
+        raise
+
+    return StreamingResponse(
+        stream_instance_pricing(first_chunk, chunks),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(upload.close),
+    )
+
+@app.post("/pricing-jobs", response_model=PricingJobStatus, status_code=202)
+async def create_pricing_job(instances: List[EC2InstanceInput]):
+    """Submit instances for asynchronous bulk pricing"""
+    if not instances:
+        raise HTTPException(status_code=400, detail="At least one instance is required")
+    return await run_in_threadpool(pricing_jobs.create, instances)
+
+@app.get("/pricing-jobs/{job_id}", response_model=PricingJobStatus)
+async def get_pricing_job(job_id: str):
+    """Report the status and progress of a pricing job"""
+    job = await run_in_threadpool(pricing_jobs.store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pricing job {job_id} not found")
+    return job
+
+@app.get("/pricing-jobs/{job_id}/results", response_model=PricingJobResultsPage)
+async def get_pricing_job_results(job_id: str, offset: int = 0, limit: int = PRICING_JOB_MAX_PAGE_SIZE):
+    """Fetch a page of a completed pricing job's results"""
+    if offset < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit must be >= 1")
+    limit = min(limit, PRICING_JOB_MAX_PAGE_SIZE)
+
+    job = await run_in_threadpool(pricing_jobs.store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pricing job {job_id} not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Pricing job {job_id} is {job.status}")
+
+    instances = await run_in_threadpool(pricing_jobs.store.get_results, job_id, offset, limit)
+    return PricingJobResultsPage(
+        job_id=job_id,
+        offset=offset,
+        limit=limit,
+        total=job.total,
+        next_offset=offset + limit if offset + limit < job.total else None,
+        instances=instances,
+    )
+
+@app.post("/pricing-jobs/{job_id}/retry", response_model=PricingJobStatus, status_code=202)
+async def retry_pricing_job(job_id: str):
+    """Re-queue a failed pricing job, keeping the chunks already priced"""
+    job = await run_in_threadpool(pricing_jobs.store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pricing job {job_id} not found")
+    if job.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Pricing job {job_id} is {job.status}")
+    return await run_in_threadpool(pricing_jobs.retry, job_id)
+
 @app.get("/query-pricing-data")
 async def query_pricing_data_endpoint(
     region: Optional[str] = None,
@@ -864,118 +3252,57 @@ async def query_pricing_data_endpoint(
     instance_type: Optional[str] = None,
     instance_family: Optional[str] = None,
     term: Optional[str] = None,
-    savings_type: Optional[str] = None
+    savings_type: Optional[str] = None,
+    fields: Optional[str] = None,
+    page_size: int = QUERY_PRICING_DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
 ):
-    """Query pricing database with filters"""
+    """
+    Query pricing database with filters, one page at a time. Pass the returned
+    next_cursor to read the following page; filters and fields are fixed by
+    the first request.
+    """
+    if page_size < 1:
+        raise HTTPException(status_code=400, detail="page_size must be >= 1")
+    page_size = min(page_size, QUERY_PRICING_MAX_PAGE_SIZE)
+
+    if cursor:
+        if query_cache.cache_pages:
+            page = await run_in_threadpool(
+                query_cache.get_or_load, ("page", cursor, page_size), lambda: read_cursor_page(cursor, page_size)
+            )
+        else:
+            page = await run_in_threadpool(read_cursor_page, cursor, page_size)
+        return {**page, "page_size": page_size}
+
+    region, os, instance_type, instance_family, term, savings_type = (
+        normalize_query_filter(value) for value in (region, os, instance_type, instance_family, term, savings_type)
+    )
+    available_fields = SAVINGS_PLAN_QUERY_FIELDS if is_savings_plan_query(savings_type) else GLOBAL_PRICING_QUERY_FIELDS
+    select_list = select_pricing_fields(available_fields, fields)
+
     try:
         logger.info(f"Query pricing data with filters: region={region}, os={os}, instance_type={instance_type}, "
                    f"instance_family={instance_family}, term={term}, savings_type={savings_type}")
 
-        # Determine which table to query based on savings_type
-        if savings_type and savings_type.lower() in ['compute savings plan', 'ec2 savings plan']:
-            # Query regional savings plan tables
-            if not region:
-                raise HTTPException(status_code=400, detail="Region is required for savings plan queries")
-
-            region_code = region.replace('-', '_')
-            table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_SAVINGS_PLAN_PREFIX}{region_code}_latest"
-
-            query = f"""
-            SELECT
-                discountedregioncode as region_code,
-                discountedinstancetype as instance_type,
-                discountedoperation as operation,
-                product_family,
-                purchaseoption as purchase_option,
-                leasecontractlength as term_years,
-                discountedrate as hourly_rate,
-                currency,
-                unit
-            FROM `{table_id}`
-            WHERE 1=1
-            """
-
-            params = {}
-            if savings_type.lower() == 'compute savings plan':
-                query += " AND product_family = 'ComputeSavingsPlans'"
-            elif savings_type.lower() == 'ec2 savings plan':
-                query += " AND product_family = 'EC2InstanceSavingsPlans'"
-
-            if instance_type:
-                query += " AND discountedinstancetype = @instance_type"
-                params["instance_type"] = instance_type
-
-            if os:
-                query += " AND discountedoperation LIKE @operation"
-                params["operation"] = f"%{os}%"
-
-            if term:
-                if 'year' in term.lower():
-                    term_years = term.lower().split('year')[0].strip()
-                    query += " AND leasecontractlength = @term_years"
-                    params["term_years"] = term_years
-
-        else:
-            # Query global pricing table for On-Demand and Reserved Instances
-            table_id = f"{PROJECT_ID}.{BQ_DATASET}.{BQ_TABLE_EC2_GLOBAL}"
-
-            query = f"""
-            SELECT
-                region_code,
-                instance_type,
-                operation,
-                operating_system,
-                tenancy,
-                termtype as term_type,
-                purchaseoption as purchase_option,
-                leasecontractlength as term_length,
-                offeringclass as offering_class,
-                priceperunit as price_per_unit,
-                unit,
-                currency
-            FROM `{table_id}`
-            WHERE 1=1
-            """
-
-            params = {}
-
-            if region:
-                query += " AND region_code = @region_code"
-                params["region_code"] = region
-
-            if instance_type:
-                query += " AND instance_type = @instance_type"
-                params["instance_type"] = instance_type
-
-            if os:
-                query += " AND operating_system = @operating_system"
-                params["operating_system"] = os
-
-            if term:
-                if 'reserved' in term.lower():
-                    query += " AND termtype LIKE 'Reserved'"
-                elif 'on-demand' in term.lower() or 'ondemand' in term.lower():
-                    query += " AND termtype = 'OnDemand'"
-
-            if savings_type and 'reserved' in savings_type.lower():
-                query += " AND termtype LIKE 'Reserved' AND offeringclass = 'standard'"
-
-        # Add instance family filter if provided
-        if instance_family:
-            query += " AND instance_type LIKE @instance_family_pattern"
-            params["instance_family_pattern"] = f"{instance_family}%"
+        query, params = build_pricing_data_query(select_list, region, os, instance_type, instance_family, term, savings_type)
 
         # Execute query
         job_config = bigquery.QueryJobConfig(
             query_parameters=[bigquery.ScalarQueryParameter(key, "STRING", value) for key, value in params.items()]
         )
 
-        query_job = bigquery_client.query(query, job_config=job_config)
-        results = [dict(row) for row in query_job]
+        # Filter combinations that build the same query share a cache entry
+        cache_key = ("query", query, tuple(sorted(params.items())), page_size)
+        page = await run_in_threadpool(
+            query_cache.get_or_load, cache_key, lambda: run_query_page(query, job_config, page_size)
+        )
 
-        logger.info(f"Query returned {len(results)} results")
-        return {"results": results, "count": len(results)}
+        logger.info(f"Query returned {page['count']} of {page['total_rows']} results")
+        return {**page, "page_size": page_size}
 
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Query pricing data failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
@@ -984,7 +3311,8 @@ async def query_pricing_data_endpoint(
 async def export_to_google_sheets_endpoint(request: GoogleSheetsExportRequest):
     """Export pricing results to Google Sheets"""
     try:
-        result = export_to_google_sheets(
+        result = await run_in_threadpool(
+            export_to_google_sheets,
             request.pricing_results,
             request.access_token,
             request.spreadsheet_title or "EC2 Pricing Results"
@@ -1011,6 +3339,31 @@ async def telemetry_endpoint(event: TelemetryEvent):
         logger.error(f"Error logging telemetry: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to log telemetry: {str(e)}")
 
+@app.get("/pricing-snapshot")
+async def pricing_snapshot_status():
+    """Report the state of the in-memory pricing snapshot"""
+    return pricing_snapshot.status()
+
+@app.get("/bigquery-admission")
+async def bigquery_admission_stats():
+    """Report in-flight and queued BigQuery jobs"""
+    return bigquery_admission.stats()
+
+@app.get("/bigquery-usage")
+async def bigquery_usage_stats():
+    """Report bytes processed and billed by BigQuery jobs"""
+    return bigquery_usage.stats()
+
+@app.get("/pricing-cache")
+async def pricing_cache_stats():
+    """Report pricing result cache counters"""
+    return pricing_cache.stats()
+
+@app.get("/query-cache")
+async def query_cache_stats():
+    """Report pricing data query cache counters"""
+    return query_cache.stats()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -14,6 +14,10 @@ def mock_bigquery_initialization():
          patch('main.setup_cloud_logging'):
         mock_client = MagicMock()
         mock_bq_client.return_value = mock_client
+        # Start every test with an empty pricing result cache
+        import main
+        main.pricing_cache.clear()
+        main.query_cache.clear()
         yield mock_client
 
 
@@ -111,7 +115,7 @@ class TestPriceInstancesEndpoint:
         instances = [sample_instance_input]
         
         # Simulate an error in pricing calculation
-        with patch('main.calculate_pricing', side_effect=Exception("BigQuery error")):
+        with patch('main.calculate_pricing_batch', side_effect=Exception("BigQuery error")):
             response = client.post("/price-instances", json=instances)
             assert response.status_code == 200
             data = response.json()
@@ -120,6 +124,56 @@ class TestPriceInstancesEndpoint:
             assert len(data["instances"]) == 1
             assert len(data["instances"][0]["errors"]) > 0
 
+    def test_columnar_format_matches_default(self, client, sample_instance_input, mock_on_demand_data, mock_reserved_instance_data):
+        """Test that format=columnar carries the same values as the default response"""
+        instances = [sample_instance_input, {**sample_instance_input, "qty": 3}]
+
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=mock_reserved_instance_data), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]), \
+             patch('main.fetch_batch_pricing_data', return_value=None):
+            default = client.post("/price-instances", json=instances).json()
+            columnar = client.post("/price-instances?format=columnar", json=instances).json()
+
+        assert columnar["count"] == 2
+        assert columnar["inputs"]["qty"] == [1, 3]
+        assert columnar["errors"] == {}
+        for index, instance in enumerate(default["instances"]):
+            for scenario, values in zip(columnar["scenarios"], columnar["values"]):
+                name, _, part = scenario.partition(".")
+                expected = instance["pricing_results"][name]
+                assert values[index] == pytest.approx(expected[part] if part else expected)
+
+        assert client.post("/price-instances?format=xml", json=instances).status_code == 400
+
+    def test_aggregate_matches_summed_results(self, client, sample_instance_input, mock_on_demand_data, mock_reserved_instance_data):
+        """Test that fleet aggregate totals equal the summed per-instance costs"""
+        instances = [
+            sample_instance_input,
+            {**sample_instance_input, "qty": 3},
+            {**sample_instance_input, "region_code": "eu-west-1", "qty": 2},
+        ]
+
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=mock_reserved_instance_data), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]), \
+             patch('main.fetch_batch_pricing_data', return_value=None):
+            default = client.post("/price-instances", json=instances).json()
+            aggregate = client.post("/price-instances/aggregate?group_by=region", json=instances).json()
+
+        assert aggregate["count"] == 3
+        assert aggregate["unique_instances"] == 2
+        assert aggregate["total"]["quantity"] == 6
+        on_demand = [instance["pricing_results"]["on_demand_1_year_total_cost"] for instance in default["instances"]]
+        assert aggregate["total"]["totals"]["on_demand_1_year_total_cost"] == pytest.approx(sum(on_demand))
+        regions = aggregate["groups"]["region"]
+        assert regions["us-east-1"]["count"] == 2
+        assert regions["eu-west-1"]["totals"]["on_demand_1_year_total_cost"] == pytest.approx(on_demand[2])
+
+        assert client.post("/price-instances/aggregate?group_by=owner", json=instances).status_code == 400
+
 
 class TestQueryPricingDataEndpoint:
     """Tests for the /query-pricing-data endpoint"""
@@ -135,7 +189,7 @@ class TestQueryPricingDataEndpoint:
             'price_per_unit': 0.10
         }
         mock_job = MagicMock()
-        mock_job.__iter__ = Mock(return_value=iter([mock_row]))
+        mock_job.result.return_value = Mock(pages=iter([[mock_row]]), total_rows=1, next_page_token=None)
         
         with patch.object(bigquery_client, 'query', return_value=mock_job):
             response = client.get("/query-pricing-data?region=us-east-1&instance_type=t3.medium")
@@ -143,6 +197,89 @@ class TestQueryPricingDataEndpoint:
             data = response.json()
             assert "results" in data
             assert "count" in data
+            assert data["total_rows"] == 1
+            assert data["next_cursor"] is None
+
+    def test_query_projects_requested_fields(self, client):
+        """Test that fields= limits the selected columns"""
+        from main import bigquery_client
+
+        mock_job = MagicMock()
+        mock_job.result.return_value = Mock(pages=iter([[{'instance_type': 't3.medium'}]]), total_rows=1, next_page_token=None)
+
+        with patch.object(bigquery_client, 'query', return_value=mock_job) as mock_query:
+            response = client.get("/query-pricing-data?region=us-east-1&fields=instance_type,price_per_unit")
+            assert response.status_code == 200
+            query = mock_query.call_args[0][0]
+            assert "instance_type" in query
+            assert "priceperunit as price_per_unit" in query
+            assert "operating_system" not in query
+
+        response = client.get("/query-pricing-data?region=us-east-1&fields=instance_type,bogus")
+        assert response.status_code == 400
+        assert "bogus" in response.json()["detail"]
+
+    def test_query_formats_typed_lease_length(self, client):
+        """Test that term_length keeps its '1yr' format when leasecontractlength is INT64"""
+        from main import bigquery_client
+
+        mock_job = MagicMock()
+        mock_job.result.return_value = Mock(pages=iter([[]]), total_rows=0, next_page_token=None)
+
+        with patch.object(bigquery_client, 'query', return_value=mock_job) as mock_query:
+            response = client.get("/query-pricing-data?region=us-east-1&fields=term_length")
+            assert response.status_code == 200
+            query = mock_query.call_args[0][0]
+            assert "CONCAT(REGEXP_EXTRACT(CAST(leasecontractlength AS STRING), r'^\\s*(\\d+)'), 'yr') as term_length" in query
+
+    def test_query_pages_with_cursor(self, client):
+        """Test that next_cursor reads the following page from the query's results table"""
+        from main import bigquery_client, QUERY_PRICING_MAX_PAGE_SIZE
+        from google.cloud.bigquery import TableReference
+
+        mock_job = MagicMock()
+        mock_job.destination = TableReference.from_string("test-project._anon.anon_results")
+        mock_job.result.return_value = Mock(pages=iter([[{'instance_type': 't3.medium'}]]), total_rows=2, next_page_token="token-2")
+
+        with patch.object(bigquery_client, 'query', return_value=mock_job) as mock_query:
+            response = client.get("/query-pricing-data?region=us-east-1&page_size=100000")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["page_size"] == QUERY_PRICING_MAX_PAGE_SIZE
+            mock_job.result.assert_called_once_with(page_size=QUERY_PRICING_MAX_PAGE_SIZE)
+            cursor = data["next_cursor"]
+            assert cursor
+
+        last_page = Mock(pages=iter([[{'instance_type': 't3.large'}]]), total_rows=2, next_page_token=None)
+        with patch.object(bigquery_client, 'query') as mock_query, \
+             patch.object(bigquery_client, 'list_rows', return_value=last_page) as mock_list_rows:
+            response = client.get(f"/query-pricing-data?cursor={cursor}&page_size=1")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["results"] == [{'instance_type': 't3.large'}]
+            assert data["next_cursor"] is None
+            mock_query.assert_not_called()
+            mock_list_rows.assert_called_once_with("test-project._anon.anon_results", page_token="token-2", page_size=1)
+
+        response = client.get("/query-pricing-data?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_query_rejects_forged_cursor(self, client):
+        """Test that cursors with a bad signature or a non-results table are rejected"""
+        import base64
+        import json
+        from main import bigquery_client, encode_query_cursor
+        from google.cloud.bigquery import TableReference
+
+        payload, signature = encode_query_cursor(TableReference.from_string("test-project._anon.anon_results"), "token-2").split(".")
+        forged = base64.urlsafe_b64encode(json.dumps({"table": "test-project.private.users", "page_token": "token-2"}).encode()).decode()
+        signed_other_table = encode_query_cursor(TableReference.from_string("test-project.private.users"), "token-2")
+
+        with patch.object(bigquery_client, 'list_rows') as mock_list_rows:
+            for cursor in (f"{forged}.{signature}", forged, signed_other_table):
+                response = client.get(f"/query-pricing-data?cursor={cursor}")
+                assert response.status_code == 400
+            mock_list_rows.assert_not_called()
     
     def test_query_savings_plan_without_region(self, client):
         """Test that savings plan query requires region"""
@@ -194,7 +331,7 @@ class TestBigQueryQueries:
         
         # Mock query results
         mock_job = MagicMock()
-        mock_job.__iter__ = Mock(return_value=iter([mock_on_demand_data]))
+        mock_job.result.return_value = iter([mock_on_demand_data])
         
         with patch.object(bigquery_client, 'query', return_value=mock_job):
             instance = EC2Instance(**sample_instance_input)
@@ -209,7 +346,7 @@ class TestBigQueryQueries:
         
         # Mock empty results
         mock_job = MagicMock()
-        mock_job.__iter__ = Mock(return_value=iter([]))
+        mock_job.result.return_value = iter([])
         
         with patch.object(bigquery_client, 'query', return_value=mock_job):
             instance = EC2Instance(**sample_instance_input)
@@ -229,6 +366,27 @@ class TestBigQueryQueries:
             # Should return empty dict on error
             assert result == {}
 
+    def test_records_bytes_processed(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that bytes processed are totalled per set of referenced tables"""
+        from main import query_on_demand_pricing, EC2Instance, bigquery_client, BigQueryUsage
+        from google.cloud.bigquery import TableReference
+
+        mock_job = MagicMock()
+        mock_job.result.return_value = iter([mock_on_demand_data])
+        mock_job.total_bytes_processed = 2048
+        mock_job.total_bytes_billed = 10485760
+        mock_job.cache_hit = False
+        mock_job.referenced_tables = [TableReference.from_string("test-project.test_dataset.ec2_global_pricing_v2")]
+
+        with patch('main.bigquery_usage', BigQueryUsage()), \
+             patch.object(bigquery_client, 'query', return_value=mock_job):
+            query_on_demand_pricing(EC2Instance(**sample_instance_input))
+            stats = client.get("/bigquery-usage").json()
+
+        assert stats["jobs"] == 1
+        assert stats["bytes_processed"] == 2048
+        assert stats["by_tables"]["test_dataset.ec2_global_pricing_v2"]["bytes_billed"] == 10485760
+
 
 class TestPricingCalculations:
     """Tests for pricing calculation logic"""
@@ -363,4 +521,1021 @@ class TestHourlyRateFeature:
             # Check a few key hourly rate fields are present
             assert "compute_savings_plan_1_year_no_upfront_hourly_rate" in pricing_results
             assert "ec2_savings_plan_1_year_no_upfront_hourly_rate" in pricing_results
-            assert "standard_reserved_instance_1_year_no_upfront_hourly_rate" in pricing_results
\ No newline at end of file
+            assert "standard_reserved_instance_1_year_no_upfront_hourly_rate" in pricing_results
+
+class TestBatchedPricing:
+    """Tests for the batched BigQuery lookup used by /price-instances"""
+
+    def _mock_query(self, on_demand_row, ri_rows, sp_rows):
+        """Build a bigquery_client.query side effect returning rows per table"""
+        def mock_query(query_str, job_config=None):
+            mock_job = MagicMock()
+            if "savings_plan_" in query_str or "test_sp_" in query_str:
+                rows = sp_rows
+            else:
+                rows = [on_demand_row] + ri_rows
+            mock_job.result.return_value = iter(rows)
+            return mock_job
+        return mock_query
+
+    def test_batch_matches_per_instance_pricing(
+        self,
+        sample_instance_input,
+        mock_on_demand_data,
+        mock_reserved_instance_data,
+        mock_savings_plan_data
+    ):
+        """Test that batched lookups produce the same results as per-instance queries"""
+        from main import calculate_pricing, fetch_batch_pricing_data, pricing_key, EC2Instance, bigquery_client
+
+        on_demand_row = {**mock_on_demand_data, 'region_code': 'us-east-1', 'operation': 'RunInstances', 'tenancy': 'Shared'}
+        ri_rows = [{**row, 'operation': 'RunInstances', 'tenancy': 'Shared'} for row in mock_reserved_instance_data]
+
+        instance = EC2Instance(**{**sample_instance_input, 'qty': 3})
+        with patch.object(bigquery_client, 'query', side_effect=self._mock_query(on_demand_row, ri_rows, mock_savings_plan_data)) as mock_query:
+            batch_data = fetch_batch_pricing_data([instance, EC2Instance(**sample_instance_input)])
+            # One global query plus one savings plan query for the single region
+            assert mock_query.call_count == 2
+
+        batched = calculate_pricing(EC2Instance(**{**sample_instance_input, 'qty': 3}), batch_data[pricing_key(instance)])
+
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=mock_reserved_instance_data), \
+             patch('main.query_compute_savings_plan_pricing', return_value=mock_savings_plan_data), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            per_instance = calculate_pricing(EC2Instance(**{**sample_instance_input, 'qty': 3}))
+
+        assert batched == per_instance
+
+    def test_batch_picks_lowest_sku_on_demand_row(self, sample_instance_input, mock_on_demand_data):
+        """Test that the batch lookup picks the same On-Demand row as ORDER BY sku LIMIT 1"""
+        from main import fetch_batch_pricing_data, pricing_key, EC2Instance, bigquery_client
+
+        rows = [
+            {**mock_on_demand_data, 'sku': sku, 'priceperunit': price, 'region_code': 'us-east-1', 'operation': 'RunInstances', 'tenancy': 'Shared'}
+            for sku, price in (('SKU-B', '0.20'), ('SKU-A', '0.10'), ('SKU-C', '0.30'))
+        ]
+        instance = EC2Instance(**sample_instance_input)
+        with patch.object(bigquery_client, 'query', side_effect=self._mock_query(rows[0], rows[1:], [])):
+            batch_data = fetch_batch_pricing_data([instance])
+
+        assert batch_data[pricing_key(instance)]['on_demand']['sku'] == 'SKU-A'
+
+    def test_all_regions_table_answers_every_region_in_one_query(self, sample_instance_input, mock_on_demand_data, mock_savings_plan_data):
+        """Test that the all-region savings plan table replaces the per-region queries"""
+        from main import fetch_batch_pricing_data, pricing_key, EC2Instance, bigquery_client
+
+        sp_rows = mock_savings_plan_data + [
+            {**row, 'discountedregioncode': 'eu-west-1', 'discountedrate': '0.09'} for row in mock_savings_plan_data
+        ]
+        instances = [
+            EC2Instance(**sample_instance_input),
+            EC2Instance(**{**sample_instance_input, 'region_code': 'eu-west-1'}),
+            EC2Instance(**{**sample_instance_input, 'region_code': 'ap-south-1'}),
+        ]
+        with patch('main.SAVINGS_PLAN_ALL_REGIONS_ENABLED', True), \
+             patch.object(bigquery_client, 'query', side_effect=self._mock_query(mock_on_demand_data, [], sp_rows)) as mock_query:
+            batch_data = fetch_batch_pricing_data(instances)
+            # One global query plus one savings plan query for all three regions
+            assert mock_query.call_count == 2
+            queries = [call.args[0] for call in mock_query.call_args_list]
+            assert any("ec2_savings_plan_pricing_latest" in query for query in queries)
+
+        rates = [
+            [row['discountedrate'] for row in batch_data[pricing_key(instance)]['compute_savings_plan']]
+            for instance in instances
+        ]
+        assert rates == [['0.08'], ['0.09'], []]
+
+    def test_batch_failure_falls_back_to_per_instance(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that a failed batched lookup falls back to the per-instance queries"""
+        from main import bigquery_client
+
+        with patch.object(bigquery_client, 'query', side_effect=Exception("BigQuery error")), \
+             patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            response = client.post("/price-instances", json=[sample_instance_input])
+            assert response.status_code == 200
+            data = response.json()
+            assert data["instances"][0]["pricing_results"]["on_demand_hourly_rate"] == 0.10
+
+    def test_duplicate_shapes_priced_once(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that rows differing only in qty share one lookup and keep their order"""
+        from main import pricing_cache
+
+        instances = [
+            {**sample_instance_input, 'qty': 2},
+            {**sample_instance_input, 'instance_type': 't3.large'},
+            {**sample_instance_input, 'qty': 5},
+        ]
+        with patch('main.fetch_batch_pricing_data', return_value=None), \
+             patch('main.query_on_demand_pricing', return_value=mock_on_demand_data) as mock_on_demand, \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            response = client.post("/price-instances", json=instances)
+            assert mock_on_demand.call_count == 2
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["unique_instances"] == 2
+        assert data["dedup_ratio"] == 1.5
+        assert [i["input_data"]["instance_type"] for i in data["instances"]] == ["t3.medium", "t3.large", "t3.medium"]
+        assert data["instances"][0]["pricing_results"]["on_demand_1_year_total_cost"] == pytest.approx(876.0 * 2)
+        assert data["instances"][2]["pricing_results"]["on_demand_1_year_total_cost"] == pytest.approx(876.0 * 5)
+        assert pricing_cache.stats()["size"] == 2
+
+class TestPricingMatrix:
+    """Tests for lookups served from the precomputed pricing matrix"""
+
+    def _matrix_row(self, **rates):
+        from main import RATE_COLUMNS
+        row = {column: None for column in RATE_COLUMNS}
+        row.update({
+            'region_code': 'us-east-1',
+            'instance_type': 't3.medium',
+            'operation': 'RunInstances',
+            'tenancy': 'Shared',
+            'operating_system': 'Linux',
+        })
+        row.update(rates)
+        return row
+
+    def test_matrix_row_prices_like_pricing_rows(
+        self,
+        sample_instance_input,
+        mock_on_demand_data,
+        mock_reserved_instance_data,
+        mock_savings_plan_data
+    ):
+        """Test that a matrix row produces the same results as the rows it was built from"""
+        from main import calculate_pricing, empty_pricing_data, pricing_data_from_matrix_row, EC2Instance
+
+        row = self._matrix_row(
+            on_demand_rate=0.10,
+            ri_1yr_all_upfront_fee=100.0,
+            ri_1yr_no_upfront_rate=0.05,
+            compute_savings_plan_1yr_no_upfront_rate=0.08,
+        )
+        pricing_data = {
+            **empty_pricing_data(),
+            'on_demand': mock_on_demand_data,
+            'reserved': mock_reserved_instance_data,
+            'compute_savings_plan': mock_savings_plan_data,
+        }
+
+        instance = {**sample_instance_input, 'qty': 2}
+        from_matrix = calculate_pricing(EC2Instance(**instance), pricing_data_from_matrix_row(row))
+        from_rows = calculate_pricing(EC2Instance(**instance), pricing_data)
+        assert from_matrix == from_rows
+
+    def test_batch_lookup_falls_back_for_missing_keys(self, sample_instance_input):
+        """Test that keys missing from the matrix are looked up in the pricing tables"""
+        from main import fetch_batch_pricing_data, pricing_key, EC2Instance, bigquery_client
+
+        queries = []
+
+        def mock_query(query_str, job_config=None):
+            queries.append(query_str)
+            mock_job = MagicMock()
+            rows = [self._matrix_row(on_demand_rate=0.10)] if "ec2_pricing_matrix_latest" in query_str else []
+            mock_job.result.return_value = iter(rows)
+            return mock_job
+
+        matrix_instance = EC2Instance(**sample_instance_input)
+        missing_instance = EC2Instance(**{**sample_instance_input, 'instance_type': 'm5.large'})
+        with patch('main.PRICING_MATRIX_ENABLED', True), \
+             patch.object(bigquery_client, 'query', side_effect=mock_query):
+            batch_data = fetch_batch_pricing_data([matrix_instance, missing_instance])
+
+        assert batch_data[pricing_key(matrix_instance)]['on_demand']['priceperunit'] == 0.10
+        assert batch_data[pricing_key(missing_instance)]['on_demand'] == {}
+        # The matrix lookup plus the global and savings plan queries for the missing key
+        assert len(queries) == 3
+
+        queries.clear()
+        with patch('main.PRICING_MATRIX_ENABLED', True), \
+             patch.object(bigquery_client, 'query', side_effect=mock_query):
+            fetch_batch_pricing_data([matrix_instance])
+        assert len(queries) == 1
+
+
+class TestRegionComparison:
+    """Tests for pricing one instance shape across regions"""
+
+    def test_prices_every_ingested_region_in_one_batch(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that all ingested regions are priced from one batched lookup"""
+        from main import empty_pricing_data
+
+        def batch_data(instances):
+            rates = {'us-east-1': '0.10', 'eu-west-1': '0.12', 'ap-south-1': '0.08'}
+            data = {}
+            for instance in instances:
+                entry = empty_pricing_data()
+                entry['on_demand'] = {**mock_on_demand_data, 'priceperunit': rates[instance.region_code]}
+                data[(instance.region_code, instance.instance_type, instance.operation, instance.product_tenancy)] = entry
+            return data
+
+        shape = {key: value for key, value in sample_instance_input.items() if key != 'region_code'}
+        views = ['test_sp_us_east_1_latest', 'test_sp_eu_west_1_latest', 'test_sp_ap_south_1_latest']
+        with patch('main.BQ_TABLE_SAVINGS_PLAN_PREFIX', 'test_sp_'), \
+             patch('main.list_savings_plan_views', return_value=views), \
+             patch('main.fetch_batch_pricing_data', side_effect=batch_data) as fetch:
+            response = client.post("/price-instance/regions", json=shape)
+
+        assert response.status_code == 200
+        assert fetch.call_count == 1
+        data = response.json()
+        assert [region["input_data"]["region_code"] for region in data["regions"]] == ['us-east-1', 'eu-west-1', 'ap-south-1']
+        assert data["regions"][1]["pricing_results"]["on_demand_hourly_rate"] == pytest.approx(0.12)
+        assert data["cheapest_region"] == 'ap-south-1'
+
+        assert client.post("/price-instance/regions", json={**shape, "regions": []}).status_code == 400
+
+
+class TestSavingsPlanOptimizer:
+    """Tests for the Savings Plan commitment optimizer"""
+
+    def test_breakpoints_cover_largest_discount_first(self):
+        """Test that usage is covered in discount order and undiscounted shapes are skipped"""
+        import numpy as np
+        from main import savings_plan_breakpoints, savings_plan_hourly_costs
+
+        on_demand = np.array([1.0, 1.0, 1.0])
+        discounted = np.array([0.8, 0.5, 1.2])
+        quantity = np.array([2.0, 1.0, 1.0])
+        committed, covered = savings_plan_breakpoints(on_demand, discounted, quantity)
+
+        assert committed.tolist() == pytest.approx([0.0, 0.5, 2.1])
+        assert covered.tolist() == pytest.approx([0.0, 1.0, 3.0])
+        # Halfway through the first shape, then past full coverage
+        costs = savings_plan_hourly_costs(np.array([0.25, 3.0]), 4.0, committed, covered)
+        assert costs.tolist() == pytest.approx([0.25 + 4.0 - 0.5, 3.0 + 4.0 - 3.0])
+
+    def test_optimize_endpoint(self, client, sample_instance_input, mock_on_demand_data, mock_savings_plan_data):
+        """Test that the optimal commitment covers a fleet with a discounted rate"""
+        instances = [sample_instance_input, {**sample_instance_input, "qty": 2}]
+
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=mock_savings_plan_data), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]), \
+             patch('main.fetch_batch_pricing_data', return_value=None):
+            response = client.post("/savings-plans/optimize?points=5", json=instances)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["unique_instances"] == 1
+        assert data["on_demand_hourly_cost"] == pytest.approx(0.30)
+
+        best = data["best"]
+        assert (best["plan"], best["term"], best["purchase_option"]) == ("compute_savings_plan", 1, "No Upfront")
+        assert best["hourly_commitment"] == pytest.approx(0.24)
+        assert best["savings_percent"] == pytest.approx(20.0)
+        assert best["coverage"] == pytest.approx(1.0)
+        assert len(best["curve_hourly_costs"]) == 5
+
+        # Plans without rates for this fleet stay at On-Demand with no commitment
+        ec2_plan = next(plan for plan in data["plans"] if plan["plan"] == "ec2_savings_plan")
+        assert ec2_plan["hourly_commitment"] == 0.0
+        assert ec2_plan["hourly_cost"] == pytest.approx(0.30)
+
+        assert client.post("/savings-plans/optimize?points=1", json=instances).status_code == 400
+        assert client.post("/savings-plans/optimize?usage=1,1.5", json=instances).status_code == 400
+
+    def test_partial_coverage_wins_for_idle_fleet(self, client, sample_instance_input, mock_on_demand_data, mock_savings_plan_data):
+        """Test that a fleet running fully a quarter of the time is best covered only for its base load"""
+        instances = [{**sample_instance_input, "qty": 3}]
+
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=mock_savings_plan_data), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]), \
+             patch('main.fetch_batch_pricing_data', return_value=None):
+            response = client.post("/savings-plans/optimize?points=3&usage=1,0.5,0.5,0.5", json=instances)
+
+        assert response.status_code == 200
+        data = response.json()
+        # 0.30/hour at full usage, 0.15/hour the rest of the time
+        assert data["on_demand_hourly_cost"] == pytest.approx(0.1875)
+
+        best = data["best"]
+        # Covering the base load (0.15 On-Demand for 0.12) beats full coverage,
+        # whose top half at a 0.8 rate ratio only runs a quarter of the hours
+        assert best["hourly_commitment"] == pytest.approx(0.12)
+        assert best["hourly_cost"] == pytest.approx(0.1575)
+        assert best["coverage"] == pytest.approx(0.8)
+        assert best["curve_hourly_costs"] == pytest.approx([0.1875, 0.1575, 0.24])
+
+    def test_ec2_savings_plan_committed_per_region_and_family(self, sample_instance_input, mock_on_demand_data):
+        """Test that EC2 Instance Savings Plans get one commitment per region and instance family"""
+        from main import optimize_savings_plans, EC2InstanceInput
+
+        instances = [
+            EC2InstanceInput(**sample_instance_input),
+            EC2InstanceInput(**{**sample_instance_input, 'instance_type': 't3.large', 'qty': 2}),
+            EC2InstanceInput(**{**sample_instance_input, 'instance_type': 'm5.large'}),
+            EC2InstanceInput(**{**sample_instance_input, 'region_code': 'eu-west-1'}),
+        ]
+        ec2_rows = [{'discountedrate': '0.06', 'purchaseoption': 'No Upfront', 'leasecontractlength': '1'}]
+
+        with patch('main.fetch_batch_pricing_data', return_value=None), \
+             patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=ec2_rows):
+            result = optimize_savings_plans(instances, points=3)
+
+        plan = next(p for p in result.plans if (p.plan, p.term, p.purchase_option) == ('ec2_savings_plan', 1, 'No Upfront'))
+        assert plan.group_commitments == pytest.approx({
+            'eu-west-1/t3': 0.06,
+            'us-east-1/m5': 0.06,
+            'us-east-1/t3': 0.18,
+        })
+        assert plan.hourly_commitment == pytest.approx(0.30)
+        assert plan.coverage == pytest.approx(1.0)
+        assert plan.hourly_cost == pytest.approx(0.30)
+
+
+class TestStreamingBulkPricing:
+    """Tests for the NDJSON /price-instances/stream endpoint"""
+
+    def test_stream_emits_line_per_instance_and_summary(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that every instance gets its own line, in order, followed by a summary"""
+        import json
+
+        instances = [
+            sample_instance_input,
+            {**sample_instance_input, 'instance_type': 't3.large'},
+            {**sample_instance_input, 'qty': 4},
+        ]
+        with patch('main.PRICING_STREAM_CHUNK_SIZE', 2), \
+             patch('main.fetch_batch_pricing_data', return_value=None), \
+             patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            response = client.post("/price-instances/stream", json=instances)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 4
+        assert [line["input_data"]["instance_type"] for line in lines[:3]] == ["t3.medium", "t3.large", "t3.medium"]
+        assert lines[2]["pricing_results"]["on_demand_1_year_total_cost"] == pytest.approx(876.0 * 4)
+        assert lines[3]["summary"] == {
+            "count": 3,
+            "unique_instances": 2,
+            "dedup_ratio": 1.5,
+            "instances_with_errors": 0,
+            "error": None,
+        }
+
+    def test_stream_failure_after_first_chunk_reported_in_summary(self, client, sample_instance_input):
+        """Test that a failure mid-stream ends the stream with an error summary"""
+        import json
+        from main import AdmissionRejected
+
+        instances = [sample_instance_input, {**sample_instance_input, 'instance_type': 't3.large'}]
+        with patch('main.PRICING_STREAM_CHUNK_SIZE', 1), \
+             patch('main.fetch_batch_pricing_data', side_effect=[{}, AdmissionRejected("Too many BigQuery jobs queued", 5)]), \
+             patch('main.fetch_instance_pricing_data', return_value={'on_demand': {}, 'reserved': [], 'compute_savings_plan': [], 'ec2_savings_plan': []}):
+            response = client.post("/price-instances/stream", json=instances)
+
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert len(lines) == 2
+        assert lines[1]["summary"]["count"] == 1
+        assert lines[1]["summary"]["error"] == "Too many BigQuery jobs queued"
+
+class TestFleetFileUpload:
+    """Tests for the /price-instances/upload endpoint"""
+
+    COST_EXPORT_CSV = (
+        "Value,aws/region_code,aws/instance_type,Operation,aws/operating_system,aws/product_tenancy,2025-06\n"
+        "Actual,us-east-1,t3.medium,RunInstances,Linux,Shared,3\n"
+        "Actual,,t3.large,RunInstances,Linux,Shared,1\n"
+        "Actual,us-east-1,t3.large,RunInstances,Linux,,2\n"
+    )
+
+    def _upload(self, client, body, mock_on_demand_data):
+        import json
+
+        with patch('main.PRICING_STREAM_CHUNK_SIZE', 1), \
+             patch('main.fetch_batch_pricing_data', return_value=None), \
+             patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            response = client.post("/price-instances/upload", content=body)
+        assert response.status_code == 200
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_upload_cost_export_csv(self, client, mock_on_demand_data):
+        """Test that the cost export layout is parsed and rows missing fields are skipped"""
+        lines = self._upload(client, self.COST_EXPORT_CSV.encode(), mock_on_demand_data)
+
+        assert len(lines) == 3
+        assert lines[0]["input_data"]["qty"] == 3
+        assert lines[0]["pricing_results"]["on_demand_1_year_total_cost"] == pytest.approx(876.0 * 3)
+        assert lines[1]["input_data"]["instance_type"] == "t3.large"
+        assert lines[1]["input_data"]["product_tenancy"] == "Shared"
+        assert lines[2]["summary"]["count"] == 2
+
+    def test_upload_xlsx(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that XLSX uploads in the template layout are priced"""
+        import io
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(list(sample_instance_input))
+        sheet.append([*list(sample_instance_input.values())[:-1], 4])
+        body = io.BytesIO()
+        workbook.save(body)
+
+        lines = self._upload(client, body.getvalue(), mock_on_demand_data)
+
+        assert len(lines) == 2
+        assert lines[0]["input_data"]["qty"] == 4
+        assert lines[1]["summary"]["count"] == 1
+
+    def test_upload_without_valid_rows(self, client):
+        """Test that a file with no usable rows is rejected"""
+        response = client.post("/price-instances/upload", content=b"name,value\nfoo,1\n")
+        assert response.status_code == 400
+
+    def test_upload_overflowing_qty_and_size_limit(self, client, mock_on_demand_data):
+        """Test that an infinite qty falls back to 1 and oversized uploads are rejected"""
+        body = b"region_code,instance_type,operation,operating_system,qty\nus-east-1,t3.medium,RunInstances,Linux,1e400\n"
+        lines = self._upload(client, body, mock_on_demand_data)
+        assert lines[0]["input_data"]["qty"] == 1
+
+        with patch('main.UPLOAD_MAX_BYTES', len(body) - 1):
+            assert client.post("/price-instances/upload", content=body).status_code == 413
+
+class TestPricingJobs:
+    """Tests for asynchronous bulk pricing jobs"""
+
+    @pytest.fixture
+    def job_runner(self, tmp_path):
+        from main import PricingJobRunner, SQLitePricingJobStore
+
+        runner = PricingJobRunner(SQLitePricingJobStore(str(tmp_path / "jobs.sqlite3")), workers=1, chunk_size=2, max_attempts=1)
+        with patch('main.pricing_jobs', runner):
+            yield runner
+        runner.stop()
+
+    def _wait_for_job(self, client, job_id):
+        import time
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = client.get(f"/pricing-jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed"):
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f"Pricing job {job_id} did not finish")
+
+    def test_store_and_attempts_validated(self, tmp_path):
+        """Test that an incomplete store cannot be created and attempts are at least one"""
+        from main import PricingJobRunner, PricingJobStore, SQLitePricingJobStore
+
+        class IncompleteStore(PricingJobStore):
+            def get_job(self, job_id):
+                return None
+
+        with pytest.raises(TypeError):
+            IncompleteStore()
+
+        runner = PricingJobRunner(SQLitePricingJobStore(str(tmp_path / "jobs.sqlite3")), workers=1, chunk_size=2, max_attempts=0)
+        assert runner.max_attempts == 1
+
+    def test_job_results_are_paged(self, client, job_runner, sample_instance_input, mock_on_demand_data):
+        """Test that a submitted job completes and its results can be read in pages"""
+        instances = [{**sample_instance_input, 'qty': qty} for qty in (1, 2, 3)]
+        with patch('main.fetch_batch_pricing_data', return_value=None), \
+             patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            response = client.post("/pricing-jobs", json=instances)
+            assert response.status_code == 202
+            job = self._wait_for_job(client, response.json()["job_id"])
+
+        assert job["status"] == "completed"
+        assert job["completed"] == 3
+        assert job["progress"] == 1.0
+
+        page = client.get(f"/pricing-jobs/{job['job_id']}/results?limit=2").json()
+        assert page["next_offset"] == 2
+        assert [i["input_data"]["qty"] for i in page["instances"]] == [1, 2]
+
+        page = client.get(f"/pricing-jobs/{job['job_id']}/results?offset=2&limit=2").json()
+        assert page["next_offset"] is None
+        assert page["instances"][0]["pricing_results"]["on_demand_1_year_total_cost"] == pytest.approx(876.0 * 3)
+
+        assert client.get("/pricing-jobs/unknown").status_code == 404
+
+    def test_retry_skips_completed_chunks(self, client, job_runner, sample_instance_input):
+        """Test that retrying a failed job only prices the chunks that did not finish"""
+        from main import BulkPricingResponse, price_instance_batch
+
+        calls = []
+
+        def flaky_batch(instances):
+            calls.append(len(instances))
+            if len(calls) == 2:
+                raise Exception("BigQuery error")
+            return BulkPricingResponse(instances=price_instance_batch(instances).instances)
+
+        instances = [{**sample_instance_input, 'qty': qty} for qty in (1, 2, 3)]
+        with patch('main.fetch_batch_pricing_data', return_value={}), \
+             patch('main.fetch_instance_pricing_data', return_value={'on_demand': {}, 'reserved': [], 'compute_savings_plan': [], 'ec2_savings_plan': []}), \
+             patch('main.price_instance_batch', side_effect=flaky_batch):
+            job_id = client.post("/pricing-jobs", json=instances).json()["job_id"]
+            job = self._wait_for_job(client, job_id)
+            assert job["status"] == "failed"
+            assert job["completed"] == 2
+            assert client.get(f"/pricing-jobs/{job_id}/results").status_code == 409
+
+            assert client.post(f"/pricing-jobs/{job_id}/retry").status_code == 202
+            job = self._wait_for_job(client, job_id)
+
+        assert job["status"] == "completed"
+        assert calls == [2, 1, 1]
+        assert len(client.get(f"/pricing-jobs/{job_id}/results").json()["instances"]) == 3
+
+class TestPricingSnapshot:
+    """Tests for the in-memory pricing snapshot"""
+
+    def _mock_bigquery(self, bigquery_client, source_table, on_demand_row, sp_rows):
+        """Patch the BigQuery calls made while building a snapshot"""
+        view = MagicMock()
+        view.view_query = f"SELECT * FROM `test-project.test_dataset.{source_table}`"
+        sp_view = MagicMock()
+        sp_view.table_id = "test_sp_us_east_1_latest"
+
+        def mock_query(query_str, job_config=None):
+            mock_job = MagicMock()
+            rows = sp_rows if "test_sp_" in query_str else [on_demand_row]
+            mock_job.result.return_value = iter(rows)
+            return mock_job
+
+        return patch.multiple(
+            bigquery_client,
+            get_table=Mock(return_value=view),
+            list_tables=Mock(return_value=[sp_view]),
+            query=Mock(side_effect=mock_query),
+        )
+
+    def test_snapshot_serves_calculate_pricing(self, sample_instance_input, mock_on_demand_data, mock_savings_plan_data):
+        """Test that a loaded snapshot answers lookups without BigQuery queries"""
+        from main import PricingSnapshot, calculate_pricing, EC2Instance, bigquery_client
+
+        on_demand_row = {**mock_on_demand_data, 'region_code': 'us-east-1', 'operation': 'RunInstances', 'tenancy': 'Shared'}
+        snapshot = PricingSnapshot()
+        assert snapshot.lookup(('us-east-1', 't3.medium', 'RunInstances', 'Shared')) is None
+
+        with self._mock_bigquery(bigquery_client, "ec2_global_pricing_v1", on_demand_row, mock_savings_plan_data):
+            snapshot.build()
+
+        assert snapshot.ready
+        assert snapshot.versions["test_sp_us_east_1_latest"] == "ec2_global_pricing_v1"
+
+        with patch('main.pricing_snapshot', snapshot), \
+             patch('main.query_on_demand_pricing') as mock_on_demand:
+            result = calculate_pricing(EC2Instance(**sample_instance_input))
+            assert not mock_on_demand.called
+
+        assert result.on_demand_hourly_rate == 0.10
+        assert result.compute_savings_plan_1_year_no_upfront_hourly_rate == 0.08
+
+    def test_snapshot_rebuilds_on_new_version(self, mock_on_demand_data):
+        """Test that the snapshot only rebuilds when a view points at a new table"""
+        from main import PricingSnapshot, bigquery_client
+
+        on_demand_row = {**mock_on_demand_data, 'region_code': 'us-east-1', 'operation': 'RunInstances', 'tenancy': 'Shared'}
+        snapshot = PricingSnapshot()
+
+        with self._mock_bigquery(bigquery_client, "ec2_global_pricing_v1", on_demand_row, []):
+            assert snapshot.refresh_if_stale() is True
+            assert snapshot.refresh_if_stale() is False
+
+        with self._mock_bigquery(bigquery_client, "ec2_global_pricing_v2", on_demand_row, []):
+            assert snapshot.refresh_if_stale() is True
+            assert snapshot.versions["test_ec2_global"] == "ec2_global_pricing_v2"
+
+    def test_snapshot_kept_when_views_unreadable_or_too_large(self, mock_on_demand_data):
+        """Test that a failed view lookup or an oversized build keeps the current snapshot"""
+        from main import PricingSnapshot, PricingSnapshotTooLarge, bigquery_client
+
+        on_demand_row = {**mock_on_demand_data, 'region_code': 'us-east-1', 'operation': 'RunInstances', 'tenancy': 'Shared'}
+        snapshot = PricingSnapshot(max_rows=2)
+
+        with self._mock_bigquery(bigquery_client, "ec2_global_pricing_v1", on_demand_row, []):
+            assert snapshot.refresh_if_stale() is True
+            assert "LIMIT 3" in bigquery_client.query.call_args_list[0][0][0]
+        assert snapshot.status()["estimated_bytes"] > 0
+
+        with patch.object(bigquery_client, 'get_table', side_effect=Exception("transient error")), \
+             patch.object(bigquery_client, 'list_tables', return_value=[]):
+            with pytest.raises(Exception, match="transient error"):
+                snapshot.refresh_if_stale()
+        assert snapshot.versions["test_ec2_global"] == "ec2_global_pricing_v1"
+
+        with self._mock_bigquery(bigquery_client, "ec2_global_pricing_v2", on_demand_row, [{}, {}]):
+            with pytest.raises(PricingSnapshotTooLarge):
+                snapshot.refresh_if_stale()
+        assert snapshot.ready
+        assert snapshot.versions["test_ec2_global"] == "ec2_global_pricing_v1"
+
+
+class TestPricingResultCache:
+    """Tests for the pricing result cache in front of calculate_pricing"""
+
+    def test_cache_hit_scales_by_qty(self, sample_instance_input, mock_on_demand_data, mock_reserved_instance_data):
+        """Test that repeated shapes are served from the cache and scaled by qty"""
+        from main import calculate_pricing, pricing_cache, EC2Instance
+
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data) as mock_on_demand, \
+             patch('main.query_reserved_instance_pricing', return_value=mock_reserved_instance_data), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            single = calculate_pricing(EC2Instance(**sample_instance_input))
+            tripled = calculate_pricing(EC2Instance(**{**sample_instance_input, 'qty': 3}))
+            assert mock_on_demand.call_count == 1
+
+        assert pricing_cache.hits == 1
+        assert pricing_cache.misses == 1
+        assert tripled.on_demand_hourly_rate == single.on_demand_hourly_rate
+        assert tripled.on_demand_1_year_total_cost == single.on_demand_1_year_total_cost * 3
+        assert tripled.standard_reserved_instance_1_year_all_upfront_total_cost == 300.0
+
+    @pytest.mark.parametrize('operating_system', ['', '  Linux  '])
+    def test_cache_hit_ignores_operating_system(self, sample_instance_input, mock_on_demand_data,
+                                                mock_reserved_instance_data, operating_system):
+        """Test that a blank or padded OS is served from the entry cached by the batch path"""
+        from main import calculate_pricing, calculate_pricing_batch, pricing_cache, sanitize_input
+
+        padded = {**sample_instance_input, 'instance_type': ' t3.medium ', 'operating_system': operating_system}
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data) as mock_on_demand, \
+             patch('main.query_reserved_instance_pricing', return_value=mock_reserved_instance_data), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            calculate_pricing_batch([sanitize_input(padded)])
+            instance = sanitize_input(padded)
+            calculate_pricing(instance)
+            assert mock_on_demand.call_count == 1
+
+        assert pricing_cache.hits == 1
+        assert pricing_cache.misses == 1
+        assert instance.instance_type == 't3.medium'
+        assert instance.operating_system == 'Linux'
+
+    def test_cache_evicts_least_recently_used(self):
+        """Test that the cache stays within its size bound"""
+        from main import PricingResultCache
+
+        cache = PricingResultCache(max_size=2, ttl_seconds=60, version_check_seconds=60)
+        with patch.object(cache, '_current_version', return_value=('v1',)):
+            cache.put(('a',), 'Linux', MagicMock())
+            cache.put(('b',), 'Linux', MagicMock())
+            assert cache.get(('a',)) is not None
+            cache.put(('c',), 'Linux', MagicMock())
+
+            assert cache.get(('b',)) is None
+            assert cache.get(('a',)) is not None
+            assert cache.evictions == 1
+
+    def test_cache_invalidated_on_version_change(self):
+        """Test that a new pricing version drops every cached result"""
+        from main import PricingResultCache
+
+        cache = PricingResultCache(max_size=10, ttl_seconds=60, version_check_seconds=60)
+        with patch.object(cache, '_current_version', return_value=('v1',)):
+            cache.put(('a',), 'Linux', MagicMock())
+            assert cache.get(('a',)) is not None
+        with patch.object(cache, '_current_version', return_value=('v2',)):
+            assert cache.get(('a',)) is None
+        assert cache.invalidations == 1
+
+
+class TestPricingQueryCache:
+    """Tests for the /query-pricing-data cache"""
+
+    def test_equivalent_filters_share_an_entry(self, client):
+        """Test that filters building the same query are served from one BigQuery job"""
+        from main import bigquery_client, query_cache
+
+        def query_job(*args, **kwargs):
+            job = MagicMock()
+            job.result.return_value = Mock(pages=iter([[{'instance_type': 't3.medium'}]]), total_rows=1, next_page_token=None)
+            return job
+
+        with patch.object(query_cache._version_check, 'current', return_value=('v1',)), \
+             patch.object(bigquery_client, 'query', side_effect=query_job) as mock_query:
+            first = client.get("/query-pricing-data?region=us-east-1&term=Reserved")
+            second = client.get("/query-pricing-data?region=%20us-east-1%20&term=reserved&os=")
+            assert first.json() == second.json()
+            assert mock_query.call_count == 1
+
+            client.get("/query-pricing-data?region=us-west-2&term=Reserved")
+            assert mock_query.call_count == 2
+
+        assert query_cache.hits == 1
+        assert query_cache.misses == 2
+
+    def test_serves_stale_page_while_refreshing(self):
+        """Test that an expired page is returned immediately and refreshed in the background"""
+        import time
+        from main import PricingQueryCache
+
+        cache = PricingQueryCache(max_size=10, ttl_seconds=0, stale_seconds=60, version_check_seconds=60, cache_pages=True)
+        loader = Mock(side_effect=[{'results': ['old']}, {'results': ['new']}])
+        with patch.object(cache._version_check, 'current', return_value=('v1',)):
+            assert cache.get_or_load(('q',), loader) == {'results': ['old']}
+            assert cache.get_or_load(('q',), loader) == {'results': ['old']}
+            assert cache.stale_hits == 1
+
+            deadline = time.monotonic() + 2
+            while cache.stats()['refreshing'] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert loader.call_count == 2
+            assert cache.get_or_load(('q',), loader) == {'results': ['new']}
+
+    def test_refreshes_skip_when_workers_are_busy(self):
+        """Test that refreshes run on the cache's own pool and are skipped when it is full"""
+        import threading
+        from main import PricingQueryCache
+
+        cache = PricingQueryCache(max_size=10, ttl_seconds=0, stale_seconds=60, version_check_seconds=60,
+                                  cache_pages=True, refresh_workers=1)
+        release = threading.Event()
+
+        def slow_loader():
+            release.wait(2)
+            return {'results': ['new']}
+
+        with patch.object(cache._version_check, 'current', return_value=('v1',)), \
+             patch('main.query_executor') as mock_query_executor:
+            cache.get_or_load(('a',), lambda: {'results': ['a']})
+            cache.get_or_load(('b',), lambda: {'results': ['b']})
+            assert cache.get_or_load(('a',), slow_loader) == {'results': ['a']}
+            assert cache.get_or_load(('b',), slow_loader) == {'results': ['b']}
+            release.set()
+
+        assert cache.stale_hits == 2
+        assert cache.refresh_skips == 1
+        mock_query_executor.submit.assert_not_called()
+
+    def test_version_change_and_size_bound(self):
+        """Test that a new pricing version misses and old entries are evicted"""
+        from main import PricingQueryCache
+
+        cache = PricingQueryCache(max_size=2, ttl_seconds=60, stale_seconds=0, version_check_seconds=60, cache_pages=True)
+        with patch.object(cache._version_check, 'current', return_value=('v1',)):
+            for key in ('a', 'b', 'c'):
+                cache.get_or_load((key,), lambda: {'results': [key]})
+            assert cache.evictions == 1
+            assert cache.stats()['size'] == 2
+
+        loader = Mock(return_value={'results': ['v2']})
+        with patch.object(cache._version_check, 'current', return_value=('v2',)):
+            assert cache.get_or_load(('c',), loader) == {'results': ['v2']}
+        assert loader.call_count == 1
+        assert cache.invalidations == 2
+
+    def test_version_check_does_not_block_lookups(self):
+        """Test that a slow version check leaves other lookups on the last known version"""
+        import threading
+        import time
+        from main import PricingQueryCache
+
+        cache = PricingQueryCache(max_size=10, ttl_seconds=60, stale_seconds=0, version_check_seconds=0.01, cache_pages=True)
+        checking, release = threading.Event(), threading.Event()
+
+        def slow_versions():
+            checking.set()
+            release.wait(5)
+            return {'ec2_global_pricing_latest': 'v2'}
+
+        with patch('main.get_latest_view_versions', return_value={'ec2_global_pricing_latest': 'v1'}):
+            cache.get_or_load(('q',), lambda: {'results': ['v1']})
+
+        with patch('main.get_latest_view_versions', side_effect=slow_versions):
+            time.sleep(0.02)
+            checker = threading.Thread(target=cache.get_or_load, args=(('q',), lambda: {'results': ['v2']}))
+            checker.start()
+            assert checking.wait(5)
+            assert cache.get_or_load(('q',), Mock()) == {'results': ['v1']}
+            release.set()
+            checker.join(5)
+
+
+class TestConcurrentPricingQueries:
+    """Tests for the concurrent per-instance pricing queries"""
+
+    def test_queries_run_concurrently(self, sample_instance_input):
+        """Test that the four pricing queries overlap instead of running back to back"""
+        import time
+        from main import calculate_pricing, EC2Instance
+
+        def slow_query(result):
+            def query(instance, raise_errors=False):
+                time.sleep(0.3)
+                return result
+            return query
+
+        with patch('main.query_on_demand_pricing', side_effect=slow_query({})), \
+             patch('main.query_reserved_instance_pricing', side_effect=slow_query([])), \
+             patch('main.query_compute_savings_plan_pricing', side_effect=slow_query([])), \
+             patch('main.query_ec2_savings_plan_pricing', side_effect=slow_query([])):
+            started = time.monotonic()
+            calculate_pricing(EC2Instance(**sample_instance_input))
+            assert time.monotonic() - started < 0.9
+
+    def test_query_failure_reported_in_errors(self, client, sample_instance_input, mock_on_demand_data):
+        """Test that a failed query is reported instead of silently returning no data"""
+        with patch('main.query_on_demand_pricing', return_value=mock_on_demand_data), \
+             patch('main.query_reserved_instance_pricing', return_value=[]), \
+             patch('main.query_compute_savings_plan_pricing', side_effect=Exception("table not found")), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            response = client.post("/price-instance", json=sample_instance_input)
+            assert response.status_code == 200
+            data = response.json()
+
+            assert data["pricing_results"]["on_demand_hourly_rate"] == 0.10
+            assert data["errors"] == ["Compute Savings Plan pricing query failed: table not found"]
+
+    def test_query_timeout_reported_in_errors(self, sample_instance_input):
+        """Test that a query exceeding the timeout is reported and not cached"""
+        import time
+        from main import calculate_pricing, pricing_cache, EC2Instance
+
+        def slow_query(instance, raise_errors=False):
+            time.sleep(0.3)
+            return []
+
+        errors = []
+        with patch('main.BIGQUERY_QUERY_TIMEOUT_SECONDS', 0.05), \
+             patch('main.query_on_demand_pricing', return_value={}), \
+             patch('main.query_reserved_instance_pricing', side_effect=slow_query), \
+             patch('main.query_compute_savings_plan_pricing', return_value=[]), \
+             patch('main.query_ec2_savings_plan_pricing', return_value=[]):
+            calculate_pricing(EC2Instance(**sample_instance_input), errors=errors)
+
+        assert errors == ["Reserved Instance pricing query timed out after 0.05s"]
+        assert pricing_cache.stats()["size"] == 0
+
+    def test_timed_out_query_job_cancelled(self, sample_instance_input):
+        """Test that a query whose result wait times out is cancelled in BigQuery"""
+        from concurrent.futures import TimeoutError as FuturesTimeoutError
+        from main import query_on_demand_pricing, EC2Instance, bigquery_client
+
+        mock_job = MagicMock()
+        mock_job.result.side_effect = FuturesTimeoutError()
+
+        with patch('main.BIGQUERY_QUERY_TIMEOUT_SECONDS', 0.05), \
+             patch.object(bigquery_client, 'query', return_value=mock_job) as mock_query:
+            with pytest.raises(FuturesTimeoutError):
+                query_on_demand_pricing(EC2Instance(**sample_instance_input), raise_errors=True)
+
+        assert int(mock_query.call_args.kwargs["job_config"].job_timeout_ms) == 50
+        mock_job.result.assert_called_once_with(timeout=0.05)
+        mock_job.cancel.assert_called_once()
+
+
+class TestBigQueryAdmissionControl:
+    """Tests for BigQuery admission control"""
+
+    def test_rejects_when_queue_full(self):
+        """Test that jobs over the in-flight cap are rejected once the queue is full"""
+        from main import BigQueryAdmissionControl, AdmissionRejected
+
+        admission = BigQueryAdmissionControl(max_inflight_jobs=1, max_queued_jobs=0, queue_timeout_seconds=1, retry_after_seconds=7)
+        with admission.slot():
+            assert admission.in_flight == 1
+            with pytest.raises(AdmissionRejected) as exc_info:
+                with admission.slot():
+                    pass
+        assert exc_info.value.retry_after == 7
+        assert admission.rejected == 1
+        assert admission.in_flight == 0
+
+    def test_rejects_after_queue_timeout(self):
+        """Test that a queued job gives up after the queue timeout"""
+        from main import BigQueryAdmissionControl, AdmissionRejected
+
+        admission = BigQueryAdmissionControl(max_inflight_jobs=1, max_queued_jobs=5, queue_timeout_seconds=0.05, retry_after_seconds=1)
+        with admission.slot():
+            with pytest.raises(AdmissionRejected, match="Timed out"):
+                with admission.slot():
+                    pass
+        assert admission.queued == 0
+
+    def test_endpoint_returns_429_with_retry_after(self, client, sample_instance_input):
+        """Test that a rejected BigQuery job surfaces as 429 with Retry-After"""
+        from main import AdmissionRejected
+
+        rejected = AdmissionRejected("Too many BigQuery jobs queued", 5)
+        with patch('main.run_query', side_effect=rejected), patch('main.run_query_page', side_effect=rejected):
+            response = client.get("/query-pricing-data?region=us-east-1")
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "5"
+
+            response = client.post("/price-instances", json=[sample_instance_input])
+            assert response.status_code == 429
+
+
+class TestPricingKernel:
+    """Tests for the vectorized pricing kernel"""
+
+    def _pricing_data(self, on_demand_rate, ri_rows=None, compute_sp_rows=None):
+        return {
+            'on_demand': {'priceperunit': str(on_demand_rate), 'operating_system': 'Linux'},
+            'reserved': ri_rows or [],
+            'compute_savings_plan': compute_sp_rows or [],
+            'ec2_savings_plan': [],
+        }
+
+    def test_kernel_prices_many_instances(self):
+        """Test that one kernel pass prices each instance at its own quantity"""
+        from main import price_pricing_data
+
+        ri_rows = [
+            # The hourly row before the fee row must still include the fee in the total
+            {'leasecontractlength': '3yr', 'purchaseoption': 'Partial Upfront', 'pricedescription': 'USD 0.02 per Hour', 'priceperunit': '0.02'},
+            {'leasecontractlength': '3yr', 'purchaseoption': 'Partial Upfront', 'pricedescription': 'Upfront Fee', 'priceperunit': '500'},
+            {'leasecontractlength': '1yr', 'purchaseoption': 'All Upfront', 'pricedescription': 'Upfront Fee', 'priceperunit': '876'},
+        ]
+        compute_sp_rows = [
+            {'leasecontractlength': '1', 'purchaseoption': 'Partial Upfront', 'discountedrate': '0.04'},
+        ]
+        results = price_pricing_data(
+            [self._pricing_data(0.10), self._pricing_data(0.20, ri_rows, compute_sp_rows)],
+            [1, 2],
+        )
+
+        assert results[0].on_demand_1_year_total_cost == pytest.approx(876.0)
+        assert results[0].standard_reserved_instance_3_year_partial_upfront_total_cost['total_cost'] == 0.0
+        assert results[1].on_demand_3_year_total_cost == pytest.approx(0.20 * 26280 * 2)
+        assert results[1].standard_reserved_instance_3_year_partial_upfront_total_cost == pytest.approx({
+            'total_cost': 1000 + 0.02 * 26280 * 2,
+            'upfront_fee': 1000.0,
+            'plan_cost': 0.02 * 26280 * 2,
+        })
+        assert results[1].standard_reserved_instance_3_year_partial_upfront_hourly_rate == 0.02
+        assert results[1].standard_reserved_instance_1_year_all_upfront_total_cost == pytest.approx(1752.0)
+        assert results[1].standard_reserved_instance_1_year_all_upfront_hourly_rate == pytest.approx(0.2)
+        assert results[1].compute_savings_plan_1_year_partial_upfront_total_cost['upfront_fee'] == pytest.approx(0.04 * 8760)
+        assert results[1].compute_savings_plan_1_year_partial_upfront_hourly_rate == 0.04
+
+    def test_typed_rows_match_string_rows(self):
+        """Test that rows from typed tables price the same as rows loaded as STRING"""
+        from main import price_pricing_data
+
+        ri_rows = [
+            {'leasecontractlength': '3yr', 'purchaseoption': 'Partial Upfront', 'pricedescription': 'Upfront Fee', 'priceperunit': '500'},
+            {'leasecontractlength': '1yr', 'purchaseoption': 'No Upfront', 'pricedescription': 'USD 0.05 per Hour', 'priceperunit': '0.05'},
+        ]
+        compute_sp_rows = [{'leasecontractlength': '3', 'purchaseoption': 'All Upfront', 'discountedrate': '0.03'}]
+        typed_ri_rows = [
+            {**row, 'leasecontractlength': int(row['leasecontractlength'][0]), 'priceperunit': float(row['priceperunit'])}
+            for row in ri_rows
+        ]
+        typed_sp_rows = [{**row, 'leasecontractlength': 3, 'discountedrate': 0.03} for row in compute_sp_rows]
+        typed = {**self._pricing_data(0.10, typed_ri_rows, typed_sp_rows), 'on_demand': {'priceperunit': 0.10}}
+
+        string_results, typed_results = price_pricing_data(
+            [self._pricing_data(0.10, ri_rows, compute_sp_rows), typed], [1, 1]
+        )
+        assert typed_results == string_results
+        assert typed_results.standard_reserved_instance_1_year_no_upfront_hourly_rate == 0.05
+        assert typed_results.compute_savings_plan_3_year_all_upfront_hourly_rate == 0.03
+
+    def test_batch_matches_calculate_pricing(
+        self,
+        sample_instance_input,
+        mock_on_demand_data,
+        mock_reserved_instance_data,
+        mock_savings_plan_data
+    ):
+        """Test that the bulk path gives the same results as pricing each instance alone"""
+        from main import calculate_pricing, calculate_pricing_batch, pricing_cache, EC2Instance
+
+        pricing_data = {
+            'on_demand': mock_on_demand_data,
+            'reserved': mock_reserved_instance_data,
+            'compute_savings_plan': mock_savings_plan_data,
+            'ec2_savings_plan': [],
+        }
+        instances = [EC2Instance(**{**sample_instance_input, 'qty': qty}) for qty in (1, 4)]
+        batch_data = {('us-east-1', 't3.medium', 'RunInstances', 'Shared'): pricing_data}
+
+        batched = calculate_pricing_batch(instances, batch_data)
+        pricing_cache.clear()
+        for instance, (results, errors) in zip(instances, batched):
+            assert errors == []
+            assert results == calculate_pricing(EC2Instance(**instance.model_dump()), pricing_data)
@@ -4,8 +4,8 @@ import { Spinner } from "@/components/ui/spinner"
 import { cn } from "@/lib/utils"
 import { useTelemetry } from "@/hooks/useTelemetry"
 
-const ACCEPTED_EXTENSIONS = ["csv", "xls", "xlsx"]
-const ACCEPT_ATTRIBUTE = ".csv,.xls,.xlsx"
+const ACCEPTED_EXTENSIONS = ["csv", "xlsx"]
+const ACCEPT_ATTRIBUTE = ".csv,.xlsx"
 
 interface FileUploadProps {
   onFilesSelected: (files: File[]) => void
@@ -202,7 +202,7 @@ export function FileUpload({
             Drag and drop CSV or Excel files here
           </p>
           <p className="text-sm text-muted-foreground">
-            Supported formats: .csv, .xls, .xlsx · Max size {maxFileSizeMB} MB{" "}
+            Supported formats: .csv, .xlsx · Max size {maxFileSizeMB} MB{" "}
             {multiple ? "per file" : ""}
           </p>
         </div>
@@ -1,9 +1,10 @@
-import { useMutation, useQuery } from "@tanstack/react-query"
+import { useInfiniteQuery, useMutation, useQuery } from "@tanstack/react-query"
 import { api } from "@/lib/api"
 import { useToast } from "@/hooks/use-toast"
 import type {
   EC2InstanceInput,
   PricingDataFilters,
+  PricingDataOptions,
 } from "@/types/api"
 
 /**
@@ -46,13 +47,20 @@ export function usePriceInstances() {
 }
 
 /**
- * Hook to query pricing data with filters
+ * Hook to query pricing data with filters, one page at a time.
+ * fetchNextPage follows the next_cursor of the last page.
  */
-export function useQueryPricingData(filters: PricingDataFilters) {
-  return useQuery({
-    queryKey: ["pricing-data", filters],
-    queryFn: () => api.queryPricingData(filters),
-    enabled: Object.keys(filters).length > 0, // Only run if filters are provided
+export function useQueryPricingData(
+  filters: PricingDataFilters,
+  options: PricingDataOptions = {},
+  enabled = true
+) {
+  return useInfiniteQuery({
+    queryKey: ["pricing-data", filters, options],
+    queryFn: ({ pageParam }) => api.queryPricingData(filters, options, pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
+    enabled,
   })
 }
 
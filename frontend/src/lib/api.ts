@@ -1,7 +1,10 @@
 import type {
+  BulkPricingSummary,
   EC2InstanceInput,
   PricingResponse,
   PricingDataFilters,
+  PricingDataOptions,
+  PricingDataPage,
 } from "@/types/api"
 
 // Type for FastAPI validation errors
@@ -28,6 +31,39 @@ export class ApiError extends Error {
   }
 }
 
+// Build an ApiError from a non-2xx response
+async function apiErrorFromResponse(
+  response: Response,
+  method: string,
+  url: string
+): Promise<ApiError> {
+  let errorMessage = `HTTP ${response.status}: ${response.statusText}`
+  let errorDetails: unknown
+
+  try {
+    const errorData = await response.json()
+    console.error(`[API] Error response for ${method} ${url}:`, {
+      status: response.status,
+      statusText: response.statusText,
+      errorData,
+      headers: Object.fromEntries(response.headers.entries()),
+    })
+    if (Array.isArray(errorData.detail)) {
+      // FastAPI validation errors
+      errorMessage = errorData.detail.map((err: FastAPIValidationError) => `${err.loc.join('.')}: ${err.msg}`).join('; ')
+    } else {
+      errorMessage = errorData.detail || errorMessage
+    }
+    errorDetails = errorData
+  } catch (parseError) {
+    console.error(`[API] Failed to parse error response for ${method} ${url}:`, parseError)
+    // If JSON parsing fails, use the default error message
+  }
+
+  console.error(`[API] Throwing ApiError for ${method} ${url}:`, errorMessage)
+  return new ApiError(errorMessage, response.status, errorDetails)
+}
+
 // Generic fetch wrapper with error handling
 async function fetchAPI<T>(
   endpoint: string,
@@ -53,31 +89,7 @@ async function fetchAPI<T>(
     console.log(`[API] Response ${response.status} for ${method} ${url}`)
 
     if (!response.ok) {
-      let errorMessage = `HTTP ${response.status}: ${response.statusText}`
-      let errorDetails: unknown
-
-      try {
-        const errorData = await response.json()
-        console.error(`[API] Error response for ${method} ${url}:`, {
-          status: response.status,
-          statusText: response.statusText,
-          errorData,
-          headers: Object.fromEntries(response.headers.entries()),
-        })
-        if (Array.isArray(errorData.detail)) {
-          // FastAPI validation errors
-          errorMessage = errorData.detail.map((err: FastAPIValidationError) => `${err.loc.join('.')}: ${err.msg}`).join('; ')
-        } else {
-          errorMessage = errorData.detail || errorMessage
-        }
-        errorDetails = errorData
-      } catch (parseError) {
-        console.error(`[API] Failed to parse error response for ${method} ${url}:`, parseError)
-        // If JSON parsing fails, use the default error message
-      }
-
-      console.error(`[API] Throwing ApiError for ${method} ${url}:`, errorMessage)
-      throw new ApiError(errorMessage, response.status, errorDetails)
+      throw await apiErrorFromResponse(response, method, url)
     }
 
     const data = await response.json()
@@ -96,6 +108,65 @@ async function fetchAPI<T>(
   }
 }
 
+// POST to a streaming bulk pricing endpoint and collect its NDJSON results
+async function fetchPricingStream(
+  endpoint: string,
+  options: Pick<RequestInit, "headers" | "body">,
+  onProgress?: (priced: number) => void
+): Promise<PricingResponse[]> {
+  const url = `${API_BASE_URL}${endpoint}`
+  console.log(`[API] POST ${url}`)
+
+  let response: Response
+  try {
+    response = await fetch(url, { method: "POST", ...options })
+  } catch (error) {
+    console.error(`[API] Network/other error for POST ${url}:`, error)
+    throw new ApiError(
+      error instanceof Error ? error.message : "An unknown error occurred"
+    )
+  }
+
+  if (!response.ok || !response.body) {
+    throw await apiErrorFromResponse(response, "POST", url)
+  }
+
+  const results: PricingResponse[] = []
+  let summary: BulkPricingSummary | null = null
+  const handleLine = (line: string) => {
+    if (!line.trim()) return
+    const message = JSON.parse(line)
+    if ("summary" in message) {
+      summary = message.summary as BulkPricingSummary
+    } else {
+      results.push(message as PricingResponse)
+      onProgress?.(results.length)
+    }
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ""
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += value
+    const lines = buffer.split("\n")
+    buffer = lines.pop() ?? ""
+    lines.forEach(handleLine)
+  }
+  handleLine(buffer)
+
+  const finalSummary = summary as BulkPricingSummary | null
+  console.log(`[API] Streamed ${results.length} results for POST ${url}:`, finalSummary)
+  if (!finalSummary) {
+    throw new ApiError("Pricing stream ended unexpectedly", response.status)
+  }
+  if (finalSummary.error) {
+    throw new ApiError(finalSummary.error, response.status, finalSummary)
+  }
+  return results
+}
+
 // API client object with all endpoint methods
 export const api = {
   /**
@@ -126,16 +197,42 @@ export const api = {
   },
 
   /**
-   * Query pricing data with filters
-   * POST /query-pricing-data
+   * Upload a fleet CSV or XLSX file and receive results as they are priced.
+   * The file is parsed on the server.
+   * POST /price-instances/upload (NDJSON)
+   */
+  uploadFleetFile: async (
+    file: File,
+    onProgress?: (priced: number) => void
+  ): Promise<PricingResponse[]> => {
+    return fetchPricingStream("/price-instances/upload", {
+      headers: { "Content-Type": file.type || "application/octet-stream" },
+      body: file,
+    }, onProgress)
+  },
+
+  /**
+   * Query one page of pricing data with filters. Pass the previous page's
+   * next_cursor to read the following page; the filters and fields of the
+   * first request apply to every page.
+   * GET /query-pricing-data
    */
   queryPricingData: async (
-    filters: PricingDataFilters
-  ): Promise<unknown> => {
-    return fetchAPI<unknown>("/query-pricing-data", {
-      method: "POST",
-      body: JSON.stringify(filters),
-    })
+    filters: PricingDataFilters,
+    options: PricingDataOptions = {},
+    cursor?: string
+  ): Promise<PricingDataPage> => {
+    const params = new URLSearchParams()
+    if (cursor) {
+      params.set("cursor", cursor)
+    } else {
+      Object.entries(filters).forEach(([name, value]) => {
+        if (value) params.set(name, value)
+      })
+      if (options.fields?.length) params.set("fields", options.fields.join(","))
+    }
+    if (options.page_size) params.set("page_size", String(options.page_size))
+    return fetchAPI<PricingDataPage>(`/query-pricing-data?${params}`)
   },
 
   /**
@@ -1,30 +1,18 @@
+import { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { useMutation } from "@tanstack/react-query";
 import { FileUpload } from "@/components/bulk-upload/FileUpload";
 import { useDashboardStore } from "@/store/useDashboardStore";
 import { api, ApiError } from "@/lib/api";
-import Papa from "papaparse";
-
-// Types for CSV parsing
-interface CSVRow {
-  [key: string]: string | undefined;
-}
-
-interface ParsedInstance {
-  region_code: string;
-  instance_type: string;
-  operation: string;
-  operating_system: string;
-  product_tenancy: string;
-  qty: number;
-}
 
 const BulkUpload = () => {
   const navigate = useNavigate();
   const { setResults, setFileName, setLoading } = useDashboardStore();
+  const [pricedCount, setPricedCount] = useState<number | null>(null);
 
+  // The file is parsed on the server, which streams results back as rows are priced
   const mutation = useMutation({
-    mutationFn: api.priceInstances,
+    mutationFn: (file: File) => api.uploadFleetFile(file, setPricedCount),
     onSuccess: (data) => {
       setResults(data);
       navigate("/dashboard");
@@ -38,6 +26,7 @@ const BulkUpload = () => {
     },
     onSettled: () => {
       setLoading(false);
+      setPricedCount(null);
     },
   });
 
@@ -46,64 +35,7 @@ const BulkUpload = () => {
       setLoading(true);
       const file = files[0];
       setFileName(file.name);
-      Papa.parse(file, {
-        header: true,
-        skipEmptyLines: true,
-        complete: (results) => {
-          console.log("Parsed CSV data:", results.data);
-          const transformedData = (results.data as CSVRow[])
-            .filter((row) => {
-              // Check if it's DoiT format or standard format
-              const hasStandard = row.region_code || row.instance_type || row.operation || row.operating_system;
-              const hasDoiT = row['aws/region_code'] || row['aws/instance_type'] || row['Operation'] || row['aws/operating_system'];
-              return hasStandard || hasDoiT;
-            })
-            .map((row): ParsedInstance => {
-              let region_code, instance_type, operation, operating_system, product_tenancy, qty;
-
-              if (row['aws/region_code']) {
-                // DoiT format
-                region_code = row['aws/region_code'] || "";
-                instance_type = row['aws/instance_type'] || "";
-                operation = row['Operation'] || "";
-                operating_system = row['aws/operating_system'] || "";
-                product_tenancy = row['aws/product_tenancy'] || "Shared";
-                // Qty is the last column value
-                const values = Object.values(row);
-                qty = parseInt(values[values.length - 1] as string, 10) || 1;
-              } else {
-                // Standard format
-                region_code = row.region_code || "";
-                instance_type = row.instance_type || "";
-                operation = row.operation || "";
-                operating_system = row.operating_system || "";
-                product_tenancy = row.product_tenancy || "Shared";
-                qty = parseInt(row.qty || '1', 10) || 1;
-              }
-
-              return {
-                region_code,
-                instance_type,
-                operation,
-                operating_system,
-                product_tenancy,
-                qty,
-              };
-            })
-            .filter((item) => item.region_code && item.instance_type && item.operation && item.operating_system); // Only send valid rows
-          console.log("Transformed data:", transformedData);
-          if (transformedData.length === 0) {
-            setResults([], "No valid data found in the uploaded file. Please check the CSV format and ensure it has the required columns: region_code, instance_type, operation, operating_system");
-            navigate("/dashboard");
-            return;
-          }
-          mutation.mutate(transformedData);
-        },
-        error: (error) => {
-          console.error("PapaParse error:", error);
-          setLoading(false);
-        },
-      });
+      mutation.mutate(file);
     }
   };
 
@@ -116,7 +48,9 @@ const BulkUpload = () => {
           disabled={mutation.isPending}
           statusMessage={
             mutation.isPending
-              ? "Pricing instances, please wait..."
+              ? pricedCount
+                ? `Priced ${pricedCount} instances...`
+                : "Pricing instances, please wait..."
               : undefined
           }
         />
@@ -125,4 +59,4 @@ const BulkUpload = () => {
   );
 };
 
-export default BulkUpload;
\ No newline at end of file
+export default BulkUpload;
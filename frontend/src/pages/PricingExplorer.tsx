@@ -1,4 +1,100 @@
+import { useState } from "react"
+import { useQueryPricingData } from "@/hooks/useAPI"
+import type { PricingDataFilters } from "@/types/api"
+import { Button } from "@/components/ui/button"
+import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
+import { Checkbox } from "@/components/ui/checkbox"
+import { Input } from "@/components/ui/input"
+import { Label } from "@/components/ui/label"
+import {
+  Select,
+  SelectContent,
+  SelectItem,
+  SelectTrigger,
+  SelectValue,
+} from "@/components/ui/select"
+import {
+  Table,
+  TableBody,
+  TableCell,
+  TableHead,
+  TableHeader,
+  TableRow,
+} from "@/components/ui/table"
+
+// Fields served by GET /query-pricing-data for each table
+const GLOBAL_PRICING_FIELDS = [
+  "region_code",
+  "instance_type",
+  "operation",
+  "operating_system",
+  "tenancy",
+  "term_type",
+  "purchase_option",
+  "term_length",
+  "offering_class",
+  "price_per_unit",
+  "unit",
+  "currency",
+]
+const SAVINGS_PLAN_FIELDS = [
+  "region_code",
+  "instance_type",
+  "operation",
+  "product_family",
+  "purchase_option",
+  "term_years",
+  "hourly_rate",
+  "currency",
+  "unit",
+]
+
+const PAGE_SIZE = 100
+// Radix Select items can't have an empty value
+const ANY = "any"
+
+function isSavingsPlan(savingsType?: string) {
+  return savingsType === "Compute Savings Plan" || savingsType === "EC2 Savings Plan"
+}
+
 export function PricingExplorer() {
+  const [draft, setDraft] = useState<PricingDataFilters>({})
+  const [selectedFields, setSelectedFields] = useState<string[]>([])
+  // The query only runs once filters are submitted
+  const [submitted, setSubmitted] = useState<{ filters: PricingDataFilters; fields: string[] } | null>(null)
+
+  const availableFields = isSavingsPlan(draft.savings_type) ? SAVINGS_PLAN_FIELDS : GLOBAL_PRICING_FIELDS
+  const query = useQueryPricingData(
+    submitted?.filters ?? {},
+    { fields: submitted?.fields, page_size: PAGE_SIZE },
+    submitted !== null
+  )
+
+  const rows = query.data?.pages.flatMap((page) => page.results) ?? []
+  const totalRows = query.data?.pages[0]?.total_rows
+  const columns = submitted?.fields.length ? submitted.fields : Object.keys(rows[0] ?? {})
+
+  const setFilter = (name: keyof PricingDataFilters, value: string) => {
+    setDraft((current) => ({ ...current, [name]: value === ANY ? undefined : value }))
+  }
+
+  const handleSavingsTypeChange = (value: string) => {
+    setFilter("savings_type", value)
+    // Savings plan tables expose different fields
+    setSelectedFields([])
+  }
+
+  const toggleField = (field: string, checked: boolean) => {
+    setSelectedFields((current) =>
+      checked ? [...current, field] : current.filter((name) => name !== field)
+    )
+  }
+
+  const handleSearch = () => {
+    // Keep the table's column order rather than the order fields were ticked
+    setSubmitted({ filters: draft, fields: availableFields.filter((field) => selectedFields.includes(field)) })
+  }
+
   return (
     <div className="space-y-6">
       <div>
@@ -8,11 +104,162 @@ export function PricingExplorer() {
         </p>
       </div>
 
-      <div className="rounded-lg border bg-card p-6">
-        <p className="text-muted-foreground">
-          Pricing database explorer will be implemented here.
-        </p>
-      </div>
+      <Card>
+        <CardHeader>
+          <CardTitle>Filters</CardTitle>
+        </CardHeader>
+        <CardContent className="space-y-4">
+          <div className="grid gap-4 md:grid-cols-3">
+            <div className="space-y-2">
+              <Label htmlFor="explorer-region">Region</Label>
+              <Input
+                id="explorer-region"
+                placeholder="e.g., us-east-1"
+                value={draft.region ?? ""}
+                onChange={(event) => setFilter("region", event.target.value)}
+              />
+            </div>
+            <div className="space-y-2">
+              <Label htmlFor="explorer-instance-type">Instance Type</Label>
+              <Input
+                id="explorer-instance-type"
+                placeholder="e.g., m5.large"
+                value={draft.instance_type ?? ""}
+                onChange={(event) => setFilter("instance_type", event.target.value)}
+              />
+            </div>
+            <div className="space-y-2">
+              <Label htmlFor="explorer-instance-family">Instance Family</Label>
+              <Input
+                id="explorer-instance-family"
+                placeholder="e.g., m5"
+                value={draft.instance_family ?? ""}
+                onChange={(event) => setFilter("instance_family", event.target.value)}
+              />
+            </div>
+            <div className="space-y-2">
+              <Label htmlFor="explorer-os">Operating System</Label>
+              <Select value={draft.os ?? ANY} onValueChange={(value) => setFilter("os", value)}>
+                <SelectTrigger id="explorer-os">
+                  <SelectValue placeholder="Any" />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value={ANY}>Any</SelectItem>
+                  <SelectItem value="Linux">Linux</SelectItem>
+                  <SelectItem value="Windows">Windows</SelectItem>
+                  <SelectItem value="RHEL">RHEL</SelectItem>
+                  <SelectItem value="SUSE">SUSE</SelectItem>
+                </SelectContent>
+              </Select>
+            </div>
+            <div className="space-y-2">
+              <Label htmlFor="explorer-savings-type">Pricing Type</Label>
+              <Select value={draft.savings_type ?? ANY} onValueChange={handleSavingsTypeChange}>
+                <SelectTrigger id="explorer-savings-type">
+                  <SelectValue placeholder="On-Demand and Reserved" />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value={ANY}>On-Demand and Reserved</SelectItem>
+                  <SelectItem value="Reserved Instance">Standard Reserved Instance</SelectItem>
+                  <SelectItem value="Compute Savings Plan">Compute Savings Plan</SelectItem>
+                  <SelectItem value="EC2 Savings Plan">EC2 Savings Plan</SelectItem>
+                </SelectContent>
+              </Select>
+            </div>
+            <div className="space-y-2">
+              <Label htmlFor="explorer-term">Term</Label>
+              <Select value={draft.term ?? ANY} onValueChange={(value) => setFilter("term", value)}>
+                <SelectTrigger id="explorer-term">
+                  <SelectValue placeholder="Any" />
+                </SelectTrigger>
+                <SelectContent>
+                  <SelectItem value={ANY}>Any</SelectItem>
+                  {isSavingsPlan(draft.savings_type) ? (
+                    <>
+                      <SelectItem value="1 year">1 Year</SelectItem>
+                      <SelectItem value="3 year">3 Years</SelectItem>
+                    </>
+                  ) : (
+                    <>
+                      <SelectItem value="OnDemand">On-Demand</SelectItem>
+                      <SelectItem value="Reserved">Reserved</SelectItem>
+                    </>
+                  )}
+                </SelectContent>
+              </Select>
+            </div>
+          </div>
+
+          <div className="space-y-2">
+            <Label>Fields (none selected returns every field)</Label>
+            <div className="flex flex-wrap gap-4">
+              {availableFields.map((field) => (
+                <div key={field} className="flex items-center space-x-2">
+                  <Checkbox
+                    id={`explorer-field-${field}`}
+                    checked={selectedFields.includes(field)}
+                    onCheckedChange={(checked) => toggleField(field, checked as boolean)}
+                  />
+                  <Label htmlFor={`explorer-field-${field}`}>{field}</Label>
+                </div>
+              ))}
+            </div>
+          </div>
+
+          <Button onClick={handleSearch} disabled={query.isFetching && !query.isFetchingNextPage}>
+            Search
+          </Button>
+        </CardContent>
+      </Card>
+
+      {query.isError && (
+        <div className="rounded-lg border border-destructive p-4 text-destructive">
+          {query.error instanceof Error ? query.error.message : "Failed to query pricing data"}
+        </div>
+      )}
+
+      {submitted && query.isSuccess && (
+        <Card>
+          <CardHeader>
+            <CardTitle>
+              {totalRows != null ? `Showing ${rows.length} of ${totalRows} rows` : `Showing ${rows.length} rows`}
+            </CardTitle>
+          </CardHeader>
+          <CardContent className="space-y-4">
+            {rows.length === 0 ? (
+              <p className="text-muted-foreground">No pricing rows match these filters.</p>
+            ) : (
+              <Table>
+                <TableHeader>
+                  <TableRow>
+                    {columns.map((column) => (
+                      <TableHead key={column}>{column}</TableHead>
+                    ))}
+                  </TableRow>
+                </TableHeader>
+                <TableBody>
+                  {rows.map((row, index) => (
+                    <TableRow key={index}>
+                      {columns.map((column) => (
+                        <TableCell key={column}>{String(row[column] ?? "")}</TableCell>
+                      ))}
+                    </TableRow>
+                  ))}
+                </TableBody>
+              </Table>
+            )}
+            {query.hasNextPage && (
+              <Button
+                variant="outline"
+                onClick={() => query.fetchNextPage()}
+                disabled={query.isFetchingNextPage}
+              >
+                {query.isFetchingNextPage ? "Loading..." : "Load more"}
+              </Button>
+            )}
+          </CardContent>
+        </Card>
+      )}
     </div>
   )
-}
\ No newline at end of file
+}
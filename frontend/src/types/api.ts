@@ -78,16 +78,40 @@ export interface PricingResponse {
   errors: string[]
 }
 
+// Final line of a streamed bulk pricing response
+export interface BulkPricingSummary {
+  count: number
+  unique_instances: number
+  dedup_ratio: number
+  instances_with_errors: number
+  error: string | null
+}
+
 // Query filters for pricing explorer
 export interface PricingDataFilters {
   region?: string
-  os_type?: string
+  os?: string
   instance_type?: string
   instance_family?: string
   term?: string
   savings_type?: string
 }
 
+// Columns to return and page size for a pricing explorer query
+export interface PricingDataOptions {
+  fields?: string[]
+  page_size?: number
+}
+
+// One page of GET /query-pricing-data results
+export interface PricingDataPage {
+  results: Record<string, unknown>[]
+  count: number
+  total_rows: number | null
+  next_cursor: string | null
+  page_size: number
+}
+
 // Generic API error response
 export interface APIError {
   detail: string
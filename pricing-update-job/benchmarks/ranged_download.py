@@ -0,0 +1,183 @@
+"""
+Benchmark downloading a pricing file over one connection against a split
+download over several byte ranges.
+
+Usage (from pricing-update-job/):
+    uv run python benchmarks/ranged_download.py [size_mib] [per_connection_mib_s] [connections]
+
+A local HTTP server stands in for pricing.us-east-1.amazonaws.com. It
+supports Range and If-Range and caps every connection at
+per_connection_mib_s, like a single TCP stream from the real endpoint.
+GCS is replaced by an in-memory bucket that implements the resumable upload
+protocol and compose, so only the transfer is measured.
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("GCP_PROJECT", "benchmark")
+os.environ.setdefault("GCS_BUCKET_NAME", "benchmark")
+
+# Importing main creates BigQuery and GCS clients, which need credentials
+with patch("google.cloud.bigquery.Client", return_value=MagicMock()), \
+     patch("google.cloud.storage.Client", return_value=MagicMock()):
+    import main
+
+from google.api_core.exceptions import NotFound
+
+real_put = requests.put
+
+
+def make_handler(body: bytes, etag: str, bytes_per_second: float):
+    class PricingFileHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end, status = 0, len(body) - 1, 200
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if_range = self.headers.get("If-Range")
+            if match and (if_range is None or if_range == etag):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else end
+                status = 206
+
+            self.send_response(status)
+            self.send_header("ETag", etag)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            self.end_headers()
+
+            # Throttle each connection to bytes_per_second
+            piece = 256 * 1024
+            started = time.perf_counter()
+            sent = 0
+            try:
+                for offset in range(start, end + 1, piece):
+                    data = body[offset:min(offset + piece, end + 1)]
+                    self.wfile.write(data)
+                    sent += len(data)
+                    delay = sent / bytes_per_second - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+            except (BrokenPipeError, ConnectionResetError):
+                # The first part of a split download stops reading early
+                pass
+
+    return PricingFileHandler
+
+
+class MemoryBlob:
+    def __init__(self, bucket: "MemoryBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+        self.content_type = None
+
+    def exists(self) -> bool:
+        return self.name in self.bucket.objects
+
+    def reload(self) -> None:
+        self.size = len(self.bucket.objects[self.name])
+
+    def download_as_bytes(self) -> bytes:
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        return self.bucket.objects[self.name]
+
+    def upload_from_string(self, data, content_type=None) -> None:
+        self.bucket.objects[self.name] = data.encode() if isinstance(data, str) else data
+
+    def delete(self) -> None:
+        if self.bucket.objects.pop(self.name, None) is None:
+            raise NotFound(self.name)
+
+    def create_resumable_upload_session(self, content_type=None) -> str:
+        session_url = f"memory://{self.name}"
+        self.bucket.sessions[session_url] = (self.name, bytearray())
+        return session_url
+
+    def compose(self, sources) -> None:
+        self.bucket.objects[self.name] = b"".join(self.bucket.objects[source.name] for source in sources)
+
+
+class MemoryBucket:
+    name = "benchmark"
+
+    def __init__(self):
+        self.objects = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def blob(self, name: str) -> MemoryBlob:
+        return MemoryBlob(self, name)
+
+    def put(self, url, data=None, headers=None, timeout=None):
+        """GCS resumable upload protocol for memory:// session URLs"""
+        if not url.startswith("memory://"):
+            return real_put(url, data=data, headers=headers, timeout=timeout)
+        name, received = self.sessions[url]
+        response = requests.Response()
+        match = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", headers["Content-Range"])
+        if match:
+            assert int(match.group(1)) == len(received)
+            received.extend(data)
+        total = headers["Content-Range"].rsplit("/", 1)[1]
+        if total != "*":
+            with self.lock:
+                self.objects[name] = bytes(received)
+            response.status_code = 200
+        else:
+            response.status_code = 308
+            if received:
+                response.headers["Range"] = f"bytes=0-{len(received) - 1}"
+        return response
+
+
+def run(size_mib: int, per_connection_mib_s: float, connections: int) -> None:
+    body = os.urandom(size_mib * 1024 * 1024)
+    digest = hashlib.sha256(body).hexdigest()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(body, '"benchmark"', per_connection_mib_s * 1024 * 1024))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/ec2_global_pricing.csv"
+    print(f"Downloading {size_mib} MiB at {per_connection_mib_s} MiB/s per connection")
+
+    for label, connection_count in (("single", 1), (f"{connections} ranges", connections)):
+        bucket = MemoryBucket()
+        with patch.object(main, "get_bucket", return_value=bucket), \
+             patch.object(main, "DOWNLOAD_CONNECTIONS", connection_count), \
+             patch.object(main, "DOWNLOAD_SPLIT_MIN_SIZE", 1), \
+             patch.object(main, "UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024), \
+             patch.object(main.requests, "put", bucket.put), \
+             patch("builtins.print"):
+            started = time.perf_counter()
+            _, size, _ = main.download_file(url, "ec2_global_pricing.csv")
+            seconds = time.perf_counter() - started
+
+        stored = bucket.objects["ec2_global_pricing.csv"]
+        assert size == len(body) and hashlib.sha256(stored).hexdigest() == digest, "downloaded file differs"
+        leftovers = sorted(name for name in bucket.objects if name != "ec2_global_pricing.csv")
+        assert not leftovers, f"parts or checkpoints left behind: {leftovers}"
+        print(f"{label:<12} {seconds:7.2f} s  {size_mib / seconds:8.1f} MiB/s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    size_mib = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    per_connection_mib_s = float(sys.argv[2]) if len(sys.argv) > 2 else 16
+    connections = int(sys.argv[3]) if len(sys.argv) > 3 else main.DOWNLOAD_CONNECTIONS
+    run(size_mib, per_connection_mib_s, connections)
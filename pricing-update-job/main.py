@@ -2,9 +2,12 @@ import datetime
 import os
 import csv
 import io
+import json
 import re
 import sys
-from typing import Iterable, List, Tuple, Optional
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
@@ -18,6 +21,54 @@ BQ_DATASET = os.environ.get("BIGQUERY_DATASET", "price_ingestion")
 BQ_TABLE = os.environ.get("BIGQUERY_TABLE", "processed_versions")
 BQ_FILES_TABLE = os.environ.get("BIGQUERY_FILES_TABLE", "downloaded_files")
 DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", "3"))
+# Files loaded into BigQuery at once; each load starts as soon as its download
+# finishes. Workers mostly wait on jobs, which BIGQUERY_MAX_IN_FLIGHT_JOBS bounds.
+LOAD_CONCURRENCY = int(os.environ.get("LOAD_CONCURRENCY", "16"))
+BIGQUERY_MAX_IN_FLIGHT_JOBS = int(os.environ.get("BIGQUERY_MAX_IN_FLIGHT_JOBS", "8"))
+BIGQUERY_POLL_SECONDS = float(os.environ.get("BIGQUERY_POLL_SECONDS", "2"))
+
+# --- Table Layout ---
+# Clustering columns (comma-separated, at most 4) for the loaded pricing tables,
+# matching the columns the API filters on. Set to an empty string to disable.
+GLOBAL_PRICING_CLUSTERING_FIELDS = os.environ.get(
+    "GLOBAL_PRICING_CLUSTERING_FIELDS", "region_code,instance_type,operation,tenancy"
+)
+SAVINGS_PLAN_CLUSTERING_FIELDS = os.environ.get(
+    "SAVINGS_PLAN_CLUSTERING_FIELDS",
+    "discountedregioncode,discountedinstancetype,discountedoperation,product_family",
+)
+# Optional time partitioning column for each table; it must be a DATE or
+# TIMESTAMP column in the load schema
+GLOBAL_PRICING_PARTITION_FIELD = os.environ.get("GLOBAL_PRICING_PARTITION_FIELD", "")
+SAVINGS_PLAN_PARTITION_FIELD = os.environ.get("SAVINGS_PLAN_PARTITION_FIELD", "")
+PRICING_TABLE_PARTITION_TYPE = os.environ.get("PRICING_TABLE_PARTITION_TYPE", "DAY")
+MAX_CLUSTERING_FIELDS = 4
+
+# --- Typed Schema ---
+# CSVs are loaded into an all-STRING staging table, then copied into the final
+# table with the column types below and only the allowlisted columns.
+TYPED_PRICING_TABLES = os.environ.get("TYPED_PRICING_TABLES", "true").lower() == "true"
+# Comma-separated columns to keep; "*" keeps every column
+GLOBAL_PRICING_COLUMNS = os.environ.get(
+    "GLOBAL_PRICING_COLUMNS",
+    "sku,effectivedate,termtype,pricedescription,unit,priceperunit,currency,leasecontractlength,"
+    "purchaseoption,offeringclass,instance_type,instance_family,vcpu,memory,region_code,"
+    "operating_system,tenancy,usagetype,operation",
+)
+SAVINGS_PLAN_COLUMNS = os.environ.get(
+    "SAVINGS_PLAN_COLUMNS",
+    "sku,effectivedate,discountedrate,currency,unit,discountedusagetype,discountedoperation,"
+    "purchaseoption,leasecontractlength,leasecontractlengthunit,usagetype,product_family,"
+    "discountedregioncode,discountedinstancetype",
+)
+# Columns not listed here stay STRING. LEASE_YEARS turns "1yr", "3yr", "1" and "3" into INT64 years.
+PRICING_COLUMN_TYPES = {
+    "priceperunit": "FLOAT64",
+    "discountedrate": "FLOAT64",
+    "vcpu": "INT64",
+    "leasecontractlength": "LEASE_YEARS",
+    "effectivedate": "DATE",
+}
 
 # --- AWS Pricing URLs ---
 BASE_URL = "https://pricing.us-east-1.amazonaws.com"
@@ -25,6 +76,17 @@ SERVICE_INDEX_URL = f"{BASE_URL}/offers/v1.0/aws/index.json"
 
 REQUEST_TIMEOUT_SECONDS = int(os.environ.get("REQUEST_TIMEOUT_SECONDS", "120"))
 DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+# Downloads are streamed into GCS resumable upload sessions. Each chunk is one
+# PUT and one checkpoint write; GCS requires a multiple of 256 KiB.
+UPLOAD_CHUNK_SIZE = max(1, int(os.environ.get("UPLOAD_CHUNK_SIZE_MIB", "16"))) * 1024 * 1024
+# Bucket prefix for the upload session and offset of each unfinished download
+DOWNLOAD_CHECKPOINT_PREFIX = os.environ.get("DOWNLOAD_CHECKPOINT_PREFIX", "download_checkpoints/")
+# Files of at least DOWNLOAD_SPLIT_MIN_SIZE_MIB are fetched as up to
+# DOWNLOAD_CONNECTIONS byte ranges in parallel, each uploaded as its own part
+# object, then composed into the final object. 1 disables splitting.
+DOWNLOAD_CONNECTIONS = max(1, int(os.environ.get("DOWNLOAD_CONNECTIONS", "8")))
+DOWNLOAD_SPLIT_MIN_SIZE = int(os.environ.get("DOWNLOAD_SPLIT_MIN_SIZE_MIB", "256")) * 1024 * 1024
+MAX_COMPOSE_SOURCES = 32
 
 DEFAULT_AWS_REGIONS = [
     "us-east-1",
@@ -60,6 +122,28 @@ if not PROJECT_ID:
         "GCP_PROJECT (or GOOGLE_CLOUD_PROJECT) environment variable is required."
     )
 
+# --- Pricing matrix ---
+# One row per (region_code, instance_type, operation, tenancy) holding every
+# hourly rate and upfront fee the API prices from, built after each load.
+PRICING_MATRIX_VIEW = "ec2_pricing_matrix_latest"
+PRICING_MATRIX_TERMS = (1, 3)
+PRICING_MATRIX_PURCHASE_OPTIONS = {
+    "No Upfront": "no_upfront",
+    "Partial Upfront": "partial_upfront",
+    "All Upfront": "all_upfront",
+}
+PRICING_MATRIX_SAVINGS_PLANS = {
+    "compute_savings_plan": "ComputeSavingsPlans",
+    "ec2_savings_plan": "EC2InstanceSavingsPlans",
+}
+
+# --- All-region savings plans ---
+# Every region's savings plan rows in one table, rebuilt from the per-region
+# views after each load and clustered on SAVINGS_PLAN_CLUSTERING_FIELDS
+# (region first by default), so multi-region lookups are a single scan.
+SAVINGS_PLAN_ALL_REGIONS_TABLE_PREFIX = "ec2_savings_plan_pricing"
+SAVINGS_PLAN_ALL_REGIONS_VIEW = f"{SAVINGS_PLAN_ALL_REGIONS_TABLE_PREFIX}_latest"
+
 HEADER_ROWS_TO_SKIP = 6
 HEADER_ROW_INDEX = HEADER_ROWS_TO_SKIP - 1
 
@@ -97,6 +181,67 @@ def format_version(version_id: str) -> str:
     return version_id
 
 
+class BigQueryJobTracker:
+    """
+    Runs BigQuery jobs with at most max_in_flight of them running at once.
+    Each job is polled with non-blocking done() checks, so jobs started from
+    several worker threads run side by side in BigQuery. The duration and
+    bytes of every job are kept for report().
+    """
+
+    def __init__(self, max_in_flight: int, poll_seconds: float):
+        self.slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self.poll_seconds = poll_seconds
+        self.records: List[dict] = []
+        self.lock = threading.Lock()
+
+    def run(self, label: str, start_job: Callable[[], Any]) -> Any:
+        """Starts a job, polls it until it finishes and returns it. Raises if the job failed."""
+        with self.slots:
+            started = time.monotonic()
+            job = start_job()
+            while not job.done(retry=bigquery_retry):
+                time.sleep(self.poll_seconds)
+            seconds = time.monotonic() - started
+
+        # Load jobs report the bytes written, query jobs the bytes scanned
+        job_bytes = job.output_bytes if job.job_type == "load" else job.total_bytes_processed
+        record = {
+            "label": label,
+            "job_id": job.job_id,
+            "status": "failed" if job.error_result else "succeeded",
+            "seconds": seconds,
+            "bytes": job_bytes or 0,
+        }
+        with self.lock:
+            self.records.append(record)
+        print(
+            f"BigQuery job {job.job_id} ({label}) {record['status']} in {seconds:.1f}s, "
+            f"{record['bytes'] / (1024 * 1024):.2f} MiB"
+        )
+        if job.error_result:
+            raise RuntimeError(f"BigQuery job {job.job_id} ({label}) failed: {job.error_result.get('message')}")
+        return job
+
+    def report(self) -> None:
+        with self.lock:
+            records = list(self.records)
+        if not records:
+            return
+        print(f"BigQuery jobs: {len(records)}")
+        for record in sorted(records, key=lambda record: -record["seconds"]):
+            print(
+                f"  {record['label']:<60} {record['status']:<9} {record['seconds']:8.1f}s "
+                f"{record['bytes'] / (1024 * 1024):10.2f} MiB"
+            )
+        total_bytes = sum(record["bytes"] for record in records)
+        total_seconds = sum(record["seconds"] for record in records)
+        print(f"  Total: {total_bytes / (1024 * 1024):.2f} MiB in {total_seconds:.1f} job-seconds")
+
+
+bigquery_jobs = BigQueryJobTracker(BIGQUERY_MAX_IN_FLIGHT_JOBS, BIGQUERY_POLL_SECONDS)
+
+
 def get_table_id(table_name: str) -> str:
     return f"{PROJECT_ID}.{BQ_DATASET}.{table_name}"
 
@@ -145,29 +290,35 @@ def delete_table(table_name: str, bigquery_client) -> None:
         print(f"Error deleting table {table_id}: {e}")
 
 
-def is_file_downloaded(gcs_filename: str) -> bool:
+FILES_TABLE_SCHEMA = [
+    bigquery.SchemaField("gcs_filename", "STRING"),
+    bigquery.SchemaField("url", "STRING"),
+    bigquery.SchemaField("status", "STRING"),
+    bigquery.SchemaField("download_timestamp", "STRING"),
+    bigquery.SchemaField("size_bytes", "INTEGER"),
+    bigquery.SchemaField("etag", "STRING"),
+    bigquery.SchemaField("last_modified", "STRING"),
+]
+
+
+def ensure_files_table() -> None:
     """
-    Checks if a file has already been successfully downloaded.
+    Creates the downloaded files table, or adds the columns an older table is missing.
     """
-    print(f"Checking BigQuery for downloaded file: {gcs_filename}")
-    query = (
-        "SELECT 1 FROM `{table_id}` WHERE gcs_filename = @gcs_filename AND status = 'success' LIMIT 1"
-    ).format(table_id=get_table_id(BQ_FILES_TABLE))
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[
-            bigquery.ScalarQueryParameter("gcs_filename", "STRING", gcs_filename),
-        ]
-    )
-
+    table_id = get_table_id(BQ_FILES_TABLE)
     try:
-        query_job = bigquery_client.query(query, job_config=job_config)
-        return any(query_job)
+        table = bigquery_client.get_table(table_id)
     except NotFound:
-        print(f"BigQuery table {get_table_id(BQ_FILES_TABLE)} not found; assuming file not downloaded.")
-        return False
-    except Exception as e:
-        print(f"Error checking BigQuery for file {gcs_filename}: {e}. Proceeding with download.")
-        return False
+        bigquery_client.create_table(bigquery.Table(table_id, schema=FILES_TABLE_SCHEMA))
+        print(f"Created BigQuery table {table_id}")
+        return
+
+    existing_columns = {field.name for field in table.schema}
+    missing = [field for field in FILES_TABLE_SCHEMA if field.name not in existing_columns]
+    if missing:
+        table.schema = list(table.schema) + missing
+        bigquery_client.update_table(table, ["schema"])
+        print(f"Added columns {[field.name for field in missing]} to {table_id}")
 
 
 def is_version_processed(version_id):
@@ -228,53 +379,113 @@ def log_version_processed(version_id):
         raise RuntimeError(f"Failed to log version {version_id}: {errors}")
 
 
-def log_file_downloaded(gcs_filename: str, url: str, size_bytes: int):
+class DownloadManifest:
     """
-    Logs a successful file download to BigQuery.
+    In-memory view of the downloaded files table. Successful downloads are
+    read with one query when the job starts, lookups are answered from
+    memory, and new downloads are written with one batched insert.
     """
-    print(f"Logging file download to BigQuery: {gcs_filename}")
-    table_id = get_table_id(BQ_FILES_TABLE)
-    timestamp = (
-        datetime.datetime.now(datetime.timezone.utc)
-        .isoformat()
-        .replace("+00:00", "Z")
-    )
-    rows = [
-        {
-            "gcs_filename": gcs_filename,
-            "url": url,
-            "status": "success",
-            "download_timestamp": timestamp,
-            "size_bytes": size_bytes,
-        }
-    ]
 
-    try:
-        errors = bigquery_client.insert_rows_json(table_id, rows)
-        if errors:
-            print(f"Failed to log file download {gcs_filename}: {errors}")
-        else:
-            print(f"Successfully logged file download: {gcs_filename}")
-    except NotFound:
-        # Create the table if it doesn't exist
-        schema = [
-            bigquery.SchemaField("gcs_filename", "STRING"),
-            bigquery.SchemaField("url", "STRING"),
-            bigquery.SchemaField("status", "STRING"),
-            bigquery.SchemaField("download_timestamp", "STRING"),
-            bigquery.SchemaField("size_bytes", "INTEGER"),
-        ]
-        table = bigquery.Table(table_id, schema=schema)
-        bigquery_client.create_table(table)
-        print(f"Created BigQuery table {table_id}")
-        # Retry insert
-        errors = bigquery_client.insert_rows_json(table_id, rows)
-        if errors:
-            print(f"Failed to log file download {gcs_filename}: {errors}")
-        else:
-            print(f"Successfully logged file download: {gcs_filename}")
-    except Exception as e:
-        print(f"Error logging file download {gcs_filename}: {e}")
+    def __init__(self):
+        self.downloaded_files = set()
+        self.url_validators: Dict[str, Dict[str, str]] = {}
+        self.url_sizes: Dict[str, int] = {}
+        self.pending_rows: List[dict] = []
+        self.lock = threading.Lock()
+
+    def load(self) -> None:
+        table_id = get_table_id(BQ_FILES_TABLE)
+        print(f"Loading download manifest from {table_id}")
+        with self.lock:
+            self.downloaded_files = set()
+            self.url_validators = {}
+            self.url_sizes = {}
+        query = (
+            "SELECT gcs_filename, url, size_bytes, etag, last_modified FROM `{table_id}` "
+            "WHERE status = 'success' ORDER BY download_timestamp"
+        ).format(table_id=table_id)
+
+        try:
+            rows = list(bigquery_client.query(query))
+        except NotFound:
+            print(f"BigQuery table {table_id} not found; assuming no files downloaded.")
+            return
+        except Exception as e:
+            print(f"Error loading download manifest: {e}. Proceeding with downloads.")
+            return
+
+        for row in rows:
+            self.downloaded_files.add(row["gcs_filename"])
+            validators = pick_validators(row)
+            if row["url"] and validators:
+                # Rows are in download order, so the latest validators win
+                self.url_validators[row["url"]] = validators
+            if row["url"] and row.get("size_bytes"):
+                self.url_sizes[row["url"]] = row["size_bytes"]
+        print(f"Download manifest has {len(self.downloaded_files)} files")
+
+    def is_downloaded(self, gcs_filename: str) -> bool:
+        with self.lock:
+            return gcs_filename in self.downloaded_files
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """ETag and Last-Modified of the last successful download of a URL."""
+        with self.lock:
+            return dict(self.url_validators.get(url, {}))
+
+    def size(self, url: str) -> Optional[int]:
+        """Size of the last successful download of a URL."""
+        with self.lock:
+            return self.url_sizes.get(url)
+
+    def record(self, gcs_filename: str, url: str, size_bytes: int, validators: Optional[Dict[str, str]] = None) -> None:
+        """Records a successful download; it is written to BigQuery by flush()."""
+        timestamp = (
+            datetime.datetime.now(datetime.timezone.utc)
+            .isoformat()
+            .replace("+00:00", "Z")
+        )
+        validators = validators or {}
+        with self.lock:
+            self.pending_rows.append(
+                {
+                    "gcs_filename": gcs_filename,
+                    "url": url,
+                    "status": "success",
+                    "download_timestamp": timestamp,
+                    "size_bytes": size_bytes,
+                    "etag": validators.get("etag"),
+                    "last_modified": validators.get("last_modified"),
+                }
+            )
+            self.downloaded_files.add(gcs_filename)
+            self.url_sizes[url] = size_bytes
+            if validators:
+                self.url_validators[url] = validators
+
+    def flush(self) -> None:
+        """Writes the recorded downloads to BigQuery in one insert."""
+        with self.lock:
+            rows, self.pending_rows = self.pending_rows, []
+        if not rows:
+            return
+
+        table_id = get_table_id(BQ_FILES_TABLE)
+        print(f"Logging {len(rows)} file downloads to {table_id}")
+        try:
+            try:
+                errors = bigquery_client.insert_rows_json(table_id, rows)
+            except NotFound:
+                ensure_files_table()
+                # Retry insert
+                errors = bigquery_client.insert_rows_json(table_id, rows)
+            if errors:
+                print(f"Failed to log file downloads: {errors}")
+        except Exception as e:
+            print(f"Error logging file downloads: {e}")
+
+
+download_manifest = DownloadManifest()
 
 
 def parse_line_limit(value: Optional[object]) -> Optional[int]:
@@ -362,29 +573,139 @@ def parse_resource_names(gcs_filename: str) -> Tuple[str, str]:
     raise ValueError(f"Unsupported filename format: {gcs_filename}")
 
 
+def is_savings_plan_table(table_name: str) -> bool:
+    return table_name.startswith(("savings_plan_", SAVINGS_PLAN_ALL_REGIONS_TABLE_PREFIX))
+
+
+def get_table_layout(
+    table_name: str, schema: List[bigquery.SchemaField]
+) -> Tuple[Optional[List[str]], Optional[bigquery.TimePartitioning]]:
+    """
+    Clustering columns and time partitioning for a pricing table. Columns
+    missing from the schema, and partition columns that are not DATE or
+    TIMESTAMP, are skipped with a warning.
+    """
+    if is_savings_plan_table(table_name):
+        clustering_spec, partition_field = SAVINGS_PLAN_CLUSTERING_FIELDS, SAVINGS_PLAN_PARTITION_FIELD
+    else:
+        clustering_spec, partition_field = GLOBAL_PRICING_CLUSTERING_FIELDS, GLOBAL_PRICING_PARTITION_FIELD
+
+    field_types = {field.name: field.field_type for field in schema}
+
+    clustering_fields = []
+    for name in (name.strip() for name in clustering_spec.split(",")):
+        if not name:
+            continue
+        if name not in field_types:
+            print(f"WARNING: Clustering column {name} not found in {table_name}; skipping it.")
+            continue
+        clustering_fields.append(name)
+    if len(clustering_fields) > MAX_CLUSTERING_FIELDS:
+        print(f"WARNING: BigQuery allows {MAX_CLUSTERING_FIELDS} clustering columns; ignoring {clustering_fields[MAX_CLUSTERING_FIELDS:]}")
+        clustering_fields = clustering_fields[:MAX_CLUSTERING_FIELDS]
+
+    time_partitioning = None
+    partition_field = partition_field.strip()
+    if partition_field:
+        if field_types.get(partition_field) in ("DATE", "TIMESTAMP", "DATETIME"):
+            time_partitioning = bigquery.TimePartitioning(type_=PRICING_TABLE_PARTITION_TYPE, field=partition_field)
+        else:
+            print(f"WARNING: Partition column {partition_field} is not a DATE or TIMESTAMP column in {table_name}; skipping partitioning.")
+
+    return clustering_fields or None, time_partitioning
+
+
 def load_csv_to_bigquery(
     bucket_name: str,
     blob_name: str,
     table_name: str,
     schema: List[bigquery.SchemaField],
     bigquery_client,
+    apply_layout: bool = True,
 ) -> None:
     table_id = get_table_id(table_name)
     uri = f"gs://{bucket_name}/{blob_name}"
+    if apply_layout:
+        clustering_fields, time_partitioning = get_table_layout(table_name, schema)
+    else:
+        clustering_fields, time_partitioning = None, None
     job_config = bigquery.LoadJobConfig(
         schema=schema,
         source_format=bigquery.SourceFormat.CSV,
         skip_leading_rows=HEADER_ROWS_TO_SKIP,
         write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
         allow_quoted_newlines=True,
+        clustering_fields=clustering_fields,
+        time_partitioning=time_partitioning,
+    )
+
+    print(f"Starting load job for {uri} into {table_id} (clustered by {clustering_fields}, partitioned by {time_partitioning})")
+    load_job = bigquery_jobs.run(
+        f"load {table_name}",
+        lambda: bigquery_client.load_table_from_uri(uri, table_id, job_config=job_config, retry=bigquery_retry),
+    )
+    print(f"Completed load job {load_job.job_id} for {table_id} ({load_job.output_rows} rows)")
+
+
+def typed_column_expression(name: str, column_type: str) -> str:
+    if column_type == "LEASE_YEARS":
+        return f"SAFE_CAST(REGEXP_EXTRACT({name}, r'^\\s*(\\d+)') AS INT64) AS {name}"
+    if column_type == "DATE":
+        return f"SAFE.PARSE_DATE('%Y-%m-%d', SUBSTR({name}, 1, 10)) AS {name}"
+    if column_type != "STRING":
+        return f"SAFE_CAST({name} AS {column_type}) AS {name}"
+    return name
+
+
+def build_typed_select(
+    staging_table: str, table_name: str, schema: List[bigquery.SchemaField]
+) -> Tuple[str, List[bigquery.SchemaField]]:
+    """
+    SELECT that copies the allowlisted columns of a staging table with their
+    declared types. Returns the query and the resulting schema.
+    """
+    allowlist = SAVINGS_PLAN_COLUMNS if is_savings_plan_table(table_name) else GLOBAL_PRICING_COLUMNS
+    keep = None if allowlist.strip() == "*" else {name.strip() for name in allowlist.split(",") if name.strip()}
+
+    expressions = []
+    typed_schema = []
+    for field in schema:
+        if keep is not None and field.name not in keep:
+            continue
+        column_type = PRICING_COLUMN_TYPES.get(field.name, "STRING")
+        expressions.append(typed_column_expression(field.name, column_type))
+        typed_schema.append(bigquery.SchemaField(field.name, "INT64" if column_type == "LEASE_YEARS" else column_type))
+
+    if not expressions:
+        raise ValueError(f"No allowlisted columns found for {table_name}")
+
+    separator = ",\n      "
+    query = f"""
+    SELECT
+      {separator.join(expressions)}
+    FROM `{get_table_id(staging_table)}`
+    """
+    return query, typed_schema
+
+
+def build_typed_table(staging_table: str, table_name: str, schema: List[bigquery.SchemaField], bigquery_client) -> None:
+    """Copy a loaded staging table into the final typed, pruned and clustered table."""
+    query, typed_schema = build_typed_select(staging_table, table_name, schema)
+    clustering_fields, time_partitioning = get_table_layout(table_name, typed_schema)
+    table_id = get_table_id(table_name)
+    job_config = bigquery.QueryJobConfig(
+        destination=table_id,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        clustering_fields=clustering_fields,
+        time_partitioning=time_partitioning,
     )
 
-    print(f"Starting load job for {uri} into {table_id}")
-    load_job = bigquery_client.load_table_from_uri(
-        uri, table_id, job_config=job_config, retry=bigquery_retry
+    print(f"Building typed table {table_id} with {len(typed_schema)} of {len(schema)} columns")
+    query_job = bigquery_jobs.run(
+        f"typed {table_name}",
+        lambda: bigquery_client.query(query, job_config=job_config, retry=bigquery_retry),
     )
-    load_job.result()
-    print(f"Completed load job {load_job.job_id} for {table_id}")
+    print(f"Completed typed table job {query_job.job_id} for {table_id}")
 
 
 def update_latest_view(table_name: str, view_name: str, bigquery_client) -> Optional[str]:
@@ -408,9 +729,512 @@ def update_latest_view(table_name: str, view_name: str, bigquery_client) -> Opti
         raise
 
     return old_table
-def download_file(url: str, gcs_filename: str, line_limit: Optional[int] = None) -> Tuple[str, int]:
+
+
+def list_savings_plan_views(bigquery_client) -> List[str]:
+    """Names of the per-region savings_plan_*_latest views in the dataset."""
+    dataset_id = f"{PROJECT_ID}.{BQ_DATASET}"
+    return sorted(
+        table.table_id
+        for table in bigquery_client.list_tables(dataset_id, retry=bigquery_retry)
+        if table.table_type == "VIEW"
+        and table.table_id.startswith("savings_plan_")
+        and table.table_id.endswith("_latest")
+    )
+
+
+def build_savings_plan_all_regions_query(view_schemas: Dict[str, List[bigquery.SchemaField]], columns: List[str]) -> str:
     """
-    Downloads a file from URL to GCS and returns (gcs_filename, size_bytes).
+    UNION ALL of the given columns from every per-region savings plan view.
+    Views still holding STRING tables from before typed loads are cast to the
+    typed column types, so they union with regions that have been reloaded.
+    """
+    typed_columns = {field.name for schema in view_schemas.values() for field in schema if field.field_type != "STRING"}
+
+    selects = []
+    for view, schema in view_schemas.items():
+        field_types = {field.name: field.field_type for field in schema}
+        expressions = [
+            typed_column_expression(name, PRICING_COLUMN_TYPES.get(name, "STRING"))
+            if name in typed_columns and field_types.get(name) == "STRING" else name
+            for name in columns
+        ]
+        selects.append(f"SELECT {', '.join(expressions)} FROM `{get_table_id(view)}`")
+    return "\n    UNION ALL\n    ".join(selects)
+
+
+def build_savings_plan_all_regions_table(version_id: str, bigquery_client) -> None:
+    """
+    Rebuild the all-region savings plan table from the per-region _latest
+    views and point ec2_savings_plan_pricing_latest at it.
+    """
+    savings_plan_views = list_savings_plan_views(bigquery_client)
+    if not savings_plan_views:
+        print("No savings plan views found; skipping the all-region savings plan table.")
+        return
+
+    # Regions loaded with different column allowlists only share their common columns
+    view_schemas = {
+        view: bigquery_client.get_table(get_table_id(view), retry=bigquery_retry).schema
+        for view in savings_plan_views
+    }
+    schemas = list(view_schemas.values())
+    common_columns = set.intersection(*({field.name for field in schema} for schema in schemas))
+    typed_fields = {field.name: field for schema in schemas for field in schema if field.field_type != "STRING"}
+    schema = [typed_fields.get(field.name, field) for field in schemas[0] if field.name in common_columns]
+
+    table_name = f"{SAVINGS_PLAN_ALL_REGIONS_TABLE_PREFIX}_{version_id}"
+    table_id = get_table_id(table_name)
+    clustering_fields, time_partitioning = get_table_layout(table_name, schema)
+    job_config = bigquery.QueryJobConfig(
+        destination=table_id,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        clustering_fields=clustering_fields,
+        time_partitioning=time_partitioning,
+    )
+
+    print(f"Building all-region savings plan table {table_id} from {len(savings_plan_views)} views (clustered by {clustering_fields})")
+    query = build_savings_plan_all_regions_query(view_schemas, [field.name for field in schema])
+    query_job = bigquery_jobs.run(
+        f"all-region {table_name}",
+        lambda: bigquery_client.query(query, job_config=job_config, retry=bigquery_retry),
+    )
+    print(f"Completed all-region savings plan job {query_job.job_id} for {table_id}")
+
+    old_table = update_latest_view(table_name, SAVINGS_PLAN_ALL_REGIONS_VIEW, bigquery_client)
+    if old_table and old_table != table_name:
+        delete_table(old_table, bigquery_client)
+
+
+def build_pricing_matrix_query(table_name: str, savings_plan_views: List[str]) -> str:
+    """
+    Pivot the _latest pricing views into one row per instance shape. The
+    predicates match the API's On-Demand, Reserved Instance and Savings Plan
+    lookups; scenarios without a price are left NULL.
+    """
+    # Matches lease lengths in both typed tables (INT64 years) and STRING tables ("1yr", "1")
+    lease_years = "SAFE_CAST(REGEXP_EXTRACT(CAST(leasecontractlength AS STRING), r'^\\s*(\\d+)') AS INT64)"
+    # Several OnDemand rows can match a shape; like the API's lookups, take the
+    # one with the lowest sku
+    global_columns = [
+        "ARRAY_AGG(IF(termtype = 'OnDemand', STRUCT(sku, SAFE_CAST(priceperunit AS FLOAT64) AS rate), NULL) "
+        "IGNORE NULLS ORDER BY sku LIMIT 1)[SAFE_OFFSET(0)].rate AS on_demand_rate"
+    ]
+    savings_plan_columns = []
+    for term in PRICING_MATRIX_TERMS:
+        reserved = f"termtype = 'Reserved' AND {lease_years} = {term}"
+        upfront_fee = "pricedescription LIKE '%Upfront Fee%'"
+        reserved_columns = {
+            f"ri_{term}yr_no_upfront_rate": f"{reserved} AND purchaseoption = 'No Upfront'",
+            f"ri_{term}yr_partial_upfront_rate": f"{reserved} AND purchaseoption = 'Partial Upfront' AND NOT {upfront_fee}",
+            f"ri_{term}yr_partial_upfront_fee": f"{reserved} AND purchaseoption = 'Partial Upfront' AND {upfront_fee}",
+            f"ri_{term}yr_all_upfront_fee": f"{reserved} AND purchaseoption = 'All Upfront' AND {upfront_fee}",
+        }
+        global_columns += [
+            f"MAX(IF({condition}, SAFE_CAST(priceperunit AS FLOAT64), NULL)) AS {column}"
+            for column, condition in reserved_columns.items()
+        ]
+        for plan, product_family in PRICING_MATRIX_SAVINGS_PLANS.items():
+            for purchase_option, option in PRICING_MATRIX_PURCHASE_OPTIONS.items():
+                condition = (
+                    f"product_family = '{product_family}' AND {lease_years} = {term} "
+                    f"AND purchaseoption = '{purchase_option}'"
+                )
+                savings_plan_columns.append(
+                    (f"{plan}_{term}yr_{option}_rate", f"MAX(IF({condition}, SAFE_CAST(discountedrate AS FLOAT64), NULL))")
+                )
+
+    separator = ",\n        "
+    if savings_plan_views:
+        # Views on typed and STRING tables are mixed until every region reloads,
+        # so the union is cast to one type per column
+        savings_plan_rows = "\n      UNION ALL\n      ".join(
+            "SELECT discountedregioncode, discountedinstancetype, discountedoperation, discountedusagetype, "
+            "product_family, purchaseoption, CAST(leasecontractlength AS STRING) AS leasecontractlength, "
+            f"SAFE_CAST(discountedrate AS FLOAT64) AS discountedrate FROM `{get_table_id(view)}`"
+            for view in savings_plan_views
+        )
+        savings_plan_rates = f"""
+    , savings_plan_rates AS (
+      SELECT
+        discountedregioncode AS region_code,
+        discountedinstancetype AS instance_type,
+        discountedoperation AS operation,
+        {separator.join(f"{expression} AS {column}" for column, expression in savings_plan_columns)}
+      FROM (
+      {savings_plan_rows}
+      )
+      WHERE discountedusagetype LIKE '%-BoxUsage%'
+      AND product_family IN ({", ".join(f"'{family}'" for family in PRICING_MATRIX_SAVINGS_PLANS.values())})
+      GROUP BY region_code, instance_type, operation
+    )"""
+        savings_plan_select = separator.join(f"s.{column}" for column, _ in savings_plan_columns)
+        savings_plan_join = "LEFT JOIN savings_plan_rates AS s USING (region_code, instance_type, operation)"
+    else:
+        savings_plan_rates = ""
+        savings_plan_select = separator.join(f"CAST(NULL AS FLOAT64) AS {column}" for column, _ in savings_plan_columns)
+        savings_plan_join = ""
+
+    return f"""
+    CREATE OR REPLACE TABLE `{get_table_id(table_name)}`
+    CLUSTER BY region_code, instance_type, operation, tenancy
+    AS
+    WITH global_rates AS (
+      SELECT
+        region_code,
+        instance_type,
+        operation,
+        tenancy,
+        ANY_VALUE(operating_system) AS operating_system,
+        {separator.join(global_columns)}
+      FROM `{get_table_id("ec2_global_pricing_latest")}`
+      WHERE usagetype LIKE '%BoxUsage%'
+      AND (termtype = 'OnDemand' OR (termtype = 'Reserved' AND offeringclass = 'standard'))
+      GROUP BY region_code, instance_type, operation, tenancy
+    ){savings_plan_rates}
+    SELECT
+      g.*,
+      {savings_plan_select}
+    FROM global_rates AS g
+    {savings_plan_join}
+    """
+
+
+def build_pricing_matrix(version_id: str, bigquery_client) -> None:
+    """
+    Rebuild the pricing matrix from the current _latest views and point
+    ec2_pricing_matrix_latest at it.
+    """
+    table_name = f"ec2_pricing_matrix_{version_id}"
+    savings_plan_views = list_savings_plan_views(bigquery_client)
+    print(f"Building pricing matrix {table_name} from {len(savings_plan_views)} savings plan views")
+
+    query = build_pricing_matrix_query(table_name, savings_plan_views)
+    query_job = bigquery_jobs.run(
+        f"matrix {table_name}",
+        lambda: bigquery_client.query(query, retry=bigquery_retry),
+    )
+    print(f"Completed pricing matrix job {query_job.job_id} for {get_table_id(table_name)}")
+
+    old_table = update_latest_view(table_name, PRICING_MATRIX_VIEW, bigquery_client)
+    if old_table and old_table != table_name:
+        delete_table(old_table, bigquery_client)
+
+
+def pick_validators(values: Any) -> Dict[str, str]:
+    """ETag and Last-Modified from a checkpoint, manifest row or blob metadata."""
+    return {key: values[key] for key in ("etag", "last_modified") if values.get(key)}
+
+
+def response_validators(response: requests.Response) -> Dict[str, str]:
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return {key: value for key, value in validators.items() if value}
+
+
+def conditional_headers(validators: Dict[str, str]) -> Dict[str, str]:
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def range_validator(validators: Dict[str, str]) -> Optional[str]:
+    """If-Range value for resuming a download; weak ETags can't be used."""
+    etag = validators.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return validators.get("last_modified")
+
+
+def get_checkpoint_blob(bucket: storage.Bucket, gcs_filename: str) -> storage.Blob:
+    return bucket.blob(f"{DOWNLOAD_CHECKPOINT_PREFIX}{gcs_filename}.json")
+
+
+def read_download_checkpoint(bucket: storage.Bucket, gcs_filename: str) -> Optional[dict]:
+    try:
+        return json.loads(get_checkpoint_blob(bucket, gcs_filename).download_as_bytes())
+    except NotFound:
+        return None
+    except Exception as e:
+        print(f"WARNING: Ignoring unreadable download checkpoint for {gcs_filename}: {e}")
+        return None
+
+
+def write_download_checkpoint(bucket: storage.Bucket, gcs_filename: str, checkpoint: dict) -> None:
+    get_checkpoint_blob(bucket, gcs_filename).upload_from_string(
+        json.dumps(checkpoint), content_type="application/json"
+    )
+
+
+def delete_download_checkpoint(bucket: storage.Bucket, gcs_filename: str) -> None:
+    try:
+        get_checkpoint_blob(bucket, gcs_filename).delete()
+    except NotFound:
+        pass
+
+
+def persisted_upload_bytes(response: requests.Response) -> int:
+    # 308 responses report the persisted bytes as "Range: bytes=0-<last byte>"
+    persisted_range = response.headers.get("Range")
+    if not persisted_range:
+        return 0
+    return int(persisted_range.rsplit("-", 1)[1]) + 1
+
+
+def query_upload_offset(session_url: str) -> Optional[int]:
+    """
+    Bytes persisted by an unfinished resumable upload session, or None if the
+    session has expired and the upload has to start over.
+    """
+    try:
+        response = requests.put(
+            session_url, headers={"Content-Range": "bytes */*"}, timeout=REQUEST_TIMEOUT_SECONDS
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"Could not query resumable upload session: {e}")
+        return None
+    if response.status_code == 308:
+        return persisted_upload_bytes(response)
+    print(f"Resumable upload session returned {response.status_code}; starting the upload over.")
+    return None
+
+
+def upload_chunk(session_url: str, offset: int, chunk: bytes, final: bool) -> int:
+    """
+    PUTs one chunk to a resumable upload session and returns the number of
+    bytes GCS has persisted. The final chunk also sets the object size.
+    """
+    end = offset + len(chunk)
+    if chunk:
+        content_range = f"bytes {offset}-{end - 1}/{end if final else '*'}"
+    else:
+        content_range = f"bytes */{end}"
+    response = requests.put(
+        session_url, data=chunk, headers={"Content-Range": content_range}, timeout=REQUEST_TIMEOUT_SECONDS
+    )
+    if final:
+        response.raise_for_status()
+        return end
+    if response.status_code != 308:
+        response.raise_for_status()
+        raise RuntimeError(f"Unexpected status {response.status_code} for upload chunk {content_range}")
+    return persisted_upload_bytes(response)
+
+
+def stream_to_upload_session(
+    chunks: Iterable[bytes], bucket: storage.Bucket, gcs_filename: str, checkpoint: dict
+) -> int:
+    """
+    Streams downloaded chunks into the checkpoint's upload session, starting
+    at checkpoint["offset"] and saving the persisted offset after each chunk.
+    Returns the final object size.
+    """
+    session_url = checkpoint["session_url"]
+    offset = checkpoint["offset"]
+    buffer = bytearray()
+    for data in chunks:
+        buffer.extend(data)
+        # Always hold some bytes back so the final PUT has data to finalize with
+        while len(buffer) > UPLOAD_CHUNK_SIZE:
+            persisted = upload_chunk(session_url, offset, bytes(buffer[:UPLOAD_CHUNK_SIZE]), final=False)
+            if persisted <= offset:
+                raise RuntimeError(f"Upload session for {gcs_filename} did not persist any bytes at offset {offset}")
+            # GCS may persist less than the whole chunk; the rest is sent again
+            del buffer[:persisted - offset]
+            offset = persisted
+            checkpoint["offset"] = offset
+            write_download_checkpoint(bucket, gcs_filename, checkpoint)
+            if offset % (100 * DOWNLOAD_CHUNK_SIZE) < UPLOAD_CHUNK_SIZE:
+                print(f"Downloaded and uploaded {offset / (1024 * 1024):.2f} MiB of {gcs_filename} to gs://{bucket.name}...")
+
+    return upload_chunk(session_url, offset, bytes(buffer), final=True)
+
+
+def take_bytes(chunks: Iterable[bytes], limit: int) -> Iterable[bytes]:
+    """Yields chunks up to a total of limit bytes, then stops reading."""
+    for data in chunks:
+        if limit <= 0:
+            return
+        yield data[:limit]
+        limit -= len(data)
+
+
+def parse_content_range(response: requests.Response) -> Tuple[Optional[int], Optional[int]]:
+    """(first byte, total size) from a 206 Content-Range header like "bytes 0-99/1234"."""
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", ""))
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return int(start), None if total == "*" else int(total)
+
+
+def plan_download_parts(size: int) -> List[Tuple[int, int]]:
+    """Inclusive byte ranges for a split download, aligned to UPLOAD_CHUNK_SIZE."""
+    part_count = min(DOWNLOAD_CONNECTIONS, MAX_COMPOSE_SOURCES)
+    part_size = -(-size // part_count)
+    part_size = -(-part_size // UPLOAD_CHUNK_SIZE) * UPLOAD_CHUNK_SIZE
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+def get_part_name(gcs_filename: str, index: int) -> str:
+    return f"{gcs_filename}.part-{index:02d}"
+
+
+class SourceChangedError(RuntimeError):
+    """The file on the pricing server changed while it was being downloaded in parts."""
+
+
+def download_part(
+    url: str,
+    bucket: storage.Bucket,
+    gcs_filename: str,
+    index: int,
+    byte_range: Tuple[int, int],
+    validator: str,
+    response: Optional[requests.Response] = None,
+) -> int:
+    """
+    Downloads one byte range into its part object through a checkpointed
+    resumable upload session. response, if given, is an open response
+    starting at the first byte of the range. Raises SourceChangedError if the
+    source changed.
+    """
+    part_name = get_part_name(gcs_filename, index)
+    part_blob = bucket.blob(part_name)
+    start, end = byte_range
+    part_size = end - start + 1
+    if part_blob.exists():
+        if response is not None:
+            response.close()
+        return part_size
+
+    checkpoint = read_download_checkpoint(bucket, part_name)
+    if checkpoint:
+        offset = query_upload_offset(checkpoint["session_url"])
+        if offset is None:
+            checkpoint = None
+        else:
+            checkpoint["offset"] = offset
+    if checkpoint is None:
+        checkpoint = {
+            "url": url,
+            "session_url": part_blob.create_resumable_upload_session(content_type="text/csv"),
+            "offset": 0,
+        }
+        write_download_checkpoint(bucket, part_name, checkpoint)
+
+    offset = checkpoint["offset"]
+    if response is None or offset:
+        if response is not None:
+            response.close()
+        response = requests.get(
+            url,
+            stream=True,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            headers={
+                "Accept-Encoding": "identity",
+                "Range": f"bytes={start + offset}-{end}",
+                "If-Range": validator,
+            },
+        )
+        response.raise_for_status()
+        if response.status_code != 206 or parse_content_range(response)[0] != start + offset:
+            response.close()
+            raise SourceChangedError(f"{url} changed during the split download")
+
+    with response:
+        size = stream_to_upload_session(
+            take_bytes(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), part_size - offset),
+            bucket,
+            part_name,
+            checkpoint,
+        )
+    if size != part_size:
+        raise RuntimeError(f"Part {part_name} has {size} bytes, expected {part_size}")
+    delete_download_checkpoint(bucket, part_name)
+    print(f"Downloaded part {index} of {gcs_filename} (bytes {start}-{end})")
+    return part_size
+
+
+def delete_download_parts(bucket: storage.Bucket, gcs_filename: str, part_count: int) -> None:
+    for index in range(part_count):
+        part_name = get_part_name(gcs_filename, index)
+        try:
+            bucket.blob(part_name).delete()
+        except NotFound:
+            pass
+        delete_download_checkpoint(bucket, part_name)
+
+
+def download_in_parts(
+    url: str,
+    bucket: storage.Bucket,
+    gcs_filename: str,
+    checkpoint: dict,
+    first_response: Optional[requests.Response] = None,
+) -> int:
+    """
+    Downloads the byte ranges in checkpoint["parts"] concurrently, one
+    connection each, then composes the part objects in order into
+    gcs_filename. first_response, if given, is an open response from byte 0
+    that serves the first part. Parts already uploaded by an earlier run are
+    kept, so an interrupted split download resumes. Returns the file size.
+    """
+    parts = [tuple(byte_range) for byte_range in checkpoint["parts"]]
+    validator = range_validator(checkpoint)
+    print(f"Downloading {gcs_filename} ({checkpoint['size'] / (1024 * 1024):.2f} MiB) as {len(parts)} ranges")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(parts)) as executor:
+            futures = [
+                executor.submit(
+                    download_part, url, bucket, gcs_filename, index, byte_range, validator,
+                    first_response if index == 0 else None,
+                )
+                for index, byte_range in enumerate(parts)
+            ]
+            size = sum(future.result() for future in futures)
+    except SourceChangedError:
+        # The parts already uploaded can't be reused. Other failures keep them
+        # and their checkpoints so the next run resumes.
+        delete_download_parts(bucket, gcs_filename, len(parts))
+        delete_download_checkpoint(bucket, gcs_filename)
+        raise
+    finally:
+        if first_response is not None:
+            first_response.close()
+
+    blob = bucket.blob(gcs_filename)
+    blob.content_type = "text/csv"
+    blob.metadata = pick_validators(checkpoint)
+    blob.compose([bucket.blob(get_part_name(gcs_filename, index)) for index in range(len(parts))])
+    delete_download_parts(bucket, gcs_filename, len(parts))
+    delete_download_checkpoint(bucket, gcs_filename)
+    return size
+
+
+def download_file(
+    url: str,
+    gcs_filename: str,
+    line_limit: Optional[int] = None,
+    validators: Optional[Dict[str, str]] = None,
+) -> Tuple[str, Optional[int], Dict[str, str]]:
+    """
+    Downloads a file from URL to GCS with a single streaming GET and returns
+    (gcs_filename, size_bytes, validators), where validators holds the
+    response's ETag and Last-Modified.
+
+    If the given validators still match, the server answers 304 and nothing
+    is downloaded (size_bytes is None). Full downloads are written through a
+    GCS resumable upload session checkpointed in the bucket, so a download
+    that was interrupted continues from the persisted offset with a Range
+    request. The validators are also stored in the object's metadata, so a
+    file downloaded by an earlier run that did not load it keeps them.
     """
     bucket_name = get_bucket_name()
     bucket = get_bucket()
@@ -421,77 +1245,133 @@ def download_file(url: str, gcs_filename: str, line_limit: Optional[int] = None)
         blob.reload()
         if blob.size and blob.size > 0:
             print(f"Blob {gcs_filename} already exists ({blob.size} bytes). Skipping download.")
-            return gcs_filename, blob.size
+            return gcs_filename, blob.size, pick_validators(blob.metadata or {})
+
+    # Byte offsets only line up with the stored file without content encoding
+    headers = {"Accept-Encoding": "identity"}
+    checkpoint = None
+    if not line_limit:
+        checkpoint = read_download_checkpoint(bucket, gcs_filename)
+        if checkpoint and checkpoint.get("url") == url and checkpoint.get("parts"):
+            downloaded_bytes = download_in_parts(url, bucket, gcs_filename, checkpoint)
+            print(f"Successfully downloaded {downloaded_bytes / (1024 * 1024):.2f} MiB from {url} to gs://{bucket_name}/{gcs_filename}")
+            return gcs_filename, downloaded_bytes, pick_validators(checkpoint)
+        if checkpoint and checkpoint.get("url") == url and range_validator(checkpoint):
+            offset = query_upload_offset(checkpoint["session_url"])
+            if offset is None:
+                checkpoint = None
+            else:
+                checkpoint["offset"] = offset
+                headers["Range"] = f"bytes={offset}-"
+                # The server ignores the range and sends the whole file if it changed
+                headers["If-Range"] = range_validator(checkpoint)
+        else:
+            checkpoint = None
+        if checkpoint is None:
+            headers.update(conditional_headers(validators or {}))
+            if DOWNLOAD_CONNECTIONS > 1:
+                # An open-ended range reports the file size without a separate request
+                headers["Range"] = "bytes=0-"
 
     downloaded_bytes = 0
     print(f"[DEBUG] Attempting to download from URL: {url}")
     print(f"[DEBUG] Target GCS path: gs://{bucket_name}/{gcs_filename}")
     print(f"[DEBUG] Request timeout: {REQUEST_TIMEOUT_SECONDS} seconds")
-    
+
     try:
-        print(f"[DEBUG] Making HTTP GET request to: {url}")
-        with requests.get(url, stream=True, timeout=REQUEST_TIMEOUT_SECONDS) as r:
+        with requests.get(url, stream=True, timeout=REQUEST_TIMEOUT_SECONDS, headers=headers) as r:
             print(f"[DEBUG] HTTP response status: {r.status_code}")
             print(f"[DEBUG] HTTP response headers: {dict(r.headers)}")
-            
+
+            if r.status_code == 304:
+                print(f"{url} has not changed since it was last downloaded. Skipping download.")
+                return gcs_filename, None, validators or {}
+
             if r.status_code == 404:
                 print(f"[ERROR] 404 Not Found for URL: {url}")
                 print("[ERROR] This suggests the URL is incorrect or the file doesn't exist")
                 print("[ERROR] Check if the URL construction logic is correct")
-                
+
             r.raise_for_status()
+
+            if line_limit:
+                print(f"TESTING MODE: Downloading first {line_limit} lines.")
+                with blob.open("wb") as f:
+                    for i, line in enumerate(r.iter_lines()):
+                        if i >= line_limit:
+                            break
+                        f.write(line)
+                        f.write(b"\n")
+                        downloaded_bytes += len(line) + 1
+                # A truncated file must not make the next full download conditional
+                return gcs_filename, downloaded_bytes, {}
+
+            range_start, total_size = parse_content_range(r)
+            current_validators = response_validators(r)
+            if (
+                checkpoint is None
+                and r.status_code == 206
+                and total_size is not None
+                and total_size >= max(DOWNLOAD_SPLIT_MIN_SIZE, 1)
+                and range_validator(current_validators)
+            ):
+                checkpoint = {"url": url, "size": total_size, "parts": plan_download_parts(total_size), **current_validators}
+                write_download_checkpoint(bucket, gcs_filename, checkpoint)
+                downloaded_bytes = download_in_parts(url, bucket, gcs_filename, checkpoint, first_response=r)
+                print(f"Successfully downloaded {downloaded_bytes / (1024 * 1024):.2f} MiB from {url} to gs://{bucket_name}/{gcs_filename}")
+                return gcs_filename, downloaded_bytes, current_validators
+
+            if checkpoint and r.status_code == 206 and range_start == checkpoint["offset"]:
+                print(f"Resuming download of {gcs_filename} at {checkpoint['offset'] / (1024 * 1024):.2f} MiB")
+            else:
+                if checkpoint:
+                    print(f"{url} changed since the interrupted download. Starting over.")
+                # Part of the object resource the session creates
+                blob.metadata = current_validators
+                checkpoint = {
+                    "url": url,
+                    "session_url": blob.create_resumable_upload_session(content_type="text/csv"),
+                    "offset": 0,
+                    **current_validators,
+                }
+                write_download_checkpoint(bucket, gcs_filename, checkpoint)
+
+            print(f"Starting download stream from {url} to gs://{bucket_name}/{gcs_filename}")
+            downloaded_bytes = stream_to_upload_session(
+                r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), bucket, gcs_filename, checkpoint
+            )
+            delete_download_checkpoint(bucket, gcs_filename)
+            # A resumed response is partial, so keep the validators of the full file
+            validators = pick_validators(checkpoint)
     except requests.exceptions.RequestException as e:
         print(f"[ERROR] Request failed for URL: {url}")
         print(f"[ERROR] Exception details: {e}")
         raise
-    
-    print(f"Starting download stream from {url} to gs://{bucket_name}/{gcs_filename}")
-    with requests.get(url, stream=True, timeout=REQUEST_TIMEOUT_SECONDS) as r:
-        r.raise_for_status()
-        with blob.open("wb") as f:
-            if line_limit:
-                print(f"TESTING MODE: Downloading first {line_limit} lines.")
-                for i, line in enumerate(r.iter_lines()):
-                    if i >= line_limit:
-                        break
-                    f.write(line)
-                    f.write(b"\n")
-                    downloaded_bytes += len(line) + 1
-                    if downloaded_bytes % (100 * DOWNLOAD_CHUNK_SIZE) == 0:
-                        print(f"Downloaded and uploaded {downloaded_bytes / (1024 * 1024):.2f} MiB of {gcs_filename} to gs://{bucket_name}...")
-            else:
-                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
-                    if not chunk:
-                        continue
-                    f.write(chunk)
-                    downloaded_bytes += len(chunk)
-                    if downloaded_bytes % (100 * DOWNLOAD_CHUNK_SIZE) == 0:
-                        print(f"Downloaded and uploaded {downloaded_bytes / (1024 * 1024):.2f} MiB of {gcs_filename} to gs://{bucket_name}...")
 
     print(f"Successfully downloaded {downloaded_bytes / (1024 * 1024):.2f} MiB from {url} to gs://{bucket_name}/{gcs_filename}")
-    return gcs_filename, downloaded_bytes
+    return gcs_filename, downloaded_bytes, validators
 
 
-def process_download_job(url: str, gcs_filename: str, is_testing: bool) -> Tuple[str, int]:
+def process_download_job(
+    url: str, gcs_filename: str, is_testing: bool
+) -> Tuple[str, int, Dict[str, str], bool]:
     """
-    Process a single download job: download to GCS, log to BigQuery.
-    Returns (gcs_filename, size_bytes) for later processing.
+    Process a single download job: download to GCS using the manifest's
+    validators for the URL. Returns (gcs_filename, size_bytes, validators,
+    changed) for later processing; changed is False when the source was not
+    modified, and size_bytes is then the size of the previous download. The
+    download is recorded in the manifest once its table is published.
     """
     print(f"Processing download job for {url} to {gcs_filename}")
 
-    # Check BigQuery for existing successful download
-    if is_file_downloaded(gcs_filename):
-        print(f"File {gcs_filename} already downloaded successfully. Skipping.")
-        # Still return something for consistency, but size 0 to indicate skip
-        return gcs_filename, 0
-
     line_limit = 100 if is_testing else None
-    gcs_filename, size_bytes = download_file(url, gcs_filename, line_limit)
-
-    # Log successful download to BigQuery
-    log_file_downloaded(gcs_filename, url, size_bytes)
+    validators = {} if is_testing else download_manifest.validators(url)
+    gcs_filename, size_bytes, validators = download_file(url, gcs_filename, line_limit, validators)
+    if size_bytes is None:
+        # Not modified; the tables loaded from the previous download are current
+        return gcs_filename, download_manifest.size(url) or 0, validators, False
 
-    return gcs_filename, size_bytes
+    return gcs_filename, size_bytes, validators, True
 
 
 def delete_blob(blob_name: str) -> None:
@@ -505,9 +1385,11 @@ def delete_blob(blob_name: str) -> None:
         print(f"WARNING: Blob gs://{bucket_name}/{blob_name} not found during deletion. It may have been processed by another instance.")
 
 
-def load_and_cleanup_file(gcs_filename: str):
+def load_and_cleanup_file(gcs_filename: str) -> Optional[Tuple[str, str]]:
     """
-    Load a downloaded file to BigQuery and clean up GCS.
+    Load a downloaded file into a new BigQuery table and clean up GCS.
+    Returns (table_name, view_name) for publish_loaded_tables, or None if
+    the file could not be loaded.
     """
     bucket_name = get_bucket_name()
 
@@ -515,23 +1397,94 @@ def load_and_cleanup_file(gcs_filename: str):
         header = read_header_row(gcs_filename)
         if not header:
             print(f"Skipping BigQuery load for gs://{bucket_name}/{gcs_filename} due to missing header.")
-            return
+            return None
 
         schema = build_schema(header)
         table_name, view_name = parse_resource_names(gcs_filename)
 
-        load_csv_to_bigquery(bucket_name, gcs_filename, table_name, schema, bigquery_client)
-        old_table = update_latest_view(table_name, view_name, bigquery_client)
-        if old_table and old_table != table_name:
-            delete_table(old_table, bigquery_client)
+        if TYPED_PRICING_TABLES:
+            staging_table = f"{table_name}_staging"
+            load_csv_to_bigquery(bucket_name, gcs_filename, staging_table, schema, bigquery_client, apply_layout=False)
+            try:
+                build_typed_table(staging_table, table_name, schema, bigquery_client)
+            finally:
+                delete_table(staging_table, bigquery_client)
+        else:
+            load_csv_to_bigquery(bucket_name, gcs_filename, table_name, schema, bigquery_client)
+        return table_name, view_name
 
     except Exception as e:
         print(f"ERROR: Failed to process gs://{bucket_name}/{gcs_filename} due to: {e}")
+        return None
     finally:
         delete_blob(gcs_filename)
         print(f"Finished processing gs://{bucket_name}/{gcs_filename}")
 
 
+def publish_loaded_tables(loaded_tables: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Point each _latest view at its newly loaded table and drop the table it
+    replaced. Returns the (table_name, view_name) pairs that were published.
+    """
+    published = []
+    for table_name, view_name in loaded_tables:
+        try:
+            old_table = update_latest_view(table_name, view_name, bigquery_client)
+        except Exception as e:
+            print(f"ERROR: Failed to publish {table_name} as {view_name}: {e}")
+            continue
+        published.append((table_name, view_name))
+        if old_table and old_table != table_name:
+            delete_table(old_table, bigquery_client)
+    return published
+
+
+def download_and_load_files(download_jobs: List[Tuple[str, str]], is_testing: bool) -> List[str]:
+    """
+    Download files with up to DOWNLOAD_CONCURRENCY workers and hand each
+    finished file to a separate pool of LOAD_CONCURRENCY workers that run
+    load_and_cleanup_file, so loads overlap the remaining downloads. Once
+    every load job has finished, the views are pointed at the tables that
+    loaded successfully, and only those files are recorded in the download
+    manifest; a file that failed is downloaded again by the next run.
+    Returns the files that were loaded.
+    """
+    # Load future -> (gcs_filename, url, size_bytes, validators)
+    downloads = {}
+    with ThreadPoolExecutor(max_workers=max(1, LOAD_CONCURRENCY)) as load_executor:
+        with ThreadPoolExecutor(max_workers=max(1, DOWNLOAD_CONCURRENCY)) as download_executor:
+            futures = {
+                download_executor.submit(process_download_job, url, filename, is_testing): url
+                for url, filename in download_jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    gcs_filename, size_bytes, validators, changed = future.result()
+                except Exception as e:
+                    print(f"Download failed: {e}")
+                    continue
+                if changed:  # Only load if actually downloaded
+                    load_future = load_executor.submit(load_and_cleanup_file, gcs_filename)
+                    downloads[load_future] = (gcs_filename, futures[future], size_bytes, validators)
+
+        print(f"Downloaded {len(downloads)} files.")
+        loaded = {future: future.result() for future in as_completed(downloads)}
+
+    # Views are swapped only once every load job has finished, so the API moves to
+    # the new tables together; files that failed to load keep their current tables
+    loaded_tables = [loaded[future] for future in downloads if loaded[future]]
+    print(f"Loaded {len(loaded_tables)} of {len(downloads)} downloaded files.")
+    published = publish_loaded_tables(loaded_tables)
+
+    loaded_files = []
+    for future, (gcs_filename, url, size_bytes, validators) in downloads.items():
+        if loaded[future] in published:
+            download_manifest.record(gcs_filename, url, size_bytes, validators)
+            loaded_files.append(gcs_filename)
+    download_manifest.flush()
+    return loaded_files
+
+
 def main():
     """
     Main entry point for the consolidated pricing update job.
@@ -602,6 +1555,11 @@ def main():
             return "Pricing data is already up to date.", 200
 
         # 5. Collect all download jobs
+        try:
+            ensure_files_table()
+        except Exception as e:
+            print(f"WARNING: Could not update {get_table_id(BQ_FILES_TABLE)}: {e}")
+        download_manifest.load()
         download_jobs = []
 
         # Global On-Demand & Reserved Pricing
@@ -615,7 +1573,7 @@ def main():
             print(f"[DEBUG]   constructed URL: {global_pricing_url}")
             print(f"[DEBUG]   GCS filename: {gcs_filename}")
             
-            if not is_file_downloaded(gcs_filename):
+            if not download_manifest.is_downloaded(gcs_filename):
                 download_jobs.append((global_pricing_url, gcs_filename))
                 print("[DEBUG] Added global pricing job to download queue")
             else:
@@ -672,7 +1630,7 @@ def main():
                 print(f"[DEBUG]   GCS filename: {savings_filename}")
                 print(f"[DEBUG]   Extracted version: {extract_savings_plan_version(version_url)}")
                 
-                if not is_file_downloaded(savings_filename):
+                if not download_manifest.is_downloaded(savings_filename):
                     download_jobs.append((csv_url, savings_filename))
                     print(f"[DEBUG] Added savings plan job for {region_code} to download queue")
                 else:
@@ -682,28 +1640,26 @@ def main():
 
         print(f"Collected {len(download_jobs)} download jobs.")
 
-        # 6. Download files concurrently
-        downloaded_files = []
-        with ThreadPoolExecutor(max_workers=DOWNLOAD_CONCURRENCY) as executor:
-            futures = [
-                executor.submit(process_download_job, url, filename, is_testing)
-                for url, filename in download_jobs
-            ]
-            for future in as_completed(futures):
-                try:
-                    gcs_filename, size_bytes = future.result()
-                    if size_bytes > 0:  # Only add if actually downloaded
-                        downloaded_files.append(gcs_filename)
-                except Exception as e:
-                    print(f"Download failed: {e}")
-
-        print(f"Downloaded {len(downloaded_files)} files.")
-
-        # 7. Load files to BigQuery sequentially
-        for gcs_filename in downloaded_files:
-            load_and_cleanup_file(gcs_filename)
-
-        # 8. Log the version as processed
+        # 6-7. Download files concurrently and load each one into BigQuery as
+        # soon as its download finishes
+        download_and_load_files(download_jobs, is_testing)
+
+        # 8. Rebuild the all-region savings plan table and the pricing matrix from
+        # the refreshed views. A failure leaves the version unprocessed so the
+        # next run rebuilds them.
+        try:
+            build_savings_plan_all_regions_table(latest_version_id, bigquery_client)
+        except Exception as e:
+            print(f"ERROR: Failed to build all-region savings plan table: {e}")
+            return "Failed to build all-region savings plan table", 500
+
+        try:
+            build_pricing_matrix(latest_version_id, bigquery_client)
+        except Exception as e:
+            print(f"ERROR: Failed to build pricing matrix: {e}")
+            return "Failed to build pricing matrix", 500
+
+        # 9. Log the version as processed
         log_version_processed(latest_version_id)
 
         print("Consolidated pricing update job completed successfully.")
@@ -715,6 +1671,9 @@ def main():
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return "An unexpected error occurred", 500
+    finally:
+        # Failed runs need the job timings most
+        bigquery_jobs.report()
 
 
 if __name__ == "__main__":
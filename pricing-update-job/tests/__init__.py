@@ -0,0 +1 @@
+"""Test suite for the pricing update job"""
@@ -0,0 +1,330 @@
+"""Tests for the pricing update job"""
+import pytest
+from unittest.mock import patch, MagicMock
+
+
+@pytest.fixture(autouse=True)
+def job(monkeypatch):
+    """Import main with the Google Cloud clients mocked"""
+    monkeypatch.setenv("GCP_PROJECT", "test-project")
+    monkeypatch.setenv("GCS_BUCKET_NAME", "test-bucket")
+    with patch('google.cloud.bigquery.Client', return_value=MagicMock()), \
+         patch('google.cloud.storage.Client', return_value=MagicMock()):
+        import main
+        yield main
+
+
+class TestSavingsPlanAllRegions:
+    """Tests for the all-region savings plan table"""
+
+    def test_union_casts_string_views_to_typed_columns(self, job):
+        """Test that regions still on STRING tables are cast to match reloaded, typed regions"""
+        from google.cloud.bigquery import SchemaField
+
+        typed = [
+            SchemaField("sku", "STRING"),
+            SchemaField("discountedrate", "FLOAT"),
+            SchemaField("leasecontractlength", "INTEGER"),
+            SchemaField("effectivedate", "DATE"),
+        ]
+        strings = [SchemaField(field.name, "STRING") for field in typed]
+        query = job.build_savings_plan_all_regions_query(
+            {"savings_plan_us_east_1_latest": typed, "savings_plan_eu_west_1_latest": strings},
+            [field.name for field in typed],
+        )
+
+        typed_select, string_select = query.split("UNION ALL")
+        assert "SELECT sku, discountedrate, leasecontractlength, effectivedate FROM" in typed_select
+        assert "savings_plan_us_east_1_latest" in typed_select
+        assert "SAFE_CAST(discountedrate AS FLOAT64) AS discountedrate" in string_select
+        assert "SAFE_CAST(REGEXP_EXTRACT(leasecontractlength, r'^\\s*(\\d+)') AS INT64) AS leasecontractlength" in string_select
+        assert "SAFE.PARSE_DATE('%Y-%m-%d', SUBSTR(effectivedate, 1, 10)) AS effectivedate" in string_select
+        assert "SELECT sku," in string_select
+
+    def test_union_leaves_all_string_views_alone(self, job):
+        """Test that views are not cast when no region has been reloaded with types"""
+        from google.cloud.bigquery import SchemaField
+
+        strings = [SchemaField("sku", "STRING"), SchemaField("discountedrate", "STRING")]
+        query = job.build_savings_plan_all_regions_query(
+            {"savings_plan_us_east_1_latest": strings, "savings_plan_eu_west_1_latest": strings},
+            ["sku", "discountedrate"],
+        )
+        assert "CAST" not in query
+
+
+class TestPricingMatrix:
+    """Tests for the pricing matrix query"""
+
+    def test_matrix_query(self, job):
+        """Test the On-Demand row rule and that savings plan views of either layout union"""
+        query = job.build_pricing_matrix_query(
+            "ec2_pricing_matrix_v1", ["savings_plan_us_east_1_latest", "savings_plan_eu_west_1_latest"]
+        )
+
+        assert "IGNORE NULLS ORDER BY sku LIMIT 1)[SAFE_OFFSET(0)].rate AS on_demand_rate" in query
+        assert query.count("CAST(leasecontractlength AS STRING) AS leasecontractlength") == 2
+        assert query.count("SAFE_CAST(discountedrate AS FLOAT64) AS discountedrate") == 2
+
+
+class TestTypedTables:
+    """Tests for copying staging tables into typed tables"""
+
+    @staticmethod
+    def _bigquery_client(query_error=None):
+        """BigQuery client whose load and query jobs finish at once"""
+        client = MagicMock()
+        for job_type, method in (("load", client.load_table_from_uri), ("query", client.query)):
+            bigquery_job = method.return_value
+            bigquery_job.done.return_value = True
+            bigquery_job.job_type = job_type
+            bigquery_job.output_bytes = bigquery_job.total_bytes_processed = 0
+            bigquery_job.error_result = None
+        client.query.return_value.error_result = query_error
+        return client
+
+    def test_typed_select_prunes_and_casts(self, job):
+        """Test that only allowlisted columns are kept, cast to their declared types"""
+        schema = job.build_schema(["SKU", "PricePerUnit", "LeaseContractLength", "EffectiveDate", "vCPU", "Location"])
+        query, typed_schema = job.build_typed_select("ec2_global_pricing_v1_staging", "ec2_global_pricing_v1", schema)
+
+        assert "FROM `test-project.price_ingestion.ec2_global_pricing_v1_staging`" in query
+        assert "SAFE_CAST(priceperunit AS FLOAT64) AS priceperunit" in query
+        assert "SAFE_CAST(REGEXP_EXTRACT(leasecontractlength, r'^\\s*(\\d+)') AS INT64) AS leasecontractlength" in query
+        assert "SAFE.PARSE_DATE('%Y-%m-%d', SUBSTR(effectivedate, 1, 10)) AS effectivedate" in query
+        assert "location" not in query
+        assert [(field.name, field.field_type) for field in typed_schema] == [
+            ("sku", "STRING"),
+            ("priceperunit", "FLOAT64"),
+            ("leasecontractlength", "INT64"),
+            ("effectivedate", "DATE"),
+            ("vcpu", "INT64"),
+        ]
+
+    def test_load_builds_typed_table_from_staging(self, job):
+        """Test that the CSV lands in an unclustered staging table that is copied into the typed table and dropped"""
+        client = self._bigquery_client()
+        with patch.object(job, 'bigquery_client', client), \
+             patch.object(job, 'TYPED_PRICING_TABLES', True), \
+             patch.object(job, 'read_header_row', return_value=["SKU", "PricePerUnit", "LeaseContractLength"]), \
+             patch.object(job, 'delete_blob'), \
+             patch('builtins.print'):
+            loaded = job.load_and_cleanup_file("ec2_global_pricing_v1.csv")
+
+        assert loaded == ("ec2_global_pricing_v1", "ec2_global_pricing_latest")
+        uri, staging_id = client.load_table_from_uri.call_args[0]
+        assert uri == "gs://test-bucket/ec2_global_pricing_v1.csv"
+        assert staging_id == "test-project.price_ingestion.ec2_global_pricing_v1_staging"
+        assert client.load_table_from_uri.call_args[1]["job_config"].clustering_fields is None
+
+        query = client.query.call_args[0][0]
+        job_config = client.query.call_args[1]["job_config"]
+        assert "FROM `test-project.price_ingestion.ec2_global_pricing_v1_staging`" in query
+        assert job_config.destination.table_id == "ec2_global_pricing_v1"
+        assert job_config.write_disposition == "WRITE_TRUNCATE"
+        client.delete_table.assert_called_once_with(staging_id, retry=job.bigquery_retry)
+
+    def test_failed_typed_copy_drops_staging_table(self, job):
+        """Test that the staging table is dropped and the file is not published when the copy fails"""
+        client = self._bigquery_client(query_error={"message": "bad cast"})
+        with patch.object(job, 'bigquery_client', client), \
+             patch.object(job, 'TYPED_PRICING_TABLES', True), \
+             patch.object(job, 'read_header_row', return_value=["SKU", "PricePerUnit"]), \
+             patch.object(job, 'delete_blob') as delete_blob, \
+             patch('builtins.print'):
+            assert job.load_and_cleanup_file("ec2_global_pricing_v1.csv") is None
+
+        client.delete_table.assert_called_once_with(
+            "test-project.price_ingestion.ec2_global_pricing_v1_staging", retry=job.bigquery_retry
+        )
+        delete_blob.assert_called_once_with("ec2_global_pricing_v1.csv")
+
+
+class TestSplitDownload:
+    """Tests for downloads split over byte ranges"""
+
+    @pytest.mark.parametrize("error, parts_deleted", [
+        ("source_changed", True),
+        ("upload_failed", False),
+    ])
+    def test_parts_kept_unless_source_changed(self, job, error, parts_deleted):
+        """Test that only a changed source discards finished parts and the checkpoint"""
+        exception = {
+            "source_changed": job.SourceChangedError("changed during the split download"),
+            "upload_failed": RuntimeError("Upload session did not persist any bytes"),
+        }[error]
+        checkpoint = {"parts": [[0, 9], [10, 19]], "size": 20, "etag": '"v1"'}
+
+        with patch.object(job, 'download_part', side_effect=[10, exception]), \
+             patch.object(job, 'delete_download_parts') as delete_parts, \
+             patch.object(job, 'delete_download_checkpoint') as delete_checkpoint, \
+             patch('builtins.print'):
+            with pytest.raises(RuntimeError):
+                job.download_in_parts("https://example.com/file.csv", MagicMock(), "file.csv", checkpoint)
+
+        assert delete_parts.called == parts_deleted
+        assert delete_checkpoint.called == parts_deleted
+
+
+class TestResumableDownload:
+    """Tests for conditional and resumed single-stream downloads"""
+
+    URL = "https://example.com/file.csv"
+
+    @staticmethod
+    def _response(status_code, headers=None, body=b""):
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = headers or {}
+        response.iter_content.return_value = [body]
+        response.__enter__.return_value = response
+        return response
+
+    def _download(self, job, bucket, response, checkpoint=None, validators=None):
+        """Run download_file against a mocked bucket, source and upload session"""
+        with patch.object(job, 'get_bucket', return_value=bucket), \
+             patch.object(job, 'read_download_checkpoint', return_value=checkpoint), \
+             patch.object(job, 'write_download_checkpoint'), \
+             patch.object(job, 'delete_download_checkpoint') as delete_checkpoint, \
+             patch.object(job, 'query_upload_offset', return_value=5), \
+             patch.object(job.requests, 'get', return_value=response) as get, \
+             patch.object(job.requests, 'put') as put, \
+             patch('builtins.print'):
+            result = job.download_file(self.URL, "file.csv", validators=validators)
+        return result, get.call_args[1]["headers"], put, delete_checkpoint
+
+    @staticmethod
+    def _bucket(exists=False):
+        bucket = MagicMock()
+        bucket.blob.return_value.exists.return_value = exists
+        bucket.blob.return_value.create_resumable_upload_session.return_value = "https://upload/new"
+        return bucket
+
+    def test_resumes_from_persisted_offset(self, job):
+        """Test that an interrupted download asks for the rest of the file and finishes its session"""
+        bucket = self._bucket()
+        checkpoint = {"url": self.URL, "session_url": "https://upload/old", "offset": 0, "etag": '"v1"'}
+        response = self._response(206, {"Content-Range": "bytes 5-9/10", "ETag": '"v1"'}, b"fghij")
+
+        result, headers, put, delete_checkpoint = self._download(job, bucket, response, checkpoint)
+
+        assert result == ("file.csv", 10, {"etag": '"v1"'})
+        assert headers["Range"] == "bytes=5-"
+        assert headers["If-Range"] == '"v1"'
+        assert put.call_args[0][0] == "https://upload/old"
+        assert put.call_args[1]["headers"]["Content-Range"] == "bytes 5-9/10"
+        bucket.blob.return_value.create_resumable_upload_session.assert_not_called()
+        delete_checkpoint.assert_called_once_with(bucket, "file.csv")
+
+    def test_restarts_when_if_range_sends_whole_file(self, job):
+        """Test that a 200 to an If-Range request starts a new upload session with the new validators"""
+        bucket = self._bucket()
+        checkpoint = {"url": self.URL, "session_url": "https://upload/old", "offset": 0, "etag": '"v1"'}
+        response = self._response(200, {"ETag": '"v2"'}, b"0123456789")
+
+        result, headers, put, delete_checkpoint = self._download(job, bucket, response, checkpoint)
+
+        assert headers["If-Range"] == '"v1"'
+        assert result == ("file.csv", 10, {"etag": '"v2"'})
+        assert put.call_args[0][0] == "https://upload/new"
+        assert put.call_args[1]["headers"]["Content-Range"] == "bytes 0-9/10"
+        assert bucket.blob.return_value.metadata == {"etag": '"v2"'}
+        delete_checkpoint.assert_called_once_with(bucket, "file.csv")
+
+    def test_not_modified_skips_download(self, job):
+        """Test that a 304 uploads nothing and reports the size of the previous download"""
+        bucket = self._bucket()
+        result, headers, put, _ = self._download(job, bucket, self._response(304), validators={"etag": '"v1"'})
+
+        assert result == ("file.csv", None, {"etag": '"v1"'})
+        assert headers["If-None-Match"] == '"v1"'
+        put.assert_not_called()
+
+        manifest = job.DownloadManifest()
+        manifest.record("file.csv", self.URL, 10, {"etag": '"v1"'})
+        with patch.object(job, 'download_manifest', manifest), \
+             patch.object(job, 'download_file', return_value=result), \
+             patch('builtins.print'):
+            assert job.process_download_job(self.URL, "file.csv", False) == ("file.csv", 10, {"etag": '"v1"'}, False)
+        assert len(manifest.pending_rows) == 1
+
+    def test_existing_blob_keeps_its_validators(self, job):
+        """Test that a file left by an earlier run is reported with the validators stored on it"""
+        bucket = self._bucket(exists=True)
+        blob = bucket.blob.return_value
+        blob.size = 10
+        blob.metadata = {"etag": '"v1"', "owner": "someone"}
+
+        with patch.object(job, 'get_bucket', return_value=bucket), \
+             patch.object(job.requests, 'get') as get, \
+             patch('builtins.print'):
+            assert job.download_file(self.URL, "file.csv") == ("file.csv", 10, {"etag": '"v1"'})
+        get.assert_not_called()
+
+
+class TestDownloadAndLoad:
+    """Tests for the pipelined download, load and publish step"""
+
+    DOWNLOADS = {
+        "a.csv": ("a.csv", 10, {"etag": '"a"'}, True),
+        "b.csv": ("b.csv", 20, {"etag": '"b"'}, True),
+    }
+
+    def _run(self, job, load, update_view=None):
+        """Run download_and_load_files over a.csv and b.csv, loading each with load"""
+        client = MagicMock()
+        client.insert_rows_json.return_value = []
+        with patch.object(job, 'bigquery_client', client), \
+             patch.object(job, 'download_manifest', job.DownloadManifest()), \
+             patch.object(job, 'process_download_job', side_effect=lambda url, name, _: self.DOWNLOADS[name]), \
+             patch.object(job, 'load_and_cleanup_file', side_effect=load), \
+             patch.object(job, 'update_latest_view', side_effect=update_view, return_value=None) as update_view, \
+             patch('builtins.print'):
+            loaded_files = job.download_and_load_files(
+                [("https://example.com/a.csv", "a.csv"), ("https://example.com/b.csv", "b.csv")], False
+            )
+        rows = client.insert_rows_json.call_args[0][1] if client.insert_rows_json.called else []
+        return loaded_files, update_view, rows
+
+    def test_failed_load_is_not_recorded_or_published(self, job):
+        """Test that a file whose load fails leaves its view and manifest entry untouched"""
+        loaded_files, update_view, rows = self._run(job, {"a.csv": ("table_a", "view_a"), "b.csv": None}.get)
+
+        assert loaded_files == ["a.csv"]
+        assert [call[0][:2] for call in update_view.call_args_list] == [("table_a", "view_a")]
+        assert [(row["gcs_filename"], row["size_bytes"], row["etag"]) for row in rows] == [("a.csv", 10, '"a"')]
+
+    def test_views_swap_after_every_load(self, job):
+        """Test that no view is swapped while another file is still loading"""
+        import time
+
+        events = []
+
+        def load(gcs_filename):
+            if gcs_filename == "b.csv":
+                time.sleep(0.05)
+            events.append(f"loaded {gcs_filename}")
+            return f"table_{gcs_filename[0]}", f"view_{gcs_filename[0]}"
+
+        def update_view(table_name, view_name, bigquery_client):
+            events.append(f"published {table_name}")
+
+        with patch.object(job, 'LOAD_CONCURRENCY', 2):
+            loaded_files, _, rows = self._run(job, load, update_view)
+
+        assert sorted(loaded_files) == ["a.csv", "b.csv"]
+        assert events[:2] == ["loaded a.csv", "loaded b.csv"]
+        assert sorted(events[2:]) == ["published table_a", "published table_b"]
+        assert len(rows) == 2
+
+
+class TestMain:
+    """Tests for the job entry point"""
+
+    def test_bigquery_jobs_reported_when_run_fails(self, job):
+        """Test that the BigQuery job report is printed even when the run fails"""
+        with patch.object(job.requests, 'get', side_effect=job.requests.exceptions.ConnectionError("down")), \
+             patch.object(job.bigquery_jobs, 'report') as report, \
+             patch('builtins.print'):
+            assert job.main() == ("Failed to fetch data from AWS", 500)
+        report.assert_called_once()